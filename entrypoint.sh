@@ -3,5 +3,6 @@ set -e
 
 export DJANGO_SETTINGS_MODULE=feira_iceflu_project.settings_prod
 
-# Adicionada a flag --timeout 120
-exec gunicorn feira_iceflu_project.wsgi --bind 0.0.0.0:$PORT --timeout 120
\ No newline at end of file
+# Aplicação (WSGI ou ASGI, conforme FEIRA_SERVIDOR), bind, workers/threads, timeout (120 s),
+# preload e aquecimento dos workers em gunicorn.conf.py. Probe de inicialização: GET /aquecimento/
+exec gunicorn --config gunicorn.conf.py
@@ -1,16 +1,70 @@
-from django.contrib import admin
-from .models import Beneficiario, Produto, ListaDeCompra, ItemDaLista
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.db.models import F
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
+from .models import FATOR_LIMITE_COMPRA, Beneficiario, Produto, ListaDeCompra, ItemDaLista, ConsolidadoProduto
+from .beneficios import ajustar_beneficios, ler_tabela
+from .precos import POLITICA_MANTER, POLITICA_REPRECIAR, POLITICAS, repreciar_listas_abertas
+from .relatorios import consolidar_listas_finalizadas, desconsolidar_listas
+from .resumo_carrinho import regravar_resumos
+from .roteador import leituras_na_replica
 from decimal import Decimal
 
+class LeituraNaReplicaMixin:
+    """Changelist (GET) lida da réplica, se houver; ações (POST) continuam no primário."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with leituras_na_replica():
+            resposta = super().changelist_view(request, extra_context)
+            # A página é montada (e o queryset avaliado) só no render da TemplateResponse
+            if hasattr(resposta, 'render'):
+                resposta.render()
+        return resposta
+
+
+class AjusteBeneficioForm(forms.Form):
+    percentual = forms.DecimalField(
+        required=False, max_digits=6, decimal_places=2, min_value=Decimal('-99.99'),
+        label="Percentual (%)", help_text="Ex.: 10 para +10%, -5 para -5%.",
+    )
+    tabela = forms.CharField(
+        required=False, widget=forms.Textarea(attrs={'rows': 6, 'cols': 30}),
+        label="Ou tabela de valores",
+        help_text="Uma faixa por linha: valor atual = valor novo (ex.: 150,00 = 180,00). "
+                  "Quem tem outro valor não muda.",
+    )
+
+    def clean(self):
+        dados = super().clean()
+        percentual, tabela = dados.get('percentual'), (dados.get('tabela') or '').strip()
+        if (percentual is None) == (not tabela):
+            raise forms.ValidationError("Informe o percentual ou a tabela (apenas um).")
+        if tabela:
+            try:
+                dados['tabela'] = ler_tabela(tabela.splitlines())
+            except ValueError as exc:
+                self.add_error('tabela', str(exc))
+        else:
+            dados['tabela'] = None
+        return dados
+
+
 # Customização para o modelo Beneficiario
-class BeneficiarioAdmin(admin.ModelAdmin):
+class BeneficiarioAdmin(LeituraNaReplicaMixin, admin.ModelAdmin):
+    actions = ['ajustar_beneficio']
     list_display = ('nome', 'email', 'beneficio_mensal', 'is_admin', 'data_criacao', 'data_atualizacao')
     search_fields = ('nome', 'email')
     list_filter = ('is_admin', 'data_criacao')
     readonly_fields = ('data_criacao', 'data_atualizacao') # Campos que não devem ser editados manualmente no admin
+    autocomplete_fields = ('user',)
     fieldsets = (
         (None, {
-            'fields': ('nome', 'email', 'beneficio_mensal', 'is_admin')
+            'fields': ('nome', 'email', 'user', 'beneficio_mensal', 'is_admin')
         }),
         ('Datas de Controle', {
             'fields': ('data_criacao', 'data_atualizacao'),
@@ -18,15 +72,82 @@ class BeneficiarioAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.action(description="Reajustar o benefício mensal (e o limite das listas em aberto)")
+    def ajustar_beneficio(self, request, queryset):
+        # Página intermediária: o formulário volta para esta ação com 'aplicar'
+        form = AjusteBeneficioForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            resultado = ajustar_beneficios(
+                queryset, percentual=form.cleaned_data['percentual'], tabela=form.cleaned_data['tabela']
+            )
+            self.message_user(
+                request,
+                f"Benefício reajustado para {resultado.beneficiarios} beneficiário(s); "
+                f"limite recalculado em {resultado.listas} lista(s) em aberto.",
+            )
+            _avisar_acima_do_limite(self, request, resultado.listas_acima_do_limite)
+            return None
+        return TemplateResponse(request, 'admin/feira_app/beneficiario/ajustar_beneficio.html', {
+            **self.admin_site.each_context(request),
+            'title': "Reajustar benefício mensal",
+            'opts': self.model._meta,
+            'form': form,
+            'quantidade': queryset.count(),
+            'fator': FATOR_LIMITE_COMPRA,
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+            'selecionados': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        })
+
+class ProdutoAdminForm(forms.ModelForm):
+    # Não é campo do modelo: decide o que acontece com as listas em aberto quando o preço muda
+    politica_preco = forms.ChoiceField(
+        choices=POLITICAS,
+        initial=POLITICA_MANTER,
+        required=False,  # produto novo: o campo não aparece (ver ProdutoAdmin.get_fieldsets)
+        widget=forms.RadioSelect,
+        label="Listas em aberto",
+        help_text="Usado apenas quando o preço unitário é alterado.",
+    )
+
+    class Meta:
+        model = Produto
+        fields = '__all__'
+
+
+def _avisar_acima_do_limite(modeladmin, request, listas_ids):
+    """Aviso com o link para as listas em aberto que passaram a exceder o limite de compra."""
+    if not listas_ids:
+        return
+    url = reverse('admin:feira_app_listadecompra_changelist') + f'?{FiltroAcimaDoLimite.parameter_name}=sim'
+    modeladmin.message_user(
+        request,
+        format_html(
+            '{} lista(s) em aberto passaram a exceder o limite de compra: <a href="{}">ver listas</a>.',
+            len(listas_ids), url,
+        ),
+        level=messages.WARNING,
+    )
+
+
+def _avisar_repreciacao(modeladmin, request, resultado):
+    modeladmin.message_user(
+        request, f"{resultado.itens} item(ns) repreciado(s) em {resultado.listas} lista(s) em aberto."
+    )
+    _avisar_acima_do_limite(modeladmin, request, resultado.listas_acima_do_limite)
+
+
 # Customização para o modelo Produto
-class ProdutoAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'preco_unitario', 'unidade_medida', 'disponivel', 'data_atualizacao')
-    search_fields = ('nome',)
+class ProdutoAdmin(LeituraNaReplicaMixin, admin.ModelAdmin):
+    form = ProdutoAdminForm
+    actions = ['repreciar_listas_abertas']
+    list_display = ('nome', 'codigo', 'preco_unitario', 'unidade_medida', 'disponivel', 'data_atualizacao')
+    search_fields = ('nome', 'codigo')
     list_filter = ('disponivel', 'unidade_medida')
     readonly_fields = ('data_criacao', 'data_atualizacao')
     fieldsets = (
         (None, {
-            'fields': ('nome', 'preco_unitario', 'unidade_medida', 'disponivel')
+            'fields': ('nome', 'codigo', 'preco_unitario', 'unidade_medida', 'disponivel')
         }),
         ('Datas de Controle', {
             'fields': ('data_criacao', 'data_atualizacao'),
@@ -34,11 +155,41 @@ class ProdutoAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_fieldsets(self, request, obj=None):
+        fieldsets = super().get_fieldsets(request, obj)
+        if obj is None:
+            return fieldsets
+        return fieldsets + (('Mudança de preço', {'fields': ('politica_preco',)}),)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if (change and 'preco_unitario' in form.changed_data
+                and form.cleaned_data.get('politica_preco') == POLITICA_REPRECIAR):
+            _avisar_repreciacao(self, request, repreciar_listas_abertas([obj.pk]))
+
+    @admin.action(description="Repreciar as listas em aberto com o preço atual dos produtos selecionados")
+    def repreciar_listas_abertas(self, request, queryset):
+        _avisar_repreciacao(self, request, repreciar_listas_abertas(queryset.values_list('pk', flat=True)))
+
+
+class FiltroAcimaDoLimite(admin.SimpleListFilter):
+    title = "limite de compra"
+    parameter_name = 'acima_do_limite'
+
+    def lookups(self, request, model_admin):
+        return [('sim', "Acima do limite")]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'sim':
+            return queryset.filter(valor_total__gt=F('limite_compra_calculado'))
+        return queryset
+
 # Inline para ItemDaLista, para ser usado dentro de ListaDeCompraAdmin
 class ItemDaListaInline(admin.TabularInline): # ou admin.StackedInline para um layout diferente
     model = ItemDaLista
     fields = ('produto', 'quantidade', 'preco_unitario_no_momento', 'subtotal_display')
     readonly_fields = ('subtotal_display',) # Para mostrar o subtotal calculado
+    autocomplete_fields = ('produto',) # Evita carregar todos os produtos em cada <select> do inline
     extra = 1 # Quantidade de formulários extras para adicionar itens
 
     def subtotal_display(self, obj):
@@ -46,15 +197,21 @@ class ItemDaListaInline(admin.TabularInline): # ou admin.StackedInline para um l
     subtotal_display.short_description = "Subtotal (R$)"
 
 # Customização para o modelo ListaDeCompra
-class ListaDeCompraAdmin(admin.ModelAdmin):
+class ListaDeCompraAdmin(LeituraNaReplicaMixin, admin.ModelAdmin):
     list_display = ('__str__', 'beneficiario', 'status', 'limite_compra_calculado', 'total_da_lista_display', 'data_criacao', 'data_atualizacao')
-    list_filter = ('status', 'data_criacao', 'beneficiario')
+    # __str__ e a coluna beneficiario usam o beneficiário: um JOIN em vez de uma consulta por linha.
+    # O total vem da coluna desnormalizada valor_total (sem agregação por linha).
+    list_select_related = ('beneficiario',)
+    # Sem filtro lateral por beneficiário (carregava todos): use a busca por nome/e-mail.
+    list_filter = ('status', FiltroAcimaDoLimite, 'data_criacao')
     search_fields = ('beneficiario__nome', 'beneficiario__email')
-    readonly_fields = ('data_criacao', 'data_atualizacao', 'total_da_lista_display', 'limite_compra_calculado')
+    autocomplete_fields = ('beneficiario',)
+    show_full_result_count = False
+    readonly_fields = ('data_criacao', 'data_atualizacao', 'total_da_lista_display', 'quantidade_itens', 'limite_compra_calculado')
     inlines = [ItemDaListaInline]
     fieldsets = (
         (None, {
-            'fields': ('beneficiario', 'status', 'limite_compra_calculado', 'total_da_lista_display')
+            'fields': ('beneficiario', 'status', 'limite_compra_calculado', 'total_da_lista_display', 'quantidade_itens')
         }),
         ('Datas de Controle', {
             'fields': ('data_criacao', 'data_atualizacao'),
@@ -65,6 +222,17 @@ class ListaDeCompraAdmin(admin.ModelAdmin):
     def total_da_lista_display(self, obj):
         return obj.total_lista
     total_da_lista_display.short_description = "Total da Lista (R$)"
+    total_da_lista_display.admin_order_field = 'valor_total'
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Os itens podem ter sido criados, alterados ou excluídos pelo inline:
+        # regrava os totais desnormalizados da lista com um único UPDATE.
+        ListaDeCompra.objects.filter(pk=form.instance.pk).recalcular_totais()
+        regravar_resumos([form.instance.pk])
+        # Lista finalizada (nova ou alterada): soma ao relatório consolidado
+        if form.instance.status == 'finalizada':
+            consolidar_listas_finalizadas([form.instance.pk])
 
     # ---- ADICIONE ESTE MÉTODO ----
     def save_model(self, request, obj, form, change):
@@ -77,7 +245,7 @@ class ListaDeCompraAdmin(admin.ModelAdmin):
                 try:
                     # Certifique-se de que obj.beneficiario.beneficio_mensal é um Decimal
                     beneficio = Decimal(obj.beneficiario.beneficio_mensal or 0)
-                    obj.limite_compra_calculado = beneficio * Decimal('3.00')
+                    obj.limite_compra_calculado = beneficio * FATOR_LIMITE_COMPRA
                 except TypeError:
                     # Caso beneficio_mensal seja None, defina um limite padrão ou levante um erro mais específico
                     # Para este exemplo, vamos definir como 0 se não puder calcular.
@@ -87,20 +255,80 @@ class ListaDeCompraAdmin(admin.ModelAdmin):
                     # from django.contrib import messages
                     # messages.warning(request, "Benefício mensal do beneficiário não definido. Limite calculado como 0.")
 
+        if change and obj.consolidada:
+            # Já somada no relatório: desconta a versão atual; save_related soma a nova se seguir finalizada
+            desconsolidar_listas([obj.pk])
+            obj.consolidada = False
+
         super().save_model(request, obj, form, change) # Chama o método save_model da classe pai para salvar o objeto
 
+    def delete_model(self, request, obj):
+        desconsolidar_listas([obj.pk])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        desconsolidar_listas(list(queryset.values_list('pk', flat=True)))
+        super().delete_queryset(request, queryset)
+
 # Customização para o modelo ItemDaLista (opcional, pois é gerenciado inline)
 # Se você quiser também uma view separada para ItensDaLista:
-class ItemDaListaAdmin(admin.ModelAdmin):
+class ItemDaListaAdmin(LeituraNaReplicaMixin, admin.ModelAdmin):
     list_display = ('lista', 'produto', 'quantidade', 'preco_unitario_no_momento', 'subtotal_display')
+    list_select_related = ('produto', 'lista__beneficiario')
     search_fields = ('produto__nome', 'lista__beneficiario__nome')
-    list_filter = ('produto',)
+    # Sem filtro lateral por produto (carregava o catálogo inteiro): use a busca.
+    autocomplete_fields = ('lista', 'produto')
     readonly_fields = ('subtotal_display',)
+    show_full_result_count = False
 
     def subtotal_display(self, obj):
         return obj.subtotal
     subtotal_display.short_description = "Subtotal (R$)"
 
+    # Mantém os totais desnormalizados das listas afetadas em dia.
+    def save_model(self, request, obj, form, change):
+        lista_anterior_id = form.initial.get('lista') if change else None
+        listas_ids = list({obj.lista_id, lista_anterior_id} - {None})
+        desconsolidar_listas(listas_ids)
+        super().save_model(request, obj, form, change)
+        ListaDeCompra.objects.filter(pk__in=listas_ids).recalcular_totais()
+        regravar_resumos(listas_ids)
+        consolidar_listas_finalizadas(listas_ids)
+
+    def delete_model(self, request, obj):
+        lista_id = obj.lista_id
+        desconsolidar_listas([lista_id])
+        super().delete_model(request, obj)
+        ListaDeCompra.objects.filter(pk=lista_id).recalcular_totais()
+        regravar_resumos([lista_id])
+        consolidar_listas_finalizadas([lista_id])
+
+    def delete_queryset(self, request, queryset):
+        listas_ids = set(queryset.values_list('lista_id', flat=True))
+        desconsolidar_listas(listas_ids)
+        super().delete_queryset(request, queryset)
+        ListaDeCompra.objects.filter(pk__in=listas_ids).recalcular_totais()
+        regravar_resumos(listas_ids)
+        consolidar_listas_finalizadas(listas_ids)
+
+
+# Relatório consolidado: somente leitura (mantido por relatorios.py)
+class ConsolidadoProdutoAdmin(LeituraNaReplicaMixin, admin.ModelAdmin):
+    list_display = ('periodo', 'produto', 'quantidade_total', 'valor_total', 'data_atualizacao')
+    list_select_related = ('produto',)
+    list_filter = ('periodo',)
+    search_fields = ('produto__nome', 'produto__codigo')
+    date_hierarchy = 'periodo'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 # Registrando os modelos com suas respectivas classes Admin (ou sem, para o padrão)
 admin.site.register(Beneficiario, BeneficiarioAdmin)
@@ -110,4 +338,5 @@ admin.site.register(ListaDeCompra, ListaDeCompraAdmin)
 # Opcional: registrar ItemDaLista separadamente se desejar uma interface de admin dedicada para ele,
 # além da gestão inline. Geralmente, se é apenas um item de detalhe, o inline é suficiente.
 # Se você não precisar de uma página de admin separada para ItensDaLista, pode comentar a linha abaixo.
-admin.site.register(ItemDaLista, ItemDaListaAdmin)
\ No newline at end of file
+admin.site.register(ItemDaLista, ItemDaListaAdmin)
+admin.site.register(ConsolidadoProduto, ConsolidadoProdutoAdmin)
@@ -0,0 +1,182 @@
+# feira_app/admissao.py
+"""
+Controle de admissão das ações do carrinho (adicionar, lote, atualizar, remover).
+
+Na abertura da feira centenas de beneficiários mexem na lista ao mesmo tempo.
+Cada ação ocupa uma thread do worker e uma transação com a lista travada: se todas
+entram, a fila cresce e a latência sobe para todo mundo. Antes de a view tocar no
+banco, duas barreiras:
+
+1. por processo, no máximo CONCORRENCIA ações em andamento (semáforo sem espera);
+2. por usuário, um token bucket no cache do Django (compartilhado entre os workers
+   com Redis): rajadas de até RAJADA ações e TAXA por segundo depois disso.
+
+Quem passa de um limite recebe 429 com Retry-After na hora, em vez de esperar na
+fila. Os contadores saem em metricas_view; `benchmark_admissao` mede o efeito.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+TAXA = getattr(settings, 'FEIRA_ADMISSAO_TAXA', 2)
+RAJADA = getattr(settings, 'FEIRA_ADMISSAO_RAJADA', 6)
+CONCORRENCIA = getattr(settings, 'FEIRA_ADMISSAO_CONCORRENCIA', 3)
+
+_lock = threading.Lock()
+_vagas = None
+_estatisticas = {
+    'admitidas': 0,
+    'rejeitadas_taxa': 0,
+    'rejeitadas_concorrencia': 0,
+    'em_andamento': 0,
+    'pico_em_andamento': 0,
+}
+
+
+def configurar(taxa=None, rajada=None, concorrencia=None):
+    """Troca os limites deste processo (benchmark_admissao e testes); 0 desliga o limite."""
+    global TAXA, RAJADA, CONCORRENCIA, _vagas
+    if taxa is not None:
+        TAXA = taxa
+    if rajada is not None:
+        RAJADA = rajada
+    if concorrencia is not None:
+        CONCORRENCIA = concorrencia
+    _vagas = threading.BoundedSemaphore(CONCORRENCIA) if CONCORRENCIA > 0 else None
+
+
+configurar()
+
+
+def estatisticas_admissao():
+    with _lock:
+        return {
+            **_estatisticas,
+            'limites': {'taxa': TAXA, 'rajada': RAJADA, 'concorrencia': CONCORRENCIA},
+        }
+
+
+def _contar(nome, delta=1):
+    with _lock:
+        _estatisticas[nome] += delta
+        if nome == 'em_andamento':
+            _estatisticas['pico_em_andamento'] = max(_estatisticas['pico_em_andamento'], _estatisticas[nome])
+
+
+def _consumir_ficha(user_pk):
+    """
+    Token bucket na forma GCRA: o cache guarda, em ms, o instante em que o balde do usuário
+    estaria cheio de novo (TAT). A ação é admitida se TAT - agora <= tolerância (RAJADA - 1
+    intervalos). Só incr/decr mudam o TAT, atômicos no Redis e no LocMemCache: duas ações
+    simultâneas do mesmo usuário não gastam a mesma ficha (o recomeço de um balde parado
+    pode, no pior caso, dar uma ficha a mais).
+
+    Devolve 0 se admitida, ou os segundos até a próxima ficha.
+    """
+    if TAXA <= 0:
+        return 0
+    intervalo = max(1, int(1000 / TAXA))
+    tolerancia = intervalo * (RAJADA - 1)
+    # Sem uso, o balde enche em RAJADA intervalos; depois disso a chave pode sumir
+    timeout = math.ceil(intervalo * RAJADA / 1000) + 60
+    chave = f'feira:admissao:{user_pk}'
+    agora = int(time.time() * 1000)
+    try:
+        try:
+            tat = cache.incr(chave, intervalo)
+        except ValueError:
+            if cache.add(chave, agora + intervalo, timeout):
+                return 0
+            tat = cache.incr(chave, intervalo)
+    except ValueError:
+        # A chave expirou entre as duas chamadas: balde cheio
+        return 0
+
+    anterior = tat - intervalo
+    if anterior < agora:
+        # Balde cheio (o TAT já passou): recomeça de agora
+        cache.set(chave, agora + intervalo, timeout)
+        return 0
+    if anterior - agora > tolerancia:
+        cache.decr(chave, intervalo)  # devolve a ficha: a ação não entra
+        return (anterior - tolerancia - agora) / 1000
+    return 0
+
+
+def _recusar(request, mensagem, segundos):
+    espera = max(1, math.ceil(segundos))
+    texto = f"{mensagem} Tente novamente em {espera} s."
+    if 'application/json' in request.headers.get('Accept', '') or request.content_type == 'application/json':
+        # Mesmo formato de _responder_acao: o script do carrinho mostra a mensagem
+        resposta = JsonResponse({'sucesso': False, 'mensagem': texto, 'nivel': 'warning'}, status=429)
+    else:
+        resposta = HttpResponse(texto, status=429, content_type='text/plain; charset=utf-8')
+    resposta['Retry-After'] = str(espera)
+    return resposta
+
+
+def _admitir(request, user_pk, vagas):
+    """None se a ação pode seguir (e ocupa uma vaga em `vagas`), ou a resposta 429."""
+    # O semáforo primeiro: sem vaga, a ficha do usuário não é gasta
+    if vagas is not None and not vagas.acquire(blocking=False):
+        _contar('rejeitadas_concorrencia')
+        return _recusar(request, "A feira está com muito movimento agora.", 1)
+    espera = _consumir_ficha(user_pk)
+    if espera:
+        if vagas is not None:
+            vagas.release()
+        _contar('rejeitadas_taxa')
+        return _recusar(request, "Muitas alterações seguidas na sua lista.", espera)
+    _contar('admitidas')
+    _contar('em_andamento')
+    return None
+
+
+def _liberar(vagas):
+    _contar('em_andamento', -1)
+    if vagas is not None:
+        vagas.release()
+
+
+def controlar_admissao(view):
+    """
+    Aplica os limites aos POSTs da view (os outros métodos só redirecionam e passam direto).
+    Vai depois de @login_required: o balde é do usuário autenticado.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def _view_async(request, *args, **kwargs):
+            if request.method != 'POST':
+                return await view(request, *args, **kwargs)
+            user = await request.auser()
+            vagas = _vagas  # a vaga volta para o semáforo de onde saiu, mesmo após configurar()
+            # O balde fica no cache (Redis em produção): a consulta sai do event loop. O cache e o
+            # semáforo sem espera são seguros entre threads, então não precisa da thread única.
+            recusa = await sync_to_async(_admitir, thread_sensitive=False)(request, user.pk, vagas)
+            if recusa is not None:
+                return recusa
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _liberar(vagas)
+        return _view_async
+
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view(request, *args, **kwargs)
+        vagas = _vagas
+        recusa = _admitir(request, request.user.pk, vagas)
+        if recusa is not None:
+            return recusa
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _liberar(vagas)
+    return _view
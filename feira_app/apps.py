@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FeiraAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'feira_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (registra os receivers)
+        from .instrumentacao import iniciar_log_assincrono
+        if getattr(settings, 'FEIRA_LOG_REQUISICOES', True):
+            iniciar_log_assincrono()
@@ -0,0 +1,81 @@
+# feira_app/bench.py
+"""Utilitários compartilhados pelos comandos `benchmark_*`."""
+import contextlib
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.db import connection
+
+
+@contextlib.contextmanager
+def banco_temporario(verbosity=0):
+    """
+    Cria um banco descartável com as migrações aplicadas e o remove ao final.
+
+    No SQLite o banco fica em um arquivo temporário (e não em memória), para que
+    as várias threads do benchmark enxerguem os mesmos dados.
+    """
+    settings_dict = connection.settings_dict
+    arquivo = None
+    if connection.vendor == 'sqlite':
+        descritor, arquivo = tempfile.mkstemp(prefix='feira_bench_', suffix='.sqlite3')
+        os.close(descritor)
+        settings_dict['TEST'] = {**settings_dict.get('TEST', {}), 'NAME': arquivo}
+    nome_original = settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nome_original, verbosity=verbosity)
+        if arquivo and os.path.exists(arquivo):
+            os.remove(arquivo)
+
+
+def executar_concorrente(tarefa, threads, repeticoes):
+    """
+    Executa `tarefa(indice_thread, repeticao)` em `threads` threads, `repeticoes` vezes cada.
+
+    Retorna (latências em segundos, duração total em segundos, exceções).
+    """
+    latencias = []
+    erros = []
+    trava = threading.Lock()
+    largada = threading.Barrier(threads)
+
+    def trabalhador(indice):
+        locais = []
+        try:
+            largada.wait()
+            for repeticao in range(repeticoes):
+                inicio = time.perf_counter()
+                try:
+                    tarefa(indice, repeticao)
+                except Exception as exc:  # registra e segue: o benchmark não deve parar no primeiro erro
+                    with trava:
+                        erros.append(exc)
+                locais.append(time.perf_counter() - inicio)
+        finally:
+            connection.close()
+            with trava:
+                latencias.extend(locais)
+
+    trabalhadores = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    inicio = time.perf_counter()
+    for trabalhador_thread in trabalhadores:
+        trabalhador_thread.start()
+    for trabalhador_thread in trabalhadores:
+        trabalhador_thread.join()
+    return latencias, time.perf_counter() - inicio, erros
+
+
+def percentis(amostras, pontos=(50, 95, 99)):
+    """Percentis (em milissegundos) de uma lista de latências em segundos."""
+    if not amostras:
+        return {f'p{ponto}': None for ponto in pontos}
+    if len(amostras) == 1:
+        return {f'p{ponto}': round(amostras[0] * 1000, 3) for ponto in pontos}
+    cortes = statistics.quantiles(amostras, n=100, method='inclusive')
+    return {f'p{ponto}': round(cortes[ponto - 1] * 1000, 3) for ponto in pontos}
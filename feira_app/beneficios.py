@@ -0,0 +1,106 @@
+# feira_app/beneficios.py
+"""
+Reajuste de beneficio_mensal em massa, com os limites das listas em aberto.
+
+O limite de compra de uma lista é fixado ao criá-la (FATOR_LIMITE_COMPRA x
+benefício). Um reajuste vale para as listas em aberto dos beneficiários
+reajustados; listas finalizadas e canceladas mantêm o limite da época.
+
+Usado pela ação do BeneficiarioAdmin e pelo comando `ajustar_beneficios`.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Round
+
+from .models import FATOR_LIMITE_COMPRA, Beneficiario, ListaDeCompra
+from .resumo_carrinho import invalidar_todos_os_resumos
+
+CAMPO_DINHEIRO = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+@dataclass(frozen=True)
+class ResultadoAjuste:
+    beneficiarios: int
+    listas: int
+    listas_acima_do_limite: list
+
+
+def ler_tabela(linhas):
+    """
+    Tabela de reajuste "valor atual = valor novo", uma faixa por linha ("100,00 = 120,00").
+    Linhas vazias e começadas por # são ignoradas. ValueError se alguma linha for inválida.
+    """
+    tabela = {}
+    for numero, linha in enumerate(linhas, start=1):
+        linha = linha.strip()
+        if not linha or linha.startswith('#'):
+            continue
+        try:
+            atual, novo = (Decimal(parte.strip().replace(',', '.')) for parte in linha.split('='))
+        except (ValueError, InvalidOperation):
+            raise ValueError(f"linha {numero}: use 'valor atual = valor novo' ({linha!r})")
+        if novo < 0:
+            raise ValueError(f"linha {numero}: benefício negativo")
+        tabela[atual] = novo
+    if not tabela:
+        raise ValueError("a tabela está vazia")
+    return tabela
+
+
+def _novo_beneficio(percentual, tabela):
+    """Expressão do novo valor de beneficio_mensal, em função do valor atual."""
+    if percentual is not None:
+        fator = Value(1 + Decimal(percentual) / 100, output_field=CAMPO_DINHEIRO)
+        return Round(F('beneficio_mensal') * fator, 2, output_field=CAMPO_DINHEIRO)
+    return Case(
+        *(When(beneficio_mensal=de, then=Value(para)) for de, para in tabela.items()),
+        default=F('beneficio_mensal'),
+        output_field=CAMPO_DINHEIRO,
+    )
+
+
+def ajustar_beneficios(beneficiarios, percentual=None, tabela=None):
+    """
+    Reajusta o beneficio_mensal de `beneficiarios` (queryset) em `percentual` (%, ex.: 10 ou -5)
+    ou pela `tabela` {valor atual: valor novo} (quem não está na tabela fica como está).
+
+    Em uma transação, com o número de comandos fixo:
+    1. lê as listas em aberto cujo total atual passará do novo limite (o relatório);
+    2. um UPDATE do limite de todas as listas em aberto desses beneficiários;
+    3. um UPDATE do benefício.
+    O benefício muda por último: filtros do queryset que dependem dele (ex.: benefício até
+    R$ 100) selecionam os mesmos beneficiários nos três passos.
+    """
+    if (percentual is None) == (tabela is None):
+        raise ValueError("Informe o percentual ou a tabela (apenas um).")
+    if percentual is not None and Decimal(percentual) <= -100:
+        raise ValueError("O percentual precisa ser maior que -100.")
+
+    alvo = Beneficiario.objects.filter(pk__in=beneficiarios.order_by().values('pk'))
+    if tabela is not None:
+        alvo = alvo.filter(beneficio_mensal__in=list(tabela))
+    novo_limite = Subquery(
+        Beneficiario.objects.filter(pk=OuterRef('beneficiario_id'))
+        .annotate(limite=_novo_beneficio(percentual, tabela) * FATOR_LIMITE_COMPRA)
+        .values('limite')[:1],
+        output_field=CAMPO_DINHEIRO,
+    )
+    abertas = ListaDeCompra.objects.filter(status='aberta', beneficiario__in=alvo.values('pk'))
+
+    with transaction.atomic():
+        # Mesma trava de obter_ou_criar_lista_aberta: nenhuma lista é aberta com o benefício antigo no meio do reajuste
+        list(alvo.select_for_update().values_list('pk', flat=True))
+        acima = list(
+            abertas.annotate(novo_limite=novo_limite)
+            .filter(valor_total__gt=F('novo_limite'))
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        listas = abertas.update(limite_compra_calculado=novo_limite)
+        quantidade = alvo.update(beneficio_mensal=_novo_beneficio(percentual, tabela))
+        if listas:
+            invalidar_todos_os_resumos()
+    return ResultadoAjuste(beneficiarios=quantidade, listas=listas, listas_acima_do_limite=acima)
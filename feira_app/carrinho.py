@@ -0,0 +1,282 @@
+# feira_app/carrinho.py
+"""
+Operações de carrinho (lista de compra aberta) com o limite garantido pelo banco.
+
+Cada operação roda em uma transação curta que:
+
+1. trava a linha da lista (SELECT ... FOR UPDATE no PostgreSQL; no SQLite a
+   transação já começa com BEGIN IMMEDIATE, ver settings.DATABASES);
+2. aplica a variação de valor com um UPDATE condicional
+   (`WHERE valor_total + delta <= limite_compra_calculado`), de modo que o
+   limite nunca é ultrapassado mesmo com cliques duplos concorrentes;
+3. só então grava o item.
+
+Ao final, o resumo do carrinho em cache (resumo_carrinho.py) é regravado com os
+valores lidos sob a trava.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import FATOR_LIMITE_COMPRA, Beneficiario, ItemDaLista, ListaDeCompra, Produto
+from .resumo_carrinho import ResumoCarrinho, gravar_resumo, ler_resumo, preencher_resumo, resumo_em_cache
+
+
+@dataclass
+class ResultadoCarrinho:
+    sucesso: bool
+    total: Decimal
+    limite: Decimal
+    quantidade_itens: int
+    item: ItemDaLista | None = None
+    # Motivo quando a operação nem chegou a ser tentada (lista encerrada, item já removido)
+    erro: str = ''
+
+    @property
+    def limite_restante(self):
+        return self.limite - self.total
+
+
+@dataclass
+class ResultadoLote(ResultadoCarrinho):
+    itens: list = field(default_factory=list)
+    produtos_indisponiveis: list = field(default_factory=list)
+
+
+def obter_ou_criar_lista_aberta(beneficiario):
+    """Lista aberta do beneficiário, criada (sem duplicatas) com limite de 3x o benefício mensal."""
+    lista = (
+        ListaDeCompra.objects.filter(beneficiario=beneficiario, status='aberta')
+        .order_by('-data_criacao')
+        .first()
+    )
+    if lista is not None:
+        return lista
+
+    with transaction.atomic():
+        # Trava o beneficiário para que duas requisições simultâneas não criem duas listas abertas.
+        # O benefício é lido da linha travada (pode ter sido reajustado; ver beneficios.py)
+        beneficio_valor = (
+            Beneficiario.objects.select_for_update().filter(pk=beneficiario.pk)
+            .values_list('beneficio_mensal', flat=True).get()
+        )
+        lista = (
+            ListaDeCompra.objects.filter(beneficiario=beneficiario, status='aberta')
+            .order_by('-data_criacao')
+            .first()
+        )
+        if lista is None:
+            try:
+                with transaction.atomic():
+                    lista = ListaDeCompra.objects.create(
+                        beneficiario=beneficiario,
+                        status='aberta',
+                        limite_compra_calculado=(beneficio_valor or Decimal('0.00')) * FATOR_LIMITE_COMPRA,
+                    )
+            except IntegrityError:
+                # Restrição lista_uma_aberta_por_beneficiario: outra transação (virada de ciclo,
+                # admin) criou a lista aberta sem passar pela trava do beneficiário.
+                lista = ListaDeCompra.objects.get(beneficiario=beneficiario, status='aberta')
+    return lista
+
+
+def obter_resumo(beneficiario):
+    """
+    Resumo da lista aberta do beneficiário (resumo_carrinho.py): do cache, sem consultas,
+    ou, na falta ou sem cache compartilhado, da lista aberta (criada se preciso).
+    """
+    if not resumo_em_cache():
+        return ResumoCarrinho.da_lista(obter_ou_criar_lista_aberta(beneficiario))
+    resumo = ler_resumo(beneficiario.pk)
+    if resumo is None:
+        resumo = ResumoCarrinho.da_lista(obter_ou_criar_lista_aberta(beneficiario))
+        preencher_resumo(beneficiario.pk, resumo)
+    return resumo
+
+
+LISTA_FECHADA = "Esta lista não está mais aberta. Atualize a página para ver a sua lista atual."
+ITEM_AUSENTE = "Este item não está mais na sua lista."
+
+
+def _travar_lista(lista_id):
+    """
+    A lista aberta, travada; None se ela já foi encerrada (virada de ciclo, admin) ou
+    excluída depois que a página foi carregada.
+    """
+    return (
+        ListaDeCompra.objects.select_for_update()
+        .only('beneficiario_id', 'valor_total', 'quantidade_itens', 'limite_compra_calculado')
+        .filter(pk=lista_id, status='aberta')
+        .first()
+    )
+
+
+def _lista_fechada(classe=ResultadoCarrinho):
+    return classe(
+        sucesso=False, total=Decimal('0.00'), limite=Decimal('0.00'), quantidade_itens=0, erro=LISTA_FECHADA
+    )
+
+
+def _aplicar_delta(lista, delta_valor, delta_itens):
+    """UPDATE condicional: aplica o delta só se o limite continuar respeitado."""
+    listas = ListaDeCompra.objects.filter(pk=lista.pk)
+    if delta_valor > 0:
+        # Reduções são sempre aceitas, mesmo que a lista já esteja acima do limite.
+        listas = listas.filter(limite_compra_calculado__gte=F('valor_total') + delta_valor)
+    aplicado = listas.update(
+        valor_total=F('valor_total') + delta_valor,
+        quantidade_itens=F('quantidade_itens') + delta_itens,
+    ) == 1
+    if aplicado:
+        # A linha está travada: o novo valor é exatamente o anterior mais o delta.
+        lista.valor_total += delta_valor
+        lista.quantidade_itens += delta_itens
+    return aplicado
+
+
+def _resultado(sucesso, lista, item=None, erro=''):
+    # Mesmo sem sucesso: os valores foram lidos sob a trava e podem ser mais novos que o cache
+    gravar_resumo(lista.beneficiario_id, ResumoCarrinho.da_lista(lista))
+    return ResultadoCarrinho(
+        sucesso=sucesso,
+        total=lista.valor_total,
+        limite=lista.limite_compra_calculado,
+        quantidade_itens=lista.quantidade_itens,
+        item=item,
+        erro=erro,
+    )
+
+
+def adicionar_item(lista_id, produto, quantidade):
+    """Soma `quantidade` unidades de `produto` à lista, respeitando o limite."""
+    with transaction.atomic():
+        lista = _travar_lista(lista_id)
+        if lista is None:
+            return _lista_fechada()
+        item = ItemDaLista.objects.filter(lista_id=lista.pk, produto_id=produto.pk).first()
+        preco = item.preco_unitario_no_momento if item else Decimal(produto.preco_unitario)
+        custo = preco * quantidade
+
+        if not _aplicar_delta(lista, custo, 0 if item else 1):
+            return _resultado(False, lista, item)
+
+        if item:
+            ItemDaLista.objects.filter(pk=item.pk).update(quantidade=F('quantidade') + quantidade)
+            item.quantidade += quantidade
+        else:
+            item = ItemDaLista.objects.create(
+                lista=lista,  # o sinal de ItemDaLista acha o beneficiário sem consultar a lista
+                produto=produto,
+                quantidade=quantidade,
+                preco_unitario_no_momento=preco,
+            )
+        return _resultado(True, lista, item)
+
+
+def atualizar_quantidade(lista_id, item_id, nova_quantidade):
+    """Define a quantidade de um item da lista, respeitando o limite."""
+    with transaction.atomic():
+        lista = _travar_lista(lista_id)
+        if lista is None:
+            return _lista_fechada()
+        item = ItemDaLista.objects.select_related('produto').filter(pk=item_id, lista_id=lista.pk).first()
+        if item is None:
+            return _resultado(False, lista, erro=ITEM_AUSENTE)
+        delta = (nova_quantidade - item.quantidade) * item.preco_unitario_no_momento
+
+        if not _aplicar_delta(lista, delta, 0):
+            return _resultado(False, lista, item)
+
+        ItemDaLista.objects.filter(pk=item.pk).update(quantidade=nova_quantidade)
+        item.quantidade = nova_quantidade
+        return _resultado(True, lista, item)
+
+
+def remover_item(lista_id, item_id):
+    """Remove um item da lista e desconta seu subtotal."""
+    with transaction.atomic():
+        lista = _travar_lista(lista_id)
+        if lista is None:
+            return _lista_fechada()
+        item = ItemDaLista.objects.select_related('produto').filter(pk=item_id, lista_id=lista.pk).first()
+        if item is None:
+            return _resultado(False, lista, erro=ITEM_AUSENTE)
+        item.lista = lista  # como em adicionar_item, para o sinal de exclusão
+        item.delete()
+        _aplicar_delta(lista, -item.subtotal, -1)
+        return _resultado(True, lista, item)
+
+
+def aplicar_lote(lista_id, mudancas, substituir=False):
+    """
+    Aplica de uma vez um lote {produto_id: quantidade} à lista.
+
+    Com substituir=False as quantidades são somadas às atuais (como adicionar_item);
+    com substituir=True passam a ser a quantidade final de cada item (0 remove o item).
+    Tudo ou nada: se algum produto estiver indisponível ou o novo total passar do
+    limite, nada é gravado.
+    """
+    with transaction.atomic():
+        lista = _travar_lista(lista_id)
+        if lista is None:
+            return _lista_fechada(ResultadoLote)
+        existentes = {
+            item.produto_id: item
+            for item in ItemDaLista.objects.filter(lista_id=lista.pk, produto_id__in=mudancas)
+        }
+        ids_novos = [pid for pid, quantidade in mudancas.items() if pid not in existentes and quantidade > 0]
+        produtos = Produto.objects.filter(disponivel=True).in_bulk(ids_novos)
+        indisponiveis = sorted(set(ids_novos) - produtos.keys())
+        if indisponiveis:
+            return ResultadoLote(
+                sucesso=False, total=lista.valor_total, limite=lista.limite_compra_calculado,
+                quantidade_itens=lista.quantidade_itens, produtos_indisponiveis=indisponiveis,
+            )
+
+        delta_valor, delta_itens = Decimal('0.00'), 0
+        novos, alterados, removidos = [], [], []
+        for produto_id, quantidade in mudancas.items():
+            item = existentes.get(produto_id)
+            if item is None:
+                if quantidade > 0:
+                    produto = produtos[produto_id]
+                    novos.append(ItemDaLista(
+                        lista_id=lista.pk,
+                        produto=produto,
+                        quantidade=quantidade,
+                        preco_unitario_no_momento=produto.preco_unitario,
+                    ))
+                    delta_valor += produto.preco_unitario * quantidade
+                    delta_itens += 1
+                continue
+
+            nova_quantidade = quantidade if substituir else item.quantidade + quantidade
+            if nova_quantidade == item.quantidade:
+                continue
+            delta_valor += (nova_quantidade - item.quantidade) * item.preco_unitario_no_momento
+            if nova_quantidade == 0:
+                item.lista = lista
+                removidos.append(item)
+                delta_itens -= 1
+            else:
+                item.quantidade = nova_quantidade
+                alterados.append(item)
+
+        if not _aplicar_delta(lista, delta_valor, delta_itens):
+            return ResultadoLote(
+                sucesso=False, total=lista.valor_total, limite=lista.limite_compra_calculado,
+                quantidade_itens=lista.quantidade_itens,
+            )
+
+        ItemDaLista.objects.bulk_create(novos)
+        ItemDaLista.objects.bulk_update(alterados, ['quantidade'])
+        for item in removidos:
+            # Pela instância: sem o SELECT do Collector, e o sinal acha o beneficiário na lista
+            item.delete()
+        gravar_resumo(lista.beneficiario_id, ResumoCarrinho.da_lista(lista))
+        return ResultadoLote(
+            sucesso=True, total=lista.valor_total, limite=lista.limite_compra_calculado,
+            quantidade_itens=lista.quantidade_itens, itens=novos + alterados,
+        )
@@ -0,0 +1,184 @@
+# feira_app/catalogo.py
+"""
+Cache do catálogo de produtos disponíveis.
+
+O catálogo muda poucas vezes por semana (via ProdutoAdmin), mas é lido a cada
+acesso a produto_list_view. As linhas já prontas para o template ficam em duas
+camadas:
+
+1. memória do processo (a última versão lida por este worker);
+2. o cache do Django (`CACHES['default']`), compartilhado entre os workers
+   quando configurado com um backend como Redis.
+
+Uma chave de versão no cache do Django identifica o conteúdo atual. Os sinais
+de Produto (ver signals.py) trocam a versão; todos os workers que consultam a
+mesma chave passam a ignorar suas cópias antigas. Com o backend de memória
+local (LocMemCache) a invalidação vale apenas para o próprio processo; por isso,
+sem cache compartilhado (settings.FEIRA_CACHE_COMPARTILHADO), a própria versão
+expira em TIMEOUT_CATALOGO, curto nesse caso (ver settings.py).
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Produto, normalizar_texto
+from .roteador import JANELA_PRIMARIO, leituras_no_primario
+
+CHAVE_VERSAO = 'feira:catalogo:versao'
+TIMEOUT_CATALOGO = getattr(settings, 'FEIRA_CATALOGO_TIMEOUT', 60 * 60 * 24)
+# Com cache compartilhado a versão só muda por invalidação; sem ele, expira com as páginas
+TIMEOUT_VERSAO = None if getattr(settings, 'FEIRA_CACHE_COMPARTILHADO', False) else TIMEOUT_CATALOGO
+POR_PAGINA = getattr(settings, 'FEIRA_PRODUTOS_POR_PAGINA', 60)
+# Limite de páginas (buscas incluídas) guardadas na memória do processo por versão
+MAX_PAGINAS_MEMORIA = 256
+
+_lock = threading.Lock()
+_estatisticas = {
+    'acertos_memoria': 0,
+    'acertos_cache': 0,
+    'faltas': 0,
+    'invalidacoes': 0,
+}
+# (versão, {chave_consulta: página}) da última versão vista por este processo
+_memoria = (None, {})
+
+
+def _contar(nome):
+    with _lock:
+        _estatisticas[nome] += 1
+
+
+def _nova_versao():
+    # O instante da criação vai na versão: ver _versao_recente
+    return f'{int(time.time())}-{uuid.uuid4().hex}'
+
+
+def _versao_recente(versao):
+    """
+    Versão criada há menos de JANELA_PRIMARIO segundos. As páginas dela são lidas do
+    primário: a réplica pode ainda não ter a alteração que gerou a versão, e a página
+    ficaria no cache por TIMEOUT_CATALOGO.
+    """
+    criada, _, _ = versao.partition('-')
+    return not criada.isdigit() or time.time() - int(criada) < JANELA_PRIMARIO
+
+
+def versao_atual():
+    """Versão corrente do catálogo; cria uma se o cache estiver vazio."""
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, _nova_versao(), TIMEOUT_VERSAO)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def invalidar_catalogo():
+    """Publica uma nova versão; as cópias antigas deixam de ser usadas em todos os workers."""
+    cache.set(CHAVE_VERSAO, _nova_versao(), TIMEOUT_VERSAO)
+    _contar('invalidacoes')
+
+
+def _montar_linhas(produtos):
+    return [
+        {
+            'id': produto['id'],
+            'nome': produto['nome'],
+            'preco_unitario': produto['preco_unitario'],
+            'unidade_medida': produto['unidade_medida'],
+            'data_atualizacao': produto['data_atualizacao'],
+            'url_adicionar': reverse('feira_app:add_to_list', args=[produto['id']]),
+        }
+        for produto in produtos
+    ]
+
+
+def codificar_cursor(linha):
+    """Cursor opaco para a página seguinte à `linha` (chave (nome, id))."""
+    bruto = json.dumps([linha['nome'], linha['id']], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """(nome, id) a partir de um cursor; None se vazio ou inválido."""
+    if not cursor:
+        return None
+    try:
+        nome, produto_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(nome), int(produto_id)
+    except (ValueError, TypeError, RecursionError):
+        # Cursor editado à mão (ou de uma versão antiga): volta para a primeira página
+        return None
+
+
+def _consultar_pagina(termo, apos, por_pagina):
+    produtos = Produto.objects.filter(disponivel=True)
+    if termo:
+        # Prefixo sobre a coluna normalizada e indexada ("feijao" encontra "Feijão Preto")
+        produtos = produtos.filter(nome_normalizado__startswith=termo)
+    if apos:
+        # Paginação por chave: continua depois de (nome, id), sem OFFSET
+        nome, produto_id = apos
+        produtos = produtos.filter(Q(nome__gt=nome) | Q(nome=nome, id__gt=produto_id))
+    produtos = produtos.order_by('nome', 'id').values(
+        'id', 'nome', 'preco_unitario', 'unidade_medida', 'data_atualizacao'
+    )[:por_pagina + 1]
+    linhas = _montar_linhas(produtos)
+    proximo_cursor = codificar_cursor(linhas[por_pagina - 1]) if len(linhas) > por_pagina else None
+    return linhas[:por_pagina], proximo_cursor
+
+
+def obter_produtos_disponiveis(termo='', cursor=None, por_pagina=None):
+    """
+    Uma página de produtos disponíveis: (linhas prontas para o template, cursor da próxima página).
+
+    `termo` filtra por prefixo do nome, sem diferenciar acentos e maiúsculas.
+    Em regime estável não faz nenhuma consulta ao banco.
+    """
+    global _memoria
+    por_pagina = por_pagina or POR_PAGINA
+    termo = normalizar_texto(termo)
+    apos = decodificar_cursor(cursor)
+    chave_consulta = hashlib.md5(repr((termo, apos, por_pagina)).encode()).hexdigest()
+    versao = versao_atual()
+
+    versao_memoria, paginas_memoria = _memoria
+    if versao_memoria == versao and chave_consulta in paginas_memoria:
+        _contar('acertos_memoria')
+        return paginas_memoria[chave_consulta]
+
+    chave_cache = f'feira:catalogo:{versao}:{chave_consulta}'
+    pagina = cache.get(chave_cache)
+    if pagina is not None:
+        _contar('acertos_cache')
+    else:
+        _contar('faltas')
+        if _versao_recente(versao):
+            with leituras_no_primario():
+                pagina = _consultar_pagina(termo, apos, por_pagina)
+        else:
+            pagina = _consultar_pagina(termo, apos, por_pagina)
+        cache.set(chave_cache, pagina, TIMEOUT_CATALOGO)
+
+    if versao_memoria != versao or len(paginas_memoria) >= MAX_PAGINAS_MEMORIA:
+        paginas_memoria = {}
+    paginas_memoria[chave_consulta] = pagina
+    _memoria = (versao, paginas_memoria)
+    return pagina
+
+
+def estatisticas_catalogo():
+    """Contadores de acerto/falta deste processo."""
+    with _lock:
+        dados = dict(_estatisticas)
+    leituras = dados['acertos_memoria'] + dados['acertos_cache'] + dados['faltas']
+    dados['leituras'] = leituras
+    dados['taxa_acerto'] = round((leituras - dados['faltas']) / leituras, 4) if leituras else None
+    return dados
@@ -0,0 +1,83 @@
+# feira_app/ciclo.py
+"""
+Virada de ciclo das listas de compra.
+
+A cada ciclo, as listas abertas criadas antes do início do novo ciclo são
+encerradas (finalizadas se têm itens, canceladas se estão vazias) e cada
+beneficiário recebe uma lista aberta nova com limite de 3x o benefício mensal.
+
+As duas etapas trabalham em lotes por chave primária, cada lote em sua própria
+transação, com UPDATEs e bulk_create. Podem ser interrompidas e executadas de
+novo: o que já foi feito não é refeito (as listas novas são criadas com
+data_criacao >= início do ciclo e não voltam a ser encerradas).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import FATOR_LIMITE_COMPRA, Beneficiario, ListaDeCompra
+from .resumo_carrinho import invalidar_todos_os_resumos
+
+
+def _lotes_de_ids(queryset, tamanho_lote):
+    """Ids de `queryset` em lotes crescentes de chave primária (paginação por chave)."""
+    ultimo_id = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:tamanho_lote]
+        )
+        if not ids:
+            return
+        yield ids
+        ultimo_id = ids[-1]
+
+
+def encerrar_listas_abertas(inicio_ciclo, tamanho_lote=1000):
+    """
+    Encerra as listas abertas criadas antes de `inicio_ciclo`.
+
+    Retorna (finalizadas, canceladas).
+    """
+    abertas = ListaDeCompra.objects.filter(status='aberta', data_criacao__lt=inicio_ciclo)
+    finalizadas = canceladas = 0
+    for ids in _lotes_de_ids(abertas, tamanho_lote):
+        with transaction.atomic():
+            # Refiltra por status: uma lista pode ter sido encerrada no admin entre a leitura e o UPDATE
+            lote = ListaDeCompra.objects.filter(pk__in=ids, status='aberta')
+            finalizadas += lote.filter(quantidade_itens__gt=0).update(status='finalizada')
+            canceladas += lote.filter(quantidade_itens=0).update(status='cancelada')
+            # Os resumos em cache apontam para as listas encerradas
+            invalidar_todos_os_resumos()
+    return finalizadas, canceladas
+
+
+def abrir_listas(inicio_ciclo, tamanho_lote=1000):
+    """Cria uma lista aberta para cada beneficiário que não tem nenhuma. Retorna quantas foram criadas."""
+    data_criacao = max(timezone.now(), inicio_ciclo)
+    sem_lista_aberta = Beneficiario.objects.filter(
+        ~Exists(ListaDeCompra.objects.filter(beneficiario=OuterRef('pk'), status='aberta'))
+    )
+    criadas = 0
+    for ids in _lotes_de_ids(sem_lista_aberta, tamanho_lote):
+        beneficios = Beneficiario.objects.filter(pk__in=ids).values_list('pk', 'beneficio_mensal')
+        with transaction.atomic():
+            # ignore_conflicts: se uma requisição abriu a lista de alguém do lote nesse meio-tempo,
+            # a restrição lista_uma_aberta_por_beneficiario descarta só aquela linha
+            ListaDeCompra.objects.bulk_create(
+                (
+                    ListaDeCompra(
+                        beneficiario_id=beneficiario_id,
+                        status='aberta',
+                        data_criacao=data_criacao,
+                        limite_compra_calculado=(beneficio or Decimal('0.00')) * FATOR_LIMITE_COMPRA,
+                    )
+                    for beneficiario_id, beneficio in beneficios
+                ),
+                ignore_conflicts=True,
+            )
+            criadas += ListaDeCompra.objects.filter(
+                beneficiario_id__in=ids, status='aberta', data_criacao=data_criacao
+            ).count()
+    return criadas
@@ -1,9 +1,80 @@
 # feira_app/forms.py
 from django import forms
 
+from .catalogo import POR_PAGINA
+
 class AddToListForm(forms.Form):
     quantidade = forms.IntegerField(min_value=1, initial=1, widget=forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'style': 'width: 70px; display: inline-block; margin-right: 10px;'}))
     # produto_id será passado pela URL ou como um campo oculto se necessário
 
 class UpdateListItemForm(forms.Form):
     quantidade = forms.IntegerField(min_value=1, widget=forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'style': 'width: 70px;'}))
+
+class AddManyToListForm(forms.Form):
+    """
+    Lote de mudanças no carrinho: um campo `quantidade_<produto_id>` por produto.
+
+    Aceita tanto o POST do formulário de produto_list.html quanto o JSON
+    {"itens": {"<produto_id>": quantidade}, "modo": "somar"|"definir"} convertido por from_json.
+    """
+    PREFIXO = 'quantidade_'
+    MODOS = [('somar', 'Somar às quantidades atuais'), ('definir', 'Definir a quantidade final')]
+    # A página de produtos envia no máximo uma página do catálogo; mais que isso trava a lista à toa
+    MAX_PRODUTOS = POR_PAGINA
+
+    modo = forms.ChoiceField(choices=MODOS, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        chaves = [chave for chave in self.data if chave.startswith(self.PREFIXO)]
+        self.excede_limite = len(chaves) > self.MAX_PRODUTOS
+        if self.excede_limite:
+            return
+        # Um campo por produto enviado: cada quantidade é validada (e o erro fica) no próprio campo
+        for chave in chaves:
+            produto = chave[len(self.PREFIXO):]
+            self.fields[chave] = forms.IntegerField(
+                min_value=0,
+                required=False,
+                error_messages={
+                    'invalid': f"Quantidade inválida para o produto {produto}: use um número inteiro.",
+                    'min_value': "As quantidades não podem ser negativas.",
+                },
+            )
+
+    @classmethod
+    def from_json(cls, dados):
+        itens = dados.get('itens') if isinstance(dados, dict) else None
+        if not isinstance(itens, dict):
+            itens = {}
+        data = {f"{cls.PREFIXO}{produto_id}": quantidade for produto_id, quantidade in itens.items()}
+        data['modo'] = dados.get('modo', '') if isinstance(dados, dict) else ''
+        return cls(data)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.excede_limite:
+            raise forms.ValidationError(
+                "Envie no máximo %(maximo)s produtos de uma vez.", params={'maximo': self.MAX_PRODUTOS}
+            )
+        mudancas = {}
+        for chave in self.fields:
+            if not chave.startswith(self.PREFIXO) or chave not in cleaned_data:
+                continue  # campo de quantidade com erro
+            try:
+                produto_id = int(chave[len(self.PREFIXO):])
+            except ValueError:
+                self.add_error(chave, f"Produto inválido: {chave[len(self.PREFIXO):]}.")
+                continue
+            mudancas[produto_id] = cleaned_data[chave] or 0
+        if self.errors:
+            return cleaned_data
+
+        cleaned_data['substituir'] = cleaned_data.get('modo') == 'definir'
+        if not cleaned_data['substituir']:
+            # Somando, quantidade 0 significa "não mexer"
+            mudancas = {produto_id: quantidade for produto_id, quantidade in mudancas.items() if quantidade}
+        if not mudancas:
+            raise forms.ValidationError("Informe a quantidade de pelo menos um produto.")
+        cleaned_data['mudancas'] = mudancas
+        return cleaned_data
@@ -0,0 +1,124 @@
+# feira_app/inicializacao.py
+"""
+Inicialização de uma instância nova (cold start no Cloud Run): medição e aquecimento.
+
+Fases, na ordem em que um worker as paga:
+
+1. settings e django.setup() (apps, modelos, admin.autodiscover nos ready());
+2. aplicação WSGI (carga dos middlewares);
+3. URLConf (importa urls.py, views e o admin.site.urls) e templates compilados;
+4. primeira conexão com o banco e catálogo de produtos em cache.
+
+As fases 1 a 3 não tocam o banco: com preload_app (gunicorn.conf.py) rodam uma
+vez no master, antes do fork, e os workers herdam o resultado. A fase 4 é por
+processo (e a conexão, por thread): roda em cada worker e na view de aquecimento.
+
+Os imports do Django ficam dentro das funções: `medir_fases` roda em um processo
+novo e mede a importação do próprio Django.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+# Templates das páginas do beneficiário e do login, com o que eles estendem/incluem
+TEMPLATES_QUENTES = (
+    'feira_app/base.html',
+    'feira_app/login.html',
+    'feira_app/produto_list.html',
+    'feira_app/_produto_card.html',
+    'feira_app/minha_lista.html',
+    'feira_app/_item_lista_linha.html',
+)
+# Orçamento (ms) das fases sem banco, verificado nos testes (InicializacaoTests)
+ORCAMENTO_MS = int(os.environ.get('FEIRA_ORCAMENTO_INICIALIZACAO_MS', '2000'))
+
+
+@contextmanager
+def _medir(tempos, fase):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if tempos is not None:
+            tempos[fase] = round((time.perf_counter() - inicio) * 1000, 1)
+
+
+def preparar_processo(tempos=None):
+    """URLConf e templates compilados. Não abre conexões: seguro no master, antes do fork."""
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    with _medir(tempos, 'urlconf'):
+        get_resolver().url_patterns
+    with _medir(tempos, 'templates'):
+        for nome in TEMPLATES_QUENTES:
+            get_template(nome)
+
+
+def aquecer_conexoes(tempos=None):
+    """Conexões da thread atual com o banco (e a réplica) e primeira página do catálogo em cache."""
+    from django.db import connections
+
+    from .catalogo import obter_produtos_disponiveis
+    from .roteador import ALIAS_REPLICA
+
+    with _medir(tempos, 'conexao'):
+        connections['default'].ensure_connection()
+        if ALIAS_REPLICA in connections:
+            connections[ALIAS_REPLICA].ensure_connection()
+    with _medir(tempos, 'catalogo'):
+        obter_produtos_disponiveis('', '')
+
+
+def aquecer():
+    """Todas as fases que ainda faltarem neste processo; devolve o tempo de cada uma (ms)."""
+    tempos = {}
+    preparar_processo(tempos)
+    aquecer_conexoes(tempos)
+    return tempos
+
+
+def _fases_do_processo(com_banco):
+    """Roda no processo filho de medir_fases: do zero até o aquecimento, fase a fase."""
+    tempos = {}
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'feira_iceflu_project.settings')
+    with _medir(tempos, 'import django'):
+        import django
+        from django.conf import settings
+    with _medir(tempos, 'settings'):
+        settings.INSTALLED_APPS
+    with _medir(tempos, 'django.setup'):
+        django.setup()
+    with _medir(tempos, 'aplicacao'):
+        from django.core.handlers.wsgi import WSGIHandler
+        WSGIHandler()
+    preparar_processo(tempos)
+    if com_banco:
+        aquecer_conexoes(tempos)
+    print(json.dumps(tempos))
+
+
+def medir_fases(com_banco=True, importtime=False, ambiente=None):
+    """
+    Mede as fases em um interpretador novo (como um worker recém-criado).
+
+    Devolve (tempos por fase em ms, total em ms, stderr). Com `importtime`, o stderr
+    traz a saída de `python -X importtime` (tempo de importação de cada módulo).
+    """
+    comando = [sys.executable]
+    if importtime:
+        comando += ['-X', 'importtime']
+    comando += ['-c', f'from feira_app.inicializacao import _fases_do_processo; _fases_do_processo({com_banco!r})']
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        comando, capture_output=True, text=True, env={**os.environ, **(ambiente or {})},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    total = round((time.perf_counter() - inicio) * 1000, 1)
+    if processo.returncode != 0:
+        raise RuntimeError(f"A inicialização falhou:\n{processo.stderr[-2000:]}")
+    tempos = json.loads(processo.stdout.strip().splitlines()[-1])
+    return tempos, total, processo.stderr
@@ -0,0 +1,264 @@
+# feira_app/instrumentacao.py
+"""
+Instrumentação leve das requisições.
+
+Para cada requisição, InstrumentacaoMiddleware mede:
+
+- o tempo total da view (com os middlewares seguintes);
+- o número de consultas e o tempo gasto no banco (execute_wrapper instalado em cada
+  conexão ao ser aberta, ver signals.py; cobre também o ORM assíncrono, que roda em
+  outra thread);
+- o tempo de renderização de templates (backend DjangoTemplatesInstrumentado).
+
+Os números saem no cabeçalho `Server-Timing` (visível no DevTools do navegador)
+e numa linha de log JSON no logger "feira_app.requisicoes". O logger escreve
+numa fila; uma thread separada (QueueListener, iniciada em apps.ready) faz o
+I/O, para que a requisição nunca espere pelo stdout.
+
+Uma amostra das requisições (FEIRA_INSTRUMENTACAO_AMOSTRAGEM) alimenta
+histogramas em memória por view, expostos em metricas_view.
+"""
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('feira_app.requisicoes')
+
+TAXA_AMOSTRAGEM = getattr(settings, 'FEIRA_INSTRUMENTACAO_AMOSTRAGEM', 0.1)
+# Limites superiores das faixas dos histogramas (ms, ou nº de consultas); a última é "acima de 5000"
+FAIXAS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_medicao_atual = contextvars.ContextVar('feira_medicao', default=None)
+_lock = threading.Lock()
+_histogramas = {}
+_listener = None
+
+
+class Medicao:
+    __slots__ = ('consultas', 'tempo_db', 'tempo_template', '_profundidade_template')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.tempo_template = 0.0
+        self._profundidade_template = 0
+
+
+def medir_consulta(execute, sql, params, many, context):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.tempo_db += time.perf_counter() - inicio
+        medicao.consultas += 1
+
+
+class _TemplateInstrumentado:
+    """Envolve o Template do backend; só o render mais externo conta (includes e fragmentos já estão dentro)."""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, nome):
+        return getattr(self._template, nome)
+
+    def render(self, context=None, request=None):
+        medicao = _medicao_atual.get()
+        if medicao is None:
+            return self._template.render(context, request)
+        medicao._profundidade_template += 1
+        inicio = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            medicao._profundidade_template -= 1
+            if medicao._profundidade_template == 0:
+                medicao.tempo_template += time.perf_counter() - inicio
+
+
+class DjangoTemplatesInstrumentado(DjangoTemplates):
+    """Backend DjangoTemplates que soma o tempo de renderização na medição da requisição."""
+
+    def from_string(self, template_code):
+        return _TemplateInstrumentado(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TemplateInstrumentado(super().get_template(template_name))
+
+
+class _Histograma:
+    __slots__ = ('contagens', 'soma', 'total')
+
+    def __init__(self):
+        self.contagens = [0] * (len(FAIXAS) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def registrar(self, valor):
+        self.contagens[bisect.bisect_left(FAIXAS, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def percentil(self, p):
+        """Limite superior da faixa que contém o percentil p (aproximação do histograma)."""
+        alvo = self.total * p / 100
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return FAIXAS[indice] if indice < len(FAIXAS) else None
+        return None
+
+    def como_dict(self):
+        rotulos = [f"<={limite}" for limite in FAIXAS] + [f">{FAIXAS[-1]}"]
+        return {
+            'amostras': self.total,
+            'media': round(self.soma / self.total, 2) if self.total else None,
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'p99': self.percentil(99),
+            'faixas': dict(zip(rotulos, self.contagens)),
+        }
+
+
+def _registrar_amostra(view, medidas):
+    with _lock:
+        por_medida = _histogramas.setdefault(view, {})
+        for nome, valor in medidas.items():
+            histograma = por_medida.get(nome)
+            if histograma is None:
+                histograma = por_medida[nome] = _Histograma()
+            histograma.registrar(valor)
+
+
+def estatisticas_requisicoes():
+    """Histogramas amostrados por view deste processo: {view: {medida: {...}}}."""
+    with _lock:
+        return {
+            view: {nome: histograma.como_dict() for nome, histograma in por_medida.items()}
+            for view, por_medida in sorted(_histogramas.items())
+        }
+
+
+def iniciar_log_assincrono():
+    """
+    Liga o logger de requisições a uma fila esvaziada por uma thread própria.
+
+    Não faz nada se o logger já tiver handlers (por exemplo, configurados em LOGGING).
+    """
+    global _listener
+    if _listener is not None or logger.handlers:
+        return
+    fila = queue.SimpleQueue()
+    destino = logging.StreamHandler(sys.stdout)
+    destino.setFormatter(logging.Formatter('%(message)s'))
+    _listener = logging.handlers.QueueListener(fila, destino, respect_handler_level=True)
+    logger.addHandler(logging.handlers.QueueHandler(fila))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _reiniciar_log_apos_fork():
+    """
+    No processo filho do fork só existe a thread que chamou fork(): sem isto, os workers
+    do gunicorn com preload_app (o master roda o ready()) enfileirariam linhas que nenhuma
+    thread escreve.
+    """
+    global _listener
+    if _listener is None:
+        return
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    _listener = None
+    iniciar_log_assincrono()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_log_apos_fork)
+
+
+class InstrumentacaoMiddleware:
+    """Mede cada requisição e publica os tempos em Server-Timing, no log e nos histogramas."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        self._publicar(request, response, medicao, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        # O contexto (e com ele a medição) acompanha as chamadas sync_to_async do ORM
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        self._publicar(request, response, medicao, time.perf_counter() - inicio)
+        return response
+
+    def _publicar(self, request, response, medicao, duracao):
+        total_ms = duracao * 1000
+        db_ms = medicao.tempo_db * 1000
+        template_ms = medicao.tempo_template * 1000
+
+        response['Server-Timing'] = (
+            f'app;dur={total_ms:.1f}, '
+            f'db;dur={db_ms:.1f};desc="{medicao.consultas} consultas", '
+            f'tpl;dur={template_ms:.1f}'
+        )
+
+        match = request.resolver_match
+        view = match.view_name if match else '(sem rota)'
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'metodo': request.method,
+                'caminho': request.path,
+                'view': view,
+                'status': response.status_code,
+                'tempo_ms': round(total_ms, 1),
+                'consultas': medicao.consultas,
+                'db_ms': round(db_ms, 1),
+                'template_ms': round(template_ms, 1),
+            }, ensure_ascii=False))
+        if random.random() < TAXA_AMOSTRAGEM:
+            _registrar_amostra(view, {
+                'tempo_ms': total_ms,
+                'db_ms': db_ms,
+                'template_ms': template_ms,
+                'consultas': medicao.consultas,
+            })
@@ -0,0 +1,96 @@
+# feira_app/management/commands/ajustar_beneficios.py
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from feira_app.beneficios import ajustar_beneficios, ler_tabela
+from feira_app.models import Beneficiario, ListaDeCompra
+
+MAX_LISTAS_NO_RELATORIO = 50
+
+
+class _Simulacao(Exception):
+    """Desfaz a transação de --simular."""
+
+
+def _decimal(valor):
+    try:
+        return Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        raise CommandError(f"Número inválido: {valor!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Reajusta o benefício mensal de um conjunto de beneficiários, em percentual ou por uma tabela "
+        "de valores, e recalcula o limite de compra das listas em aberto deles (UPDATEs em conjunto, "
+        "em uma transação). Aponta as listas cujo total já passa do novo limite."
+    )
+
+    def add_arguments(self, parser):
+        ajuste = parser.add_mutually_exclusive_group(required=True)
+        ajuste.add_argument('--percentual', help="Ex.: 10 para +10%%, -5 para -5%%.")
+        ajuste.add_argument(
+            '--tabela', metavar='ARQUIVO',
+            help="Arquivo com uma faixa por linha: valor atual = valor novo (ex.: 150,00 = 180,00).",
+        )
+        parser.add_argument('--emails', nargs='+', help="Só estes beneficiários.")
+        parser.add_argument('--beneficio-min', help="Só benefício mensal a partir deste valor.")
+        parser.add_argument('--beneficio-max', help="Só benefício mensal até este valor.")
+        parser.add_argument('--simular', action='store_true', help="Mostra o resultado e desfaz tudo.")
+
+    def handle(self, *args, **options):
+        beneficiarios = Beneficiario.objects.all()
+        if options['emails']:
+            beneficiarios = beneficiarios.filter(email__in=options['emails'])
+        if options['beneficio_min']:
+            beneficiarios = beneficiarios.filter(beneficio_mensal__gte=_decimal(options['beneficio_min']))
+        if options['beneficio_max']:
+            beneficiarios = beneficiarios.filter(beneficio_mensal__lte=_decimal(options['beneficio_max']))
+
+        percentual = tabela = None
+        if options['percentual']:
+            percentual = _decimal(options['percentual'])
+        else:
+            try:
+                with open(options['tabela'], encoding='utf-8-sig') as arquivo:
+                    tabela = ler_tabela(arquivo)
+            except OSError as exc:
+                raise CommandError(f"Não foi possível abrir {options['tabela']}: {exc}")
+            except ValueError as exc:
+                raise CommandError(f"Tabela inválida: {exc}")
+
+        try:
+            with transaction.atomic():
+                resultado = ajustar_beneficios(beneficiarios, percentual=percentual, tabela=tabela)
+                self._relatar(resultado)
+                if options['simular']:
+                    raise _Simulacao
+        except _Simulacao:
+            self.stdout.write(self.style.WARNING("Simulação: nada foi gravado."))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+    def _relatar(self, resultado):
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.beneficiarios} beneficiário(s) reajustado(s); "
+            f"limite recalculado em {resultado.listas} lista(s) em aberto."
+        ))
+        if not resultado.listas_acima_do_limite:
+            return
+        self.stdout.write(self.style.WARNING(
+            f"{len(resultado.listas_acima_do_limite)} lista(s) em aberto com total acima do novo limite:"
+        ))
+        listas = (
+            ListaDeCompra.objects.filter(pk__in=resultado.listas_acima_do_limite[:MAX_LISTAS_NO_RELATORIO])
+            .select_related('beneficiario')
+            .order_by('pk')
+        )
+        for lista in listas:
+            self.stdout.write(
+                f"  lista {lista.pk} ({lista.beneficiario.nome} <{lista.beneficiario.email}>): "
+                f"total R$ {lista.valor_total:.2f}, limite R$ {lista.limite_compra_calculado:.2f}"
+            )
+        if len(resultado.listas_acima_do_limite) > MAX_LISTAS_NO_RELATORIO:
+            self.stdout.write(f"  ... e mais {len(resultado.listas_acima_do_limite) - MAX_LISTAS_NO_RELATORIO}.")
@@ -0,0 +1,156 @@
+# feira_app/management/commands/benchmark_admissao.py
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from feira_app import admissao
+from feira_app.bench import banco_temporario, executar_concorrente, percentis
+from feira_app.ciclo import abrir_listas
+from feira_app.models import Beneficiario, Produto, normalizar_texto
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula a abertura da feira: muitas threads adicionando produtos ao mesmo tempo (add_to_list_view, "
+        "Client do Django) em um banco temporário, sem e com o controle de admissão (feira_app/admissao.py). "
+        "Mostra p50/p95/p99 das ações admitidas e das rejeitadas (429) e falha se, com o controle, o p99 "
+        "das admitidas passar de --p99-maximo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32, help="Requisições simultâneas.")
+        parser.add_argument('--requisicoes', type=int, default=20, help="Requisições por thread.")
+        parser.add_argument('--beneficiarios', type=int, default=256)
+        parser.add_argument('--produtos', type=int, default=200)
+        parser.add_argument('--taxa', type=float, default=admissao.TAXA, help="Ações/s por usuário.")
+        parser.add_argument('--rajada', type=int, default=admissao.RAJADA)
+        parser.add_argument(
+            '--concorrencia', type=int, default=admissao.CONCORRENCIA,
+            help="Ações simultâneas admitidas no processo.",
+        )
+        parser.add_argument(
+            '--espera-429', type=float, default=200, metavar='MS',
+            help="Pausa do cliente simulado depois de um 429, fora da latência medida (quem recebe 429 "
+                 "não reenvia na hora; padrão: 200).",
+        )
+        parser.add_argument('--p99-maximo', type=float, metavar='MS', help="p99 máximo das ações admitidas.")
+
+    def handle(self, *args, **options):
+        if options['beneficiarios'] < options['threads']:
+            raise CommandError("Use pelo menos um beneficiário por thread.")
+        if options['concorrencia'] <= 0:
+            raise CommandError("--concorrencia precisa ser maior que 0.")
+
+        # Uma linha de log por requisição (e um aviso por 429) só atrapalharia a medição
+        loggers = [logging.getLogger('feira_app.requisicoes'), logging.getLogger('django.request')]
+        niveis_anteriores = [logger.level for logger in loggers]
+        for logger in loggers:
+            logger.setLevel(logging.ERROR)
+        limites_anteriores = (admissao.TAXA, admissao.RAJADA, admissao.CONCORRENCIA)
+        setup_test_environment()
+        try:
+            with banco_temporario(verbosity=options['verbosity'] - 1 if options['verbosity'] else 0):
+                resultados = self._executar(options)
+        finally:
+            admissao.configurar(*limites_anteriores)
+            teardown_test_environment()
+            for logger, nivel in zip(loggers, niveis_anteriores):
+                logger.setLevel(nivel)
+
+        limite = options['p99_maximo']
+        p99 = resultados['com controle']['p99']
+        if limite is not None:
+            if p99 is None or p99 > limite:
+                raise CommandError(f"p99 das ações admitidas com o controle: {p99} ms (máximo {limite} ms).")
+            self.stdout.write(self.style.SUCCESS(f"p99 com o controle dentro do limite ({p99} <= {limite} ms)."))
+
+    def _popular(self, options):
+        Produto.objects.bulk_create(
+            Produto(
+                nome=nome,
+                nome_normalizado=normalizar_texto(nome),
+                preco_unitario=Decimal('1.00') + Decimal(i % 40) / 4,
+            )
+            for i, nome in enumerate(f"Produto {i:05d}" for i in range(options['produtos']))
+        )
+        User = get_user_model()
+        senha = make_password(None)
+        usuarios = User.objects.bulk_create(
+            User(username=f"bench{i}", email=f"bench{i}@example.com", password=senha)
+            for i in range(options['beneficiarios'])
+        )
+        Beneficiario.objects.bulk_create(
+            Beneficiario(
+                nome=f"Beneficiário {i}",
+                email=usuario.email,
+                user=usuario,
+                beneficio_mensal=Decimal('100000.00'),  # alto: as adições nunca batem no limite da lista
+            )
+            for i, usuario in enumerate(usuarios)
+        )
+        abrir_listas(timezone.now())
+        return usuarios, list(Produto.objects.values_list('pk', flat=True))
+
+    def _executar(self, options):
+        usuarios, produtos_ids = self._popular(options)
+        clientes = []
+        for usuario in usuarios:
+            cliente = Client(headers={'Accept': 'application/json'})
+            cliente.force_login(usuario)
+            clientes.append(cliente)
+        threads = options['threads']
+        espera_429 = options['espera_429'] / 1000
+
+        resultados = {}
+        for fase, concorrencia in (('sem controle', 0), ('com controle', options['concorrencia'])):
+            admissao.configurar(
+                taxa=options['taxa'] if concorrencia else 0, rajada=options['rajada'], concorrencia=concorrencia
+            )
+            cache.clear()  # baldes vazios nas duas fases
+            por_status = {}
+            trava = threading.Lock()
+
+            def requisitar(indice_thread, repeticao):
+                # Cada thread usa a sua fatia de beneficiários (um Client nunca é usado por duas threads)
+                fatia = clientes[indice_thread::threads]
+                produto_id = produtos_ids[(indice_thread * 31 + repeticao) % len(produtos_ids)]
+                inicio = time.perf_counter()
+                resposta = fatia[repeticao % len(fatia)].post(
+                    reverse('feira_app:add_to_list', args=[produto_id]), {'quantidade': 1}
+                )
+                duracao = time.perf_counter() - inicio
+                with trava:
+                    por_status.setdefault(resposta.status_code, []).append(duracao)
+                if resposta.status_code == 429:
+                    time.sleep(espera_429)
+
+            _, duracao, erros = executar_concorrente(requisitar, threads, options['requisicoes'])
+            admitidas = [t for status, tempos in por_status.items() if status != 429 for t in tempos]
+            rejeitadas = por_status.get(429, [])
+            resultados[fase] = {
+                **percentis(admitidas),
+                'admitidas': len(admitidas),
+                'rejeitadas': len(rejeitadas),
+                'erros': len(erros),
+            }
+            rejeitadas_ms = percentis(rejeitadas)
+            self.stdout.write(
+                f"{fase:>12}: {len(admitidas)} admitidas ({len(admitidas) / duracao:.1f}/s), "
+                f"p50={resultados[fase]['p50']} ms, p95={resultados[fase]['p95']} ms, "
+                f"p99={resultados[fase]['p99']} ms; "
+                f"{len(rejeitadas)} rejeitadas (429, p99={rejeitadas_ms['p99']} ms); {len(erros)} erros"
+            )
+            if erros:
+                self.stdout.write(f"{'':>14}primeiro erro: {erros[0]!r}")
+        self.stdout.write(f"Contadores do processo: {admissao.estatisticas_admissao()}")
+        return resultados
@@ -0,0 +1,68 @@
+# feira_app/management/commands/benchmark_carrinho.py
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+
+from feira_app import carrinho
+from feira_app.bench import banco_temporario, executar_concorrente, percentis
+from feira_app.models import Beneficiario, ListaDeCompra, Produto
+
+
+class Command(BaseCommand):
+    help = (
+        "Estressa o serviço de carrinho com adições concorrentes na mesma lista, em um banco "
+        "temporário do backend configurado (SQLite ou PostgreSQL), e mede a vazão. "
+        "Falha se o limite de alguma lista for ultrapassado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operacoes', type=int, default=100, help="Adições por thread.")
+        parser.add_argument('--listas', type=int, default=1, help="Listas disputadas pelas threads.")
+        parser.add_argument('--produtos', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with banco_temporario(verbosity=options['verbosity'] - 1 if options['verbosity'] else 0):
+            self._executar(options)
+
+    def _executar(self, options):
+        produtos = Produto.objects.bulk_create(
+            Produto(nome=f"Produto {i:04d}", preco_unitario=Decimal('2.50')) for i in range(options['produtos'])
+        )
+        listas = []
+        for i in range(options['listas']):
+            beneficiario = Beneficiario.objects.create(
+                nome=f"Beneficiário {i}", email=f"bench{i}@example.com", beneficio_mensal=Decimal('100.00')
+            )
+            listas.append(carrinho.obter_ou_criar_lista_aberta(beneficiario))
+
+        aceitas = []
+
+        def adicionar(indice_thread, repeticao):
+            lista = listas[indice_thread % len(listas)]
+            produto = produtos[(indice_thread * 7 + repeticao) % len(produtos)]
+            aceitas.append(carrinho.adicionar_item(lista.pk, produto, 1).sucesso)
+
+        latencias, duracao, erros = executar_concorrente(
+            adicionar, threads=options['threads'], repeticoes=options['operacoes']
+        )
+
+        total_operacoes = len(latencias)
+        self.stdout.write(f"Backend: {connection.vendor}")
+        self.stdout.write(
+            f"{total_operacoes} operações em {duracao:.2f}s "
+            f"({total_operacoes / duracao:.1f} op/s), {sum(aceitas)} aceitas, "
+            f"{len(aceitas) - sum(aceitas)} recusadas pelo limite, {len(erros)} erros"
+        )
+        self.stdout.write("Latência (ms): " + ", ".join(f"{k}={v}" for k, v in percentis(latencias).items()))
+
+        estouradas = ListaDeCompra.objects.com_totais_reais().filter(
+            pk__in=[lista.pk for lista in listas], total_real__gt=F('limite_compra_calculado')
+        ).count()
+        if erros:
+            raise CommandError(f"{len(erros)} operações falharam; primeiro erro: {erros[0]!r}")
+        if estouradas:
+            raise CommandError(f"{estouradas} lista(s) ultrapassaram o limite.")
+        self.stdout.write(self.style.SUCCESS("Nenhuma lista ultrapassou o limite."))
@@ -0,0 +1,68 @@
+# feira_app/management/commands/benchmark_conexao.py
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+from feira_app.bench import banco_temporario, executar_concorrente, percentis
+from feira_app.models import Beneficiario, ListaDeCompra, Produto
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o custo de abrir uma conexão por requisição (CONN_MAX_AGE=0) contra conexões persistentes "
+        "com health check, em um banco temporário do backend configurado. Cada requisição simulada "
+        "dispara request_started/request_finished (que fecham ou reaproveitam a conexão, como no "
+        "gunicorn) e faz as consultas de uma página típica. Faz sentido contra PostgreSQL: no SQLite "
+        "abrir uma conexão custa quase nada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Threads (como as do gunicorn gthread).")
+        parser.add_argument('--requisicoes', type=int, default=200, help="Requisições por thread.")
+        parser.add_argument('--conn-max-age', type=int, default=600)
+
+    def handle(self, *args, **options):
+        with banco_temporario(verbosity=options['verbosity'] - 1 if options['verbosity'] else 0):
+            self._executar(options)
+
+    def _executar(self, options):
+        beneficiario = Beneficiario.objects.create(
+            nome="Beneficiário", email="bench@example.com", beneficio_mensal=Decimal('100.00')
+        )
+        Produto.objects.create(nome="Feijão", preco_unitario=Decimal('7.35'))
+
+        def requisicao(indice_thread, repeticao):
+            request_started.send(sender=self.__class__)
+            try:
+                # Beneficiário com a lista aberta (como o BeneficiarioMiddleware) + uma leitura do catálogo
+                ListaDeCompra.objects.select_related('beneficiario').filter(
+                    beneficiario_id=beneficiario.pk, status='aberta'
+                ).first()
+                list(Produto.objects.filter(disponivel=True).values('id', 'nome')[:60])
+            finally:
+                request_finished.send(sender=self.__class__)
+
+        self.stdout.write(f"Backend: {connection.vendor}; {options['threads']} threads x {options['requisicoes']} requisições")
+        resultados = {}
+        # O settings_dict é compartilhado pelas conexões de todas as threads
+        configuracao = connection.settings_dict
+        for nome, max_age, health_checks in [
+            ('nova conexão por requisição', 0, False),
+            (f"persistente (CONN_MAX_AGE={options['conn_max_age']})", options['conn_max_age'], True),
+        ]:
+            configuracao['CONN_MAX_AGE'] = max_age
+            configuracao['CONN_HEALTH_CHECKS'] = health_checks
+            connection.close()
+            latencias, duracao, erros = executar_concorrente(requisicao, options['threads'], options['requisicoes'])
+            resultados[nome] = percentis(latencias)
+            self.stdout.write(
+                f"{nome}: " + ", ".join(f"{k}={v} ms" for k, v in resultados[nome].items())
+                + f", {len(latencias) / duracao:.0f} req/s, {len(erros)} erros"
+            )
+
+        sem, com = resultados.values()
+        self.stdout.write(self.style.SUCCESS(
+            f"Ganho por requisição (p50): {sem['p50'] - com['p50']:.3f} ms"
+        ))
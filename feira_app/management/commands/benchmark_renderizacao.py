@@ -0,0 +1,95 @@
+# feira_app/management/commands/benchmark_renderizacao.py
+import datetime
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.middleware.csrf import get_token
+from django.template import engines
+from django.test import RequestFactory
+from django.urls import reverse
+
+from feira_app.bench import percentis
+from feira_app.forms import AddToListForm
+
+# Grade de cards como era antes dos fragmentos em cache: widget, {% url %} e
+# {% csrf_token %} renderizados para cada produto, a cada requisição.
+TEMPLATE_ANTES = """
+<div class="row">
+    {% for produto in produtos %}
+    <div class="col-md-4 mb-4">
+        <div class="card">
+            <div class="card-body">
+                <h5 class="card-title">{{ produto.nome }}</h5>
+                <p class="card-text">
+                    Preço: R$ {{ produto.preco_unitario|floatformat:2 }}
+                    {% if produto.unidade_medida %}({{ produto.unidade_medida }}){% endif %}
+                </p>
+                <form method="post" action="{% url 'feira_app:add_to_list' produto.id %}">
+                    {% csrf_token %}
+                    {{ add_form.quantidade.label_tag }}
+                    {{ add_form.quantidade }}
+                    <button type="submit" class="btn btn-success btn-sm">Adicionar à Lista</button>
+                </form>
+            </div>
+        </div>
+    </div>
+    {% endfor %}
+</div>
+"""
+
+TEMPLATE_DEPOIS = """{% load feira_tags %}
+<div class="row">
+    {% cards_produtos produtos %}
+</div>
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o tempo de renderização da grade de produtos de produto_list.html "
+        "sem e com os fragmentos de card em cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=500)
+        parser.add_argument('--repeticoes', type=int, default=30)
+
+    def handle(self, *args, **options):
+        agora = datetime.datetime.now(datetime.timezone.utc)
+        produtos = [
+            {
+                'id': i,
+                'nome': f"Produto {i:04d}",
+                'preco_unitario': Decimal('3.50'),
+                'unidade_medida': 'Kg',
+                'data_atualizacao': agora,
+                'url_adicionar': reverse('feira_app:add_to_list', args=[i]),
+            }
+            for i in range(1, options['produtos'] + 1)
+        ]
+        motor = engines['django']
+        request = RequestFactory().get('/produtos/')
+        get_token(request)
+
+        resultados = {}
+        for nome, fonte, contexto in [
+            ('antes', TEMPLATE_ANTES, {'produtos': produtos, 'add_form': AddToListForm()}),
+            ('depois', TEMPLATE_DEPOIS, {'produtos': produtos}),
+        ]:
+            template = motor.from_string(fonte)
+            template.render(contexto, request)  # aquece (e, no caso "depois", popula o cache)
+            tempos = []
+            for _ in range(options['repeticoes']):
+                inicio = time.perf_counter()
+                template.render(contexto, request)
+                tempos.append(time.perf_counter() - inicio)
+            resultados[nome] = percentis(tempos, pontos=(50, 95))
+            self.stdout.write(
+                f"{nome:>6}: " + ", ".join(f"{k}={v} ms" for k, v in resultados[nome].items())
+            )
+
+        ganho = resultados['antes']['p50'] / resultados['depois']['p50']
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['produtos']} produtos: renderização {ganho:.1f}x mais rápida (p50) com os fragmentos em cache."
+        ))
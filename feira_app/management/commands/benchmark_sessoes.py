@@ -0,0 +1,85 @@
+# feira_app/management/commands/benchmark_sessoes.py
+import logging
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from feira_app import admissao, carrinho
+from feira_app.bench import banco_temporario, percentis
+from feira_app.models import Beneficiario, Produto
+
+BACKENDS = ('db', 'cached_db', 'signed_cookies')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os backends de sessão (db, cached_db, signed_cookies) com CSRF_USE_SESSIONS=True: "
+        "consultas por requisição (total e na tabela de sessões) e latência do ciclo "
+        "POST add_to_list_view + GET da página de produtos para onde ele redireciona."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=100)
+
+    def handle(self, *args, **options):
+        logger_requisicoes = logging.getLogger('feira_app.requisicoes')
+        nivel_anterior = logger_requisicoes.level
+        logger_requisicoes.setLevel(logging.WARNING)
+        # Um único usuário repete o POST: o controle de admissão (admissao.py) o recusaria com 429
+        limites_anteriores = (admissao.TAXA, admissao.RAJADA, admissao.CONCORRENCIA)
+        admissao.configurar(taxa=0, concorrencia=0)
+        setup_test_environment()
+        try:
+            with banco_temporario(verbosity=options['verbosity'] - 1 if options['verbosity'] else 0):
+                self._executar(options)
+        finally:
+            admissao.configurar(*limites_anteriores)
+            teardown_test_environment()
+            logger_requisicoes.setLevel(nivel_anterior)
+
+    def _executar(self, options):
+        usuario = get_user_model().objects.create_user('bench', 'bench@example.com')
+        beneficiario = Beneficiario.objects.create(
+            nome="Beneficiário", email=usuario.email, user=usuario, beneficio_mensal=Decimal('100000.00')
+        )
+        carrinho.obter_ou_criar_lista_aberta(beneficiario)
+        produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('7.35'))
+        url_adicionar = reverse('feira_app:add_to_list', args=[produto.pk])
+
+        self.stdout.write(f"Backend do banco: {connection.vendor}; {options['repeticoes']} ciclos por backend de sessão")
+        consultas_db = None
+        for backend in BACKENDS:
+            with override_settings(
+                SESSION_ENGINE=f'django.contrib.sessions.backends.{backend}', CSRF_USE_SESSIONS=True
+            ):
+                cliente = Client()  # novo cliente: o SessionMiddleware lê SESSION_ENGINE ao ser montado
+                cliente.force_login(usuario)
+                cliente.get(reverse('feira_app:produto_list'))  # aquecimento
+
+                latencias = []
+                consultas = consultas_sessao = 0
+                for _ in range(options['repeticoes']):
+                    inicio = time.perf_counter()
+                    with CaptureQueriesContext(connection) as capturadas:
+                        resposta = cliente.post(url_adicionar, {'quantidade': 1})
+                        cliente.get(resposta['Location'])
+                    latencias.append(time.perf_counter() - inicio)
+                    consultas += len(capturadas)
+                    consultas_sessao += sum('django_session' in consulta['sql'] for consulta in capturadas)
+
+            # Duas requisições por ciclo
+            por_requisicao = consultas / (2 * options['repeticoes'])
+            sessao_por_requisicao = consultas_sessao / (2 * options['repeticoes'])
+            if consultas_db is None:
+                consultas_db = por_requisicao
+            self.stdout.write(
+                f"{backend:>15}: {por_requisicao:.1f} consultas/req ({sessao_por_requisicao:.1f} de sessão), "
+                f"economia de {consultas_db - por_requisicao:.1f} consultas/req em relação a db; ciclo "
+                + ", ".join(f"{k}={v} ms" for k, v in percentis(latencias, pontos=(50, 95)).items())
+            )
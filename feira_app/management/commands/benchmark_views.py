@@ -0,0 +1,204 @@
+# feira_app/management/commands/benchmark_views.py
+import json
+import logging
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from feira_app import admissao
+from feira_app.bench import banco_temporario, executar_concorrente, percentis
+from feira_app.ciclo import abrir_listas
+from feira_app.models import Beneficiario, ItemDaLista, ListaDeCompra, Produto, normalizar_texto
+
+VIEWS = ('produto_list', 'minha_lista', 'add_to_list')
+ITENS_POR_LISTA = 15
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p95/p99), vazão e consultas por requisição de produto_list_view, "
+        "minha_lista_view e add_to_list_view com vários beneficiários simultâneos (Client do Django "
+        "em threads), em um banco temporário do backend configurado (SQLite ou PostgreSQL). "
+        "Grava os resultados como baseline (--salvar) e compara com uma baseline anterior (--comparar), "
+        "falhando se alguma view piorar além de --tolerancia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requisicoes', type=int, default=50, help="Requisições por thread e por view.")
+        parser.add_argument('--beneficiarios', type=int, default=200)
+        parser.add_argument('--produtos', type=int, default=1500)
+        parser.add_argument('--views', nargs='+', choices=VIEWS, default=list(VIEWS))
+        parser.add_argument('--salvar', metavar='ARQUIVO', help="Grava os resultados em JSON (baseline).")
+        parser.add_argument('--comparar', metavar='ARQUIVO', help="Baseline JSON para comparar.")
+        parser.add_argument(
+            '--tolerancia', type=float, default=20.0,
+            help="Piora aceitável (%%) de p95 e de requisições/s em relação à baseline (padrão: 20).",
+        )
+
+    def handle(self, *args, **options):
+        if options['beneficiarios'] < options['threads']:
+            raise CommandError("Use pelo menos um beneficiário por thread.")
+        baseline = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as arquivo:
+                    baseline = json.load(arquivo)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Não foi possível ler a baseline {options['comparar']}: {exc}")
+
+        # Uma linha de log por requisição só atrapalharia a medição
+        logger_requisicoes = logging.getLogger('feira_app.requisicoes')
+        nivel_anterior = logger_requisicoes.level
+        logger_requisicoes.setLevel(logging.WARNING)
+        # Mede as views, não o controle de admissão (ver benchmark_admissao): sem limites por usuário
+        limites_anteriores = (admissao.TAXA, admissao.RAJADA, admissao.CONCORRENCIA)
+        admissao.configurar(taxa=0, concorrencia=0)
+        setup_test_environment()
+        try:
+            with banco_temporario(verbosity=options['verbosity'] - 1 if options['verbosity'] else 0):
+                resultados = self._executar(options)
+        finally:
+            admissao.configurar(*limites_anteriores)
+            teardown_test_environment()
+            logger_requisicoes.setLevel(nivel_anterior)
+
+        if options['salvar']:
+            with open(options['salvar'], 'w', encoding='utf-8') as arquivo:
+                json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Baseline gravada em {options['salvar']}.")
+        if baseline is not None:
+            self._comparar(baseline, resultados, options['tolerancia'])
+
+    def _popular(self, options):
+        """Produtos, beneficiários com usuário e uma lista aberta com alguns itens para cada um."""
+        Produto.objects.bulk_create(
+            Produto(
+                nome=nome,
+                nome_normalizado=normalizar_texto(nome),
+                preco_unitario=Decimal('1.00') + Decimal(i % 40) / 4,
+                unidade_medida='Kg' if i % 2 else 'Un',
+            )
+            for i, nome in enumerate(f"Produto {i:05d}" for i in range(options['produtos']))
+        )
+        User = get_user_model()
+        senha = make_password(None)
+        usuarios = User.objects.bulk_create(
+            User(username=f"bench{i}", email=f"bench{i}@example.com", password=senha)
+            for i in range(options['beneficiarios'])
+        )
+        Beneficiario.objects.bulk_create(
+            Beneficiario(
+                nome=f"Beneficiário {i}",
+                email=usuario.email,
+                user=usuario,
+                beneficio_mensal=Decimal('100000.00'),  # alto: as adições do benchmark nunca batem no limite
+            )
+            for i, usuario in enumerate(usuarios)
+        )
+        abrir_listas(timezone.now())
+
+        produtos_ids = list(Produto.objects.order_by('pk').values_list('pk', 'preco_unitario'))
+        ItemDaLista.objects.bulk_create(
+            ItemDaLista(
+                lista_id=lista_id,
+                produto_id=produto_id,
+                quantidade=1 + j % 3,
+                preco_unitario_no_momento=preco,
+            )
+            for n, lista_id in enumerate(ListaDeCompra.objects.values_list('pk', flat=True))
+            for j, (produto_id, preco) in enumerate(
+                produtos_ids[(n * ITENS_POR_LISTA + k) % len(produtos_ids)] for k in range(ITENS_POR_LISTA)
+            )
+        )
+        ListaDeCompra.objects.recalcular_totais()
+        return usuarios, [produto_id for produto_id, _ in produtos_ids]
+
+    def _executar(self, options):
+        usuarios, produtos_ids = self._popular(options)
+        clientes = []
+        for usuario in usuarios:
+            cliente = Client()
+            cliente.force_login(usuario)
+            clientes.append(cliente)
+
+        threads = options['threads']
+        resultados = {
+            'backend': connection.vendor,
+            'threads': threads,
+            'requisicoes_por_thread': options['requisicoes'],
+            'beneficiarios': options['beneficiarios'],
+            'produtos': options['produtos'],
+            'views': {},
+        }
+        for nome_view in options['views']:
+            url_lista = reverse(f'feira_app:{nome_view}') if nome_view != 'add_to_list' else None
+
+            def requisitar(indice_thread, repeticao):
+                # Cada thread atende a sua fatia de beneficiários (um Client nunca é usado por duas threads)
+                fatia = clientes[indice_thread::threads]
+                cliente = fatia[repeticao % len(fatia)]
+                if url_lista:
+                    resposta = cliente.get(url_lista)
+                    esperado = 200
+                else:
+                    produto_id = produtos_ids[(indice_thread * 31 + repeticao) % len(produtos_ids)]
+                    resposta = cliente.post(
+                        reverse('feira_app:add_to_list', args=[produto_id]), {'quantidade': 1}
+                    )
+                    esperado = 302
+                if resposta.status_code != esperado:
+                    raise AssertionError(f"{nome_view}: HTTP {resposta.status_code}")
+
+            # Aquecimento fora da medição (caches, templates, conexões)
+            for indice_thread in range(threads):
+                requisitar(indice_thread, 0)
+
+            with CaptureQueriesContext(connection) as consultas:
+                requisitar(0, 1)
+            latencias, duracao, erros = executar_concorrente(requisitar, threads, options['requisicoes'])
+            if erros:
+                raise CommandError(f"{nome_view}: {len(erros)} requisições falharam; primeiro erro: {erros[0]!r}")
+
+            metricas = {
+                **percentis(latencias),
+                'requisicoes_por_segundo': round(len(latencias) / duracao, 1),
+                'consultas_por_requisicao': len(consultas),
+            }
+            resultados['views'][nome_view] = metricas
+            self.stdout.write(
+                f"{nome_view:>13}: p50={metricas['p50']} ms, p95={metricas['p95']} ms, p99={metricas['p99']} ms, "
+                f"{metricas['requisicoes_por_segundo']} req/s, {metricas['consultas_por_requisicao']} consultas/req"
+            )
+        return resultados
+
+    def _comparar(self, baseline, resultados, tolerancia):
+        fator = tolerancia / 100
+        regressoes = []
+        for nome_view, atual in resultados['views'].items():
+            anterior = baseline.get('views', {}).get(nome_view)
+            if not anterior:
+                self.stdout.write(f"{nome_view}: sem baseline, ignorada na comparação.")
+                continue
+            if anterior.get('p95') and atual['p95'] > anterior['p95'] * (1 + fator):
+                regressoes.append(f"{nome_view}: p95 {anterior['p95']} -> {atual['p95']} ms")
+            if atual['requisicoes_por_segundo'] < anterior['requisicoes_por_segundo'] * (1 - fator):
+                regressoes.append(
+                    f"{nome_view}: {anterior['requisicoes_por_segundo']} -> {atual['requisicoes_por_segundo']} req/s"
+                )
+            # Consultas não variam com a máquina: qualquer aumento é regressão
+            if atual['consultas_por_requisicao'] > anterior['consultas_por_requisicao']:
+                regressoes.append(
+                    f"{nome_view}: {anterior['consultas_por_requisicao']} -> "
+                    f"{atual['consultas_por_requisicao']} consultas/req"
+                )
+        if regressoes:
+            raise CommandError("Regressão em relação à baseline:\n  " + "\n  ".join(regressoes))
+        self.stdout.write(self.style.SUCCESS(f"Nenhuma view piorou mais de {tolerancia:g}% em relação à baseline."))
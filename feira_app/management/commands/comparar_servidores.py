@@ -0,0 +1,173 @@
+# feira_app/management/commands/comparar_servidores.py
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from feira_app.bench import executar_concorrente, percentis
+
+MODOS = ('wsgi', 'asgi')
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _rss_arvore_kb(pid_raiz):
+    """RSS (KB) do processo e de todos os descendentes, lido de /proc (Linux)."""
+    filhos = {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as arquivo:
+                campos = arquivo.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        filhos.setdefault(int(campos[1]), []).append(int(entrada))
+    total, pendentes = 0, [pid_raiz]
+    while pendentes:
+        pid = pendentes.pop()
+        pendentes.extend(filhos.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/status') as arquivo:
+                for linha in arquivo:
+                    if linha.startswith('VmRSS:'):
+                        total += int(linha.split()[1])
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        "Sobe o gunicorn com gunicorn.conf.py nos modos WSGI (gthread, views síncronas) e ASGI "
+        "(UvicornWorker, views assíncronas), com o mesmo número de workers, e compara latência, vazão "
+        "e memória (RSS dos processos, total e por conexão) com muitas conexões simultâneas de um "
+        "beneficiário logado. Usa o banco e as settings atuais (DJANGO_SETTINGS_MODULE). Só Linux."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help="username de um usuário vinculado a um beneficiário.")
+        parser.add_argument('--modos', nargs='+', choices=MODOS, default=list(MODOS))
+        parser.add_argument('--conexoes', type=int, default=50, help="Conexões HTTP simultâneas (keep-alive).")
+        parser.add_argument('--requisicoes', type=int, default=20, help="Requisições por conexão.")
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=4, help="Threads por worker no modo WSGI.")
+        parser.add_argument('--caminho', default='/produtos/')
+
+    def handle(self, *args, **options):
+        if not os.path.isdir('/proc'):
+            raise CommandError("A medição de memória lê /proc: rode no Linux (ou no contêiner).")
+        try:
+            usuario = get_user_model().objects.get(username=options['usuario'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Usuário {options['usuario']!r} não encontrado.")
+        cookie = self._cookie_de_sessao(usuario)
+
+        for modo in options['modos']:
+            resultado = self._medir(modo, cookie, options)
+            self.stdout.write(
+                f"{modo}: " + ", ".join(f"{k}={v} ms" for k, v in resultado['latencia'].items())
+                + f", {resultado['req_s']:.0f} req/s, {resultado['erros']} erros; "
+                f"RSS ocioso {resultado['rss_ocioso'] / 1024:.1f} MB, pico {resultado['rss_pico'] / 1024:.1f} MB, "
+                f"{resultado['kb_por_conexao']:.0f} KB por conexão"
+            )
+
+    def _cookie_de_sessao(self, usuario):
+        """Sessão autenticada criada direto no backend configurado (como o Client.force_login)."""
+        sessao = import_module(settings.SESSION_ENGINE).SessionStore()
+        sessao[SESSION_KEY] = usuario._meta.pk.value_to_string(usuario)
+        sessao[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao.save()
+        return f"{settings.SESSION_COOKIE_NAME}={sessao.session_key}"
+
+    def _medir(self, modo, cookie, options):
+        porta = _porta_livre()
+        ambiente = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'feira_iceflu_project.settings'),
+            'PORT': str(porta),
+            'FEIRA_SERVIDOR': modo,
+            'GUNICORN_WORKERS': str(options['workers']),
+            'GUNICORN_THREADS': str(options['threads']),
+        }
+        with tempfile.TemporaryFile() as log:
+            servidor = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '--config', str(settings.BASE_DIR / 'gunicorn.conf.py')],
+                cwd=settings.BASE_DIR, env=ambiente, stdout=log, stderr=subprocess.STDOUT,
+            )
+            try:
+                self._aguardar(servidor, porta, log)
+                return self._carga(servidor.pid, porta, cookie, options)
+            finally:
+                servidor.terminate()
+                servidor.wait(timeout=30)
+
+    def _aguardar(self, servidor, porta, log, prazo=30):
+        limite = time.monotonic() + prazo
+        while time.monotonic() < limite:
+            if servidor.poll() is not None:
+                log.seek(0)
+                raise CommandError("O gunicorn terminou ao iniciar:\n" + log.read().decode(errors='replace')[-2000:])
+            try:
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+                conexao.request('GET', '/login/')
+                conexao.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"O gunicorn não respondeu em {prazo}s.")
+
+    def _carga(self, pid, porta, cookie, options):
+        cabecalhos = {'Cookie': cookie, 'Host': '127.0.0.1'}
+        locais = threading.local()
+
+        def requisitar(indice_thread, repeticao):
+            if not hasattr(locais, 'conexao'):
+                locais.conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=60)
+            locais.conexao.request('GET', options['caminho'], headers=cabecalhos)
+            resposta = locais.conexao.getresponse()
+            resposta.read()
+            if resposta.status != 200:
+                raise CommandError(f"HTTP {resposta.status} em {options['caminho']}")
+
+        # Aquecimento: cada worker/thread carrega código, templates e cache
+        executar_concorrente(requisitar, threads=min(options['conexoes'], 8), repeticoes=5)
+        rss_ocioso = _rss_arvore_kb(pid)
+
+        pico = [rss_ocioso]
+        medindo = threading.Event()
+
+        def amostrar_memoria():
+            while not medindo.wait(0.1):
+                pico[0] = max(pico[0], _rss_arvore_kb(pid))
+
+        amostrador = threading.Thread(target=amostrar_memoria)
+        amostrador.start()
+        try:
+            latencias, duracao, erros = executar_concorrente(requisitar, options['conexoes'], options['requisicoes'])
+        finally:
+            medindo.set()
+            amostrador.join()
+        return {
+            'latencia': percentis(latencias),
+            'req_s': len(latencias) / duracao,
+            'erros': len(erros),
+            'rss_ocioso': rss_ocioso,
+            'rss_pico': pico[0],
+            'kb_por_conexao': max(pico[0] - rss_ocioso, 0) / options['conexoes'],
+        }
@@ -0,0 +1,21 @@
+# feira_app/management/commands/consolidar_relatorio.py
+from django.core.management.base import BaseCommand
+
+from feira_app.relatorios import consolidar_listas_finalizadas, reconstruir_consolidado
+
+
+class Command(BaseCommand):
+    help = (
+        "Soma ao relatório consolidado (ConsolidadoProduto) as listas finalizadas ainda não consolidadas. "
+        "Com --reconstruir, recalcula o relatório inteiro do zero."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            consolidadas = reconstruir_consolidado()
+        else:
+            consolidadas = consolidar_listas_finalizadas()
+        self.stdout.write(self.style.SUCCESS(f"{consolidadas} lista(s) consolidada(s)."))
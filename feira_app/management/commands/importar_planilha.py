@@ -0,0 +1,165 @@
+# feira_app/management/commands/importar_planilha.py
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from feira_app.catalogo import invalidar_catalogo
+from feira_app.models import Beneficiario, Produto, normalizar_texto
+
+VERDADEIROS = {'1', 'true', 'sim', 's', 'yes', 'y', 'x'}
+FALSOS = {'0', 'false', 'nao', 'n', 'no'}
+
+
+def _booleano(valor, padrao):
+    valor = normalizar_texto(valor)
+    if not valor:
+        return padrao
+    if valor in VERDADEIROS:
+        return True
+    if valor in FALSOS:
+        return False
+    raise ValidationError(f"valor booleano inválido: {valor!r}")
+
+
+def _decimal(valor):
+    """Aceita "7.35", "7,35" e "1.234,56" (planilhas em português)."""
+    valor = (valor or '').replace('R$', '').strip()
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(valor)
+    except InvalidOperation:
+        raise ValidationError(f"número inválido: {valor!r}")
+
+
+# Para cada modelo: chave do upsert, colunas obrigatórias e conversão linha -> campos.
+IMPORTACOES = {
+    'produtos': {
+        'modelo': Produto,
+        'chave': 'codigo',
+        'obrigatorias': ('codigo', 'nome', 'preco_unitario'),
+        'campos': lambda linha: {
+            'codigo': linha['codigo'],
+            'nome': linha['nome'],
+            'nome_normalizado': normalizar_texto(linha['nome']),
+            'preco_unitario': _decimal(linha['preco_unitario']),
+            'unidade_medida': linha.get('unidade_medida') or None,
+            'disponivel': _booleano(linha.get('disponivel'), True),
+        },
+        'atualizar': ('nome', 'nome_normalizado', 'preco_unitario', 'unidade_medida', 'disponivel', 'data_atualizacao'),
+    },
+    'beneficiarios': {
+        'modelo': Beneficiario,
+        'chave': 'email',
+        'obrigatorias': ('email', 'nome', 'beneficio_mensal'),
+        'campos': lambda linha: {
+            'email': linha['email'],
+            'nome': linha['nome'],
+            'beneficio_mensal': _decimal(linha['beneficio_mensal']),
+            'is_admin': _booleano(linha.get('is_admin'), False),
+        },
+        'atualizar': ('nome', 'beneficio_mensal', 'is_admin', 'data_atualizacao'),
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa (insere ou atualiza) produtos ou beneficiários a partir de um CSV exportado da planilha. "
+        "Lê o arquivo linha a linha e grava em lotes com bulk_create(update_conflicts=True), "
+        "uma transação por lote. Produtos são identificados pela coluna 'codigo'; beneficiários, por 'email'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(IMPORTACOES))
+        parser.add_argument('arquivo', help="Caminho do arquivo CSV.")
+        parser.add_argument('--lote', type=int, default=2000, help="Linhas por lote/transação (padrão: 2000).")
+        parser.add_argument('--delimitador', help="Separador de colunas (padrão: detectado entre , ; e TAB).")
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        config = IMPORTACOES[options['tipo']]
+        modelo = config['modelo']
+        campos_modelo = {nome: modelo._meta.get_field(nome) for nome in config['atualizar'] + (config['chave'],)
+                         if nome != 'data_atualizacao'}
+
+        try:
+            arquivo = open(options['arquivo'], newline='', encoding=options['encoding'])
+        except OSError as exc:
+            raise CommandError(f"Não foi possível abrir {options['arquivo']}: {exc}")
+
+        gravadas = erros = 0
+        with arquivo:
+            delimitador = options['delimitador'] or self._detectar_delimitador(arquivo)
+            leitor = csv.DictReader(arquivo, delimiter=delimitador)
+            if not leitor.fieldnames:
+                raise CommandError("Arquivo vazio.")
+            # Cabeçalhos como "Preço Unitário" viram "preco_unitario"
+            leitor.fieldnames = [normalizar_texto(nome).replace(' ', '_') for nome in leitor.fieldnames]
+            faltando = set(config['obrigatorias']) - set(leitor.fieldnames)
+            if faltando:
+                raise CommandError(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+
+            lote = {}
+            for numero_linha, linha in enumerate(leitor, start=2):
+                linha = {chave: (valor or '').strip() for chave, valor in linha.items() if chave}
+                try:
+                    valores = self._validar(config, campos_modelo, linha)
+                except ValidationError as exc:
+                    erros += 1
+                    self.stderr.write(f"Linha {numero_linha}: {'; '.join(exc.messages)}")
+                    continue
+                # A mesma chave repetida no lote fica com a última ocorrência
+                lote[valores[config['chave']]] = modelo(**valores)
+                if len(lote) >= options['lote']:
+                    gravadas += self._gravar(config, lote.values())
+                    lote = {}
+            if lote:
+                gravadas += self._gravar(config, lote.values())
+
+        if modelo is Produto and gravadas:
+            # bulk_create não dispara os sinais de Produto
+            invalidar_catalogo()
+
+        estilo = self.style.WARNING if erros else self.style.SUCCESS
+        self.stdout.write(estilo(f"{gravadas} registro(s) inserido(s) ou atualizado(s); {erros} linha(s) com erro."))
+
+    def _detectar_delimitador(self, arquivo):
+        amostra = arquivo.read(4096)
+        arquivo.seek(0)
+        try:
+            return csv.Sniffer().sniff(amostra, delimiters=',;\t').delimiter
+        except csv.Error:
+            return ','
+
+    def _validar(self, config, campos_modelo, linha):
+        for coluna in config['obrigatorias']:
+            if not linha.get(coluna):
+                raise ValidationError(f"{coluna}: campo obrigatório vazio")
+        valores = config['campos'](linha)
+        mensagens = []
+        for nome, field in campos_modelo.items():
+            try:
+                valores[nome] = field.clean(valores[nome], None)
+            except ValidationError as exc:
+                mensagens.extend(f"{nome}: {mensagem}" for mensagem in exc.messages)
+        if mensagens:
+            raise ValidationError(mensagens)
+        return valores
+
+    def _gravar(self, config, objetos):
+        objetos = list(objetos)
+        with transaction.atomic():
+            config['modelo'].objects.bulk_create(
+                objetos,
+                update_conflicts=True,
+                unique_fields=[config['chave']],
+                update_fields=list(config['atualizar']),
+            )
+        if self.verbosity > 1:
+            self.stdout.write(f"  lote de {len(objetos)} gravado")
+        return len(objetos)
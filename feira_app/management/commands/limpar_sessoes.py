@@ -0,0 +1,40 @@
+# feira_app/management/commands/limpar_sessoes.py
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Apaga as sessões expiradas em lotes pequenos (uma transação por lote), para não travar a "
+        "tabela de sessões em produção como um único DELETE faria. Com sessões em cookie assinado "
+        "não há nada a apagar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Sessões por lote/transação.")
+        parser.add_argument('--pausa', type=float, default=0.0, help="Segundos de espera entre os lotes.")
+
+    def handle(self, *args, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        if not hasattr(engine.SessionStore, 'get_model_class'):
+            self.stdout.write(f"{settings.SESSION_ENGINE} não guarda sessões no banco; nada a limpar.")
+            return
+
+        modelo = engine.SessionStore.get_model_class()
+        expiradas = modelo.objects.filter(expire_date__lt=timezone.now())
+        apagadas = 0
+        while True:
+            chaves = list(expiradas.values_list('pk', flat=True)[:options['lote']])
+            if not chaves:
+                break
+            with transaction.atomic():
+                apagadas += modelo.objects.filter(pk__in=chaves).delete()[0]
+            if options['pausa']:
+                time.sleep(options['pausa'])
+        # No cached_db as cópias no cache expiram sozinhas (mesmo prazo da sessão)
+        self.stdout.write(self.style.SUCCESS(f"{apagadas} sessão(ões) expirada(s) apagada(s)."))
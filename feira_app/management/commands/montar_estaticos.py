@@ -0,0 +1,89 @@
+# feira_app/management/commands/montar_estaticos.py
+import base64
+import hashlib
+import re
+import urllib.request
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+APP_ESTATICOS = Path(__file__).resolve().parents[2] / 'static' / 'feira_app'
+# Cópias dos arquivos do CDN: fora de static/, para o collectstatic não publicá-las à parte
+VENDOR = Path(__file__).resolve().parents[2] / 'assets' / 'vendor'
+DIST = APP_ESTATICOS / 'dist'
+
+BOOTSTRAP_VERSAO = '5.3.3'
+CDN = f'https://cdn.jsdelivr.net/npm/bootstrap@{BOOTSTRAP_VERSAO}/dist'
+# Hash de cada arquivo do CDN, no formato SRI: os publicados pelo Bootstrap para BOOTSTRAP_VERSAO,
+# os mesmos do atributo integrity de base.html. Ao trocar a versão, atualize os dois também.
+INTEGRIDADE = {
+    'bootstrap.min.css': 'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH',
+    'bootstrap.bundle.min.js': 'sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz',
+}
+
+# Bundle -> partes, na ordem. Partes com URL vêm do CDN; as demais são do próprio app (static/feira_app).
+BUNDLES = {
+    'feira.css': [
+        ('bootstrap.min.css', f'{CDN}/css/bootstrap.min.css'),
+    ],
+    'feira.js': [
+        ('bootstrap.bundle.min.js', f'{CDN}/js/bootstrap.bundle.min.js'),
+        ('src/carrinho.js', None),
+    ],
+}
+
+# O .map não é baixado; com a referência, o ManifestStaticFilesStorage falharia no collectstatic
+SOURCE_MAP = re.compile(r'^\s*(?:/\*# sourceMappingURL=.*?\*/|//# sourceMappingURL=.*)\s*$', re.MULTILINE)
+
+
+def _confere(conteudo, integridade):
+    """O conteúdo (bytes) bate com o hash `integridade` ('sha384-<base64>')?"""
+    algoritmo, _, esperado = integridade.partition('-')
+    return base64.b64encode(hashlib.new(algoritmo, conteudo).digest()).decode() == esperado
+
+
+class Command(BaseCommand):
+    help = (
+        "Baixa (uma vez) os arquivos que base.html usava do CDN, na versão fixada, e monta os bundles "
+        "static/feira_app/dist/feira.css e feira.js junto com o JS do app. Rode antes do collectstatic "
+        "(ver Dockerfile); sem os bundles, base.html volta a usar o CDN."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baixar-de-novo', action='store_true', help="Ignora as cópias já baixadas.")
+
+    def handle(self, *args, **options):
+        VENDOR.mkdir(parents=True, exist_ok=True)
+        DIST.mkdir(parents=True, exist_ok=True)
+        for bundle, partes in BUNDLES.items():
+            conteudo = []
+            for nome, url in partes:
+                if url:
+                    texto = self._vendor(nome, url, options['baixar_de_novo'])
+                else:
+                    texto = (APP_ESTATICOS / nome).read_text(encoding='utf-8')
+                conteudo.append(SOURCE_MAP.sub('', texto).rstrip())
+            # ';' entre scripts: um arquivo sem ponto e vírgula final não pode emendar no seguinte
+            separador = '\n;\n' if bundle.endswith('.js') else '\n'
+            destino = DIST / bundle
+            destino.write_text(separador.join(conteudo) + '\n', encoding='utf-8')
+            self.stdout.write(f"{destino.relative_to(APP_ESTATICOS.parent.parent)}: {destino.stat().st_size / 1024:.0f} KB")
+
+    def _vendor(self, nome, url, baixar_de_novo):
+        arquivo = VENDOR / nome
+        integridade = INTEGRIDADE[nome]
+        # Uma cópia de outra versão (ou corrompida) é baixada de novo
+        if not baixar_de_novo and arquivo.exists() and _confere(arquivo.read_bytes(), integridade):
+            return arquivo.read_text(encoding='utf-8')
+        try:
+            with urllib.request.urlopen(url, timeout=30) as resposta:
+                conteudo = resposta.read()
+        except OSError as exc:
+            raise CommandError(f"Não foi possível baixar {url}: {exc}")
+        if not _confere(conteudo, integridade):
+            raise CommandError(
+                f"{url} não confere com o hash fixado em INTEGRIDADE ({integridade}); o arquivo não foi gravado."
+            )
+        arquivo.write_bytes(conteudo)
+        self.stdout.write(f"Baixado {url}")
+        return conteudo.decode('utf-8')
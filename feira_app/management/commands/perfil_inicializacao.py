@@ -0,0 +1,58 @@
+# feira_app/management/commands/perfil_inicializacao.py
+import re
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from feira_app.inicializacao import ORCAMENTO_MS, medir_fases
+
+# import time: self [us] | cumulative | imported package
+LINHA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Perfil de inicialização de um worker: sobe um interpretador novo com `python -X importtime`, "
+        "mede as fases (import do Django, settings, django.setup com o autodiscover do admin, "
+        "aplicação, URLConf, templates, primeira conexão e catálogo) e lista os módulos e pacotes "
+        "que mais custam para importar. Usa as settings atuais (DJANGO_SETTINGS_MODULE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="Quantos módulos e pacotes listar.")
+        parser.add_argument('--sem-banco', action='store_true', help="Não mede conexão nem catálogo.")
+
+    def handle(self, *args, **options):
+        try:
+            tempos, total, stderr = medir_fases(com_banco=not options['sem_banco'], importtime=True)
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write("Fases (ms):")
+        for fase, ms in tempos.items():
+            self.stdout.write(f"  {fase:>14}: {ms:8.1f}")
+        sem_banco = sum(ms for fase, ms in tempos.items() if fase not in ('conexao', 'catalogo'))
+        estilo = self.style.SUCCESS if sem_banco <= ORCAMENTO_MS else self.style.ERROR
+        self.stdout.write(estilo(
+            f"  fases sem banco: {sem_banco:.0f} ms (orçamento {ORCAMENTO_MS} ms); "
+            f"processo inteiro: {total:.0f} ms"
+        ))
+
+        modulos = []
+        por_pacote = defaultdict(int)
+        for linha in stderr.splitlines():
+            casamento = LINHA_IMPORTTIME.match(linha)
+            if casamento:
+                proprio, acumulado, recuo, modulo = casamento.groups()
+                modulos.append((int(acumulado), int(proprio), len(recuo) // 2, modulo))
+                por_pacote[modulo.split('.')[0]] += int(proprio)
+        if not modulos:
+            return
+
+        self.stdout.write(f"\nMódulos por tempo acumulado (ms; top {options['top']}, só imports de primeiro nível):")
+        for acumulado, proprio, nivel, modulo in sorted((m for m in modulos if m[2] == 0), reverse=True)[:options['top']]:
+            self.stdout.write(f"  {acumulado / 1000:8.1f} (próprio {proprio / 1000:6.1f})  {modulo}")
+
+        self.stdout.write(f"\nPacotes por tempo próprio somado (ms; top {options['top']}):")
+        for pacote, proprio in sorted(por_pacote.items(), key=lambda par: par[1], reverse=True)[:options['top']]:
+            self.stdout.write(f"  {proprio / 1000:8.1f}  {pacote}")
@@ -0,0 +1,61 @@
+# feira_app/management/commands/verificar_totais_listas.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from feira_app.models import ListaDeCompra
+from feira_app.resumo_carrinho import invalidar_todos_os_resumos
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os totais desnormalizados de ListaDeCompra (valor_total, quantidade_itens) "
+        "com o agregado real dos itens e, opcionalmente, corrige as divergências."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corrigir',
+            action='store_true',
+            help="Regrava os totais das listas divergentes com o agregado real.",
+        )
+        parser.add_argument(
+            '--status',
+            choices=[codigo for codigo, _ in ListaDeCompra.STATUS_CHOICES],
+            help="Verifica apenas as listas com este status (padrão: todas).",
+        )
+
+    def handle(self, *args, **options):
+        listas = ListaDeCompra.objects.all()
+        if options['status']:
+            listas = listas.filter(status=options['status'])
+
+        divergentes = (
+            listas.com_totais_reais()
+            .exclude(valor_total=F('total_real'), quantidade_itens=F('quantidade_itens_real'))
+            .order_by('pk')
+            .values_list('pk', 'valor_total', 'total_real', 'quantidade_itens', 'quantidade_itens_real')
+        )
+
+        ids_divergentes = []
+        for pk, valor_total, total_real, quantidade, quantidade_real in divergentes.iterator():
+            ids_divergentes.append(pk)
+            self.stdout.write(
+                f"Lista {pk}: total armazenado R$ {valor_total} / real R$ {total_real:.2f}; "
+                f"itens armazenados {quantidade} / reais {quantidade_real}"
+            )
+
+        if not ids_divergentes:
+            self.stdout.write(self.style.SUCCESS("Nenhuma divergência encontrada."))
+            return
+
+        if not options['corrigir']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(ids_divergentes)} lista(s) divergente(s). Use --corrigir para regravar os totais."
+            ))
+            return
+
+        with transaction.atomic():
+            corrigidas = ListaDeCompra.objects.filter(pk__in=ids_divergentes).recalcular_totais()
+            invalidar_todos_os_resumos()
+        self.stdout.write(self.style.SUCCESS(f"{corrigidas} lista(s) corrigida(s)."))
@@ -0,0 +1,48 @@
+# feira_app/management/commands/virar_ciclo.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from feira_app.ciclo import abrir_listas, encerrar_listas_abertas
+from feira_app.relatorios import consolidar_listas_finalizadas
+
+
+class Command(BaseCommand):
+    help = (
+        "Vira o ciclo das listas de compra: encerra as listas abertas criadas antes do início do ciclo "
+        "(finalizadas se têm itens, canceladas se vazias) e abre uma lista nova para cada beneficiário. "
+        "Trabalha em lotes e pode ser executado de novo com segurança (idempotente)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--inicio-ciclo',
+            help="Data de início do novo ciclo (AAAA-MM-DD, fuso do projeto). Padrão: hoje.",
+        )
+        parser.add_argument('--lote', type=int, default=1000, help="Listas/beneficiários por transação.")
+        parser.add_argument(
+            '--somente-abrir',
+            action='store_true',
+            help="Não encerra listas; apenas cria as que faltam.",
+        )
+
+    def handle(self, *args, **options):
+        if options['inicio_ciclo']:
+            try:
+                data = datetime.date.fromisoformat(options['inicio_ciclo'])
+            except ValueError:
+                raise CommandError("Use o formato AAAA-MM-DD em --inicio-ciclo.")
+        else:
+            data = timezone.localdate()
+        inicio_ciclo = timezone.make_aware(datetime.datetime.combine(data, datetime.time.min))
+        self.stdout.write(f"Início do ciclo: {inicio_ciclo:%d/%m/%Y %H:%M}")
+
+        if not options['somente_abrir']:
+            finalizadas, canceladas = encerrar_listas_abertas(inicio_ciclo, options['lote'])
+            self.stdout.write(f"{finalizadas} lista(s) finalizada(s), {canceladas} cancelada(s) (vazias).")
+            consolidadas = consolidar_listas_finalizadas()
+            self.stdout.write(f"{consolidadas} lista(s) somada(s) ao relatório consolidado.")
+
+        criadas = abrir_listas(inicio_ciclo, options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{criadas} lista(s) aberta(s) criada(s)."))
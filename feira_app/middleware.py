@@ -1,20 +1,199 @@
 # feira_app/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import cached_property
+
+from . import roteador
+from .carrinho import obter_resumo
+from .models import Beneficiario, ListaDeCompra
+
+
+class ContextoBeneficiario:
+    """
+    Beneficiário e lista aberta do usuário da requisição, resolvidos sob demanda
+    e no máximo uma vez por requisição.
+
+    No caso comum (beneficiário com lista aberta) basta uma consulta: a lista
+    aberta com o beneficiário via JOIN. As páginas que só mostram o carrinho usam
+    `resumo` (resumo_carrinho.py): o beneficiário sozinho e o resumo em cache, sem
+    consultar a lista.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _resolvido(self):
+        if not self.user.is_authenticated:
+            return None, None
+        if '_perfil' in self.__dict__:
+            # Beneficiário já lido (por `resumo`): falta só a lista
+            beneficiario = self._perfil
+            lista = beneficiario and (
+                ListaDeCompra.objects.filter(beneficiario=beneficiario, status='aberta')
+                .order_by('-data_criacao')
+                .first()
+            )
+            return beneficiario, lista
+
+        lista = (
+            ListaDeCompra.objects.select_related('beneficiario')
+            .filter(beneficiario__user_id=self.user.pk, status='aberta')
+            .order_by('-data_criacao')
+            .first()
+        )
+        if lista is not None:
+            return lista.beneficiario, lista
+        return self._buscar_beneficiario(), None
+
+    def _buscar_beneficiario(self):
+        beneficiario = Beneficiario.objects.filter(user_id=self.user.pk).first()
+        if beneficiario is None and self.user.email:
+            # Usuário ainda não vinculado: usa o e-mail (critério antigo) e grava o vínculo.
+            beneficiario = Beneficiario.objects.filter(email__iexact=self.user.email, user__isnull=True).first()
+            if beneficiario is not None:
+                beneficiario.user = self.user
+                beneficiario.save(update_fields=['user'])
+        return beneficiario
+
+    @cached_property
+    def _perfil(self):
+        """Só o beneficiário (uma consulta), para quem não precisa da lista."""
+        if '_resolvido' in self.__dict__:
+            return self._resolvido[0]
+        if not self.user.is_authenticated:
+            return None
+        return self._buscar_beneficiario()
+
+    @cached_property
+    def resumo(self):
+        """Resumo do carrinho do beneficiário (ResumoCarrinho), ou None sem beneficiário."""
+        beneficiario = self._perfil
+        return obter_resumo(beneficiario) if beneficiario else None
+
+    async def aresolver(self, user):
+        """
+        Versão assíncrona (ORM assíncrono) da resolução acima, para as views de views_async.py.
+
+        Recebe o usuário já carregado (`await request.auser()`); o resultado vai para o
+        mesmo cache, e `beneficiario`/`lista_ativa` passam a responder sem consultas.
+        """
+        if '_resolvido' in self.__dict__:
+            return
+        self.user = user
+        if not user.is_authenticated:
+            self._resolvido = (None, None)
+            return
+
+        lista = await (
+            ListaDeCompra.objects.select_related('beneficiario')
+            .filter(beneficiario__user_id=user.pk, status='aberta')
+            .order_by('-data_criacao')
+            .afirst()
+        )
+        if lista is not None:
+            self._resolvido = (lista.beneficiario, lista)
+            return
+        self._resolvido = (await self._abuscar_beneficiario(user), None)
+
+    async def _abuscar_beneficiario(self, user):
+        beneficiario = await Beneficiario.objects.filter(user_id=user.pk).afirst()
+        if beneficiario is None and user.email:
+            beneficiario = await Beneficiario.objects.filter(email__iexact=user.email, user__isnull=True).afirst()
+            if beneficiario is not None:
+                beneficiario.user = user
+                await beneficiario.asave(update_fields=['user'])
+        return beneficiario
+
+    async def aresolver_perfil(self, user):
+        """Versão assíncrona de `_perfil`: só o beneficiário, para as páginas que usam `resumo`."""
+        if '_resolvido' in self.__dict__ or '_perfil' in self.__dict__:
+            return
+        self.user = user
+        if not user.is_authenticated:
+            self._perfil = None
+            return
+        self._perfil = await self._abuscar_beneficiario(user)
+
+    @property
+    def beneficiario(self):
+        if '_perfil' in self.__dict__ and '_resolvido' not in self.__dict__:
+            return self._perfil
+        return self._resolvido[0]
+
+    @property
+    def lista_ativa(self):
+        return self._resolvido[1]
+
+    @lista_ativa.setter
+    def lista_ativa(self, lista):
+        self._resolvido = (self.beneficiario, lista)
+
+
+class BeneficiarioMiddleware:
+    """Anexa `request.feira` (um ContextoBeneficiario preguiçoso) a cada requisição."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.feira = ContextoBeneficiario(request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # request.user ainda é preguiçoso: nada é consultado aqui
+        request.feira = ContextoBeneficiario(request.user)
+        return await self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """
+    Estado de roteamento da requisição (ver roteador.py): fixa as leituras no primário em
+    requisições que escrevem e, por alguns segundos depois de uma escrita, nas seguintes
+    do mesmo navegador (cookie).
+    """
+
+    sync_capable = True
+    async_capable = True
 
-class DebugCSRFMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Imprime os cabeçalhos relevantes antes de a verificação CSRF acontecer
-        # Iremos procurar por estas linhas nos logs do Cloud Run
-        print("--- [CSRF DEBUG] INICIANDO REQUISIÇÃO ---")
-        print(f"[CSRF DEBUG] Método: {request.method}")
-        print(f"[CSRF DEBUG] Caminho: {request.path}")
-        print(f"[CSRF DEBUG] Host recebido: {request.META.get('HTTP_HOST')}")
-        print(f"[CSRF DEBUG] Cabeçalho Referer: {request.META.get('HTTP_REFERER')}")
-        print(f"[CSRF DEBUG] É seguro (is_secure()): {request.is_secure()}")
-        print(f"[CSRF DEBUG] Cookie CSRF enviado pelo navegador: {request.COOKIES.get('csrftoken')}")
-        print("--- [CSRF DEBUG] FIM DA REQUISIÇÃO ---")
-
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._iniciar(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            estado = roteador.encerrar_requisicao(token)
+        return self._marcar(response, estado)
+
+    async def __acall__(self, request):
+        token = self._iniciar(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            estado = roteador.encerrar_requisicao(token)
+        return self._marcar(response, estado)
+
+    def _iniciar(self, request):
+        escrita = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        return roteador.iniciar_requisicao(fixado=escrita or roteador.COOKIE_PRIMARIO in request.COOKIES)
+
+    def _marcar(self, response, estado):
+        if estado.escreveu:
+            response.set_cookie(
+                roteador.COOKIE_PRIMARIO, '1', max_age=roteador.JANELA_PRIMARIO,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
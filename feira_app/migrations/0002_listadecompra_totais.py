@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:13
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def preencher_totais(apps, schema_editor):
+    ListaDeCompra = apps.get_model('feira_app', 'ListaDeCompra')
+    ItemDaLista = apps.get_model('feira_app', 'ItemDaLista')
+    itens = ItemDaLista.objects.filter(lista=models.OuterRef('pk')).order_by().values('lista')
+    soma = itens.annotate(s=models.Sum(models.F('quantidade') * models.F('preco_unitario_no_momento'))).values('s')
+    contagem = itens.annotate(c=models.Count('pk')).values('c')
+    decimal_field = models.DecimalField(max_digits=10, decimal_places=2)
+    ListaDeCompra.objects.update(
+        valor_total=Coalesce(models.Subquery(soma, output_field=decimal_field), models.Value(Decimal('0.00')), output_field=decimal_field),
+        quantidade_itens=Coalesce(models.Subquery(contagem), models.Value(0), output_field=models.IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feira_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listadecompra',
+            name='quantidade_itens',
+            field=models.PositiveIntegerField(default=0, verbose_name='Quantidade de Itens'),
+        ),
+        migrations.AddField(
+            model_name='listadecompra',
+            name='valor_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Total da Lista (R$)'),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def vincular_usuarios_por_email(apps, schema_editor):
+    # Mesmo critério usado até aqui pelas views: e-mail do User igual ao do Beneficiario,
+    # sem diferenciar maiúsculas (o cadastro e a planilha nem sempre escrevem igual).
+    Beneficiario = apps.get_model('feira_app', 'Beneficiario')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    usuario_por_email = User.objects.filter(email__iexact=models.OuterRef('email')).order_by('pk').values('pk')[:1]
+    Beneficiario.objects.filter(user__isnull=True).update(user=models.Subquery(usuario_por_email))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feira_app', '0002_listadecompra_totais'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiario',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='beneficiario', to=settings.AUTH_USER_MODEL, verbose_name='Usuário'),
+        ),
+        migrations.RunPython(vincular_usuarios_por_email, migrations.RunPython.noop),
+    ]
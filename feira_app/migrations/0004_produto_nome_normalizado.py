@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:18
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def preencher_nome_normalizado(apps, schema_editor):
+    Produto = apps.get_model('feira_app', 'Produto')
+    produtos = list(Produto.objects.only('pk', 'nome'))
+    for produto in produtos:
+        decomposto = unicodedata.normalize('NFKD', produto.nome or '')
+        produto.nome_normalizado = ''.join(c for c in decomposto if not unicodedata.combining(c)).lower().strip()
+    Produto.objects.bulk_update(produtos, ['nome_normalizado'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feira_app', '0003_beneficiario_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='nome_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(preencher_nome_normalizado, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['nome', 'id'], name='produto_nome_id_idx'),
+        ),
+    ]
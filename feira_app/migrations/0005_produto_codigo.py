@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feira_app', '0004_produto_nome_normalizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='codigo',
+            field=models.CharField(blank=True, help_text='Identificador do produto na planilha de preços', max_length=50, null=True, unique=True, verbose_name='Código'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:23
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feira_app', '0005_produto_codigo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listadecompra',
+            name='consolidada',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Consolidada no Relatório?'),
+        ),
+        migrations.CreateModel(
+            name='ConsolidadoProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(help_text='Primeiro dia do mês de criação das listas', verbose_name='Período')),
+                ('quantidade_total', models.PositiveIntegerField(default=0, verbose_name='Quantidade Total')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Valor Total (R$)')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, verbose_name='Última Atualização')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='consolidados', to='feira_app.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Consolidado por Produto',
+                'verbose_name_plural': 'Consolidado por Produto',
+                'ordering': ['-periodo', 'produto__nome'],
+                'unique_together': {('periodo', 'produto')},
+            },
+        ),
+    ]
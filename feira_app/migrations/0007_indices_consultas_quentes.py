@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+def encerrar_listas_abertas_duplicadas(apps, schema_editor):
+    """
+    Deixa uma só lista aberta por beneficiário antes da restrição única.
+
+    Fica a mais recente (a que as views já mostravam); as outras são encerradas como na
+    virada de ciclo: finalizadas se têm itens, canceladas se vazias.
+    """
+    ListaDeCompra = apps.get_model('feira_app', 'ListaDeCompra')
+    abertas = ListaDeCompra.objects.filter(status='aberta')
+    duplicados = (
+        abertas.order_by().values('beneficiario').annotate(n=models.Count('pk')).filter(n__gt=1)
+        .values_list('beneficiario', flat=True)
+    )
+    for beneficiario_id in list(duplicados):
+        ids = list(
+            abertas.filter(beneficiario_id=beneficiario_id)
+            .order_by('-data_criacao', '-pk').values_list('pk', flat=True)
+        )
+        antigas = ListaDeCompra.objects.filter(pk__in=ids[1:])
+        antigas.filter(quantidade_itens__gt=0).update(status='finalizada')
+        antigas.filter(quantidade_itens=0).update(status='cancelada')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feira_app', '0006_consolidado_produto'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_nome_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='listadecompra',
+            index=models.Index(fields=['beneficiario', 'status'], name='lista_benef_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('disponivel', True)), fields=['nome', 'id'], name='produto_disp_nome_id_idx'),
+        ),
+        migrations.RunPython(encerrar_listas_abertas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='listadecompra',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'aberta')), fields=('beneficiario',), name='lista_uma_aberta_por_beneficiario', violation_error_message='Este beneficiário já tem uma lista em aberto.'),
+        ),
+    ]
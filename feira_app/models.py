@@ -1,7 +1,19 @@
 from django.db import models
 from django.conf import settings # Para ForeignKey para o User do Django
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from decimal import Decimal
+import unicodedata
+
+
+# Limite de compra de uma lista = FATOR_LIMITE_COMPRA x benefício mensal, fixado ao criar a lista
+FATOR_LIMITE_COMPRA = Decimal('3.00')
+
+
+def normalizar_texto(texto):
+    """Minúsculas e sem acentos ("Feijão" -> "feijao"), para busca."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower().strip()
 
 # É altamente recomendável usar o sistema de autenticação do Django.
 # Se os beneficiários também são usuários que fazem login no sistema,
@@ -25,6 +37,16 @@ class Beneficiario(models.Model):
     # o ideal é usar um OneToOneField para o User do Django ou estender AbstractUser.
     # Por ora, vou manter como solicitado, mas com ressalvas.
     email = models.EmailField(unique=True, verbose_name="E-mail")
+    # Vínculo com o User do Django que faz login. Preenchido pela migração a partir
+    # do e-mail e, para usuários novos, no primeiro acesso (ver middleware.ContextoBeneficiario).
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="beneficiario",
+        verbose_name="Usuário"
+    )
     # NUNCA armazene senhas em texto plano. O Django User model cuida disso.
     # Se for um campo de senha customizado, a lógica de hashing deve ser implementada.
     # senha_hash = models.CharField(max_length=128, verbose_name="Senha HASH") # Exemplo, não recomendado fazer manualmente
@@ -51,6 +73,17 @@ class Beneficiario(models.Model):
 
 class Produto(models.Model):
     nome = models.CharField(max_length=200, verbose_name="Nome do Produto")
+    # Código do produto na planilha semanal de preços (chave do comando importar_planilha)
+    codigo = models.CharField(
+        max_length=50,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="Código",
+        help_text="Identificador do produto na planilha de preços"
+    )
+    # Cópia indexada de `nome` em minúsculas e sem acentos, usada pela busca de produtos.
+    nome_normalizado = models.CharField(max_length=200, db_index=True, editable=False, default='')
     preco_unitario = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -75,10 +108,52 @@ class Produto(models.Model):
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
         ordering = ['nome']
+        indexes = [
+            # Catálogo: disponivel=True ORDER BY nome, id (paginação por chave). Índice parcial:
+            # só as linhas disponíveis, já na ordem da consulta.
+            models.Index(
+                fields=['nome', 'id'], condition=models.Q(disponivel=True), name='produto_disp_nome_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.nome} (R$ {self.preco_unitario})"
 
+    def save(self, *args, **kwargs):
+        self.nome_normalizado = normalizar_texto(self.nome)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nome' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nome_normalizado'}
+        super().save(*args, **kwargs)
+
+class ListaDeCompraQuerySet(models.QuerySet):
+    def _subqueries_totais_reais(self):
+        # .order_by() remove a ordenação padrão de ItemDaLista (produto__nome),
+        # que adicionaria um JOIN e quebraria o GROUP BY da subquery.
+        itens = ItemDaLista.objects.filter(lista=models.OuterRef('pk')).order_by().values('lista')
+        soma = itens.annotate(
+            s=models.Sum(models.F('quantidade') * models.F('preco_unitario_no_momento'))
+        ).values('s')
+        contagem = itens.annotate(c=models.Count('pk')).values('c')
+        total = Coalesce(
+            models.Subquery(soma, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+            models.Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+        quantidade = Coalesce(models.Subquery(contagem), models.Value(0), output_field=models.IntegerField())
+        return total, quantidade
+
+    def com_totais_reais(self):
+        """Anota total_real e quantidade_itens_real calculados diretamente a partir dos itens."""
+        total, quantidade = self._subqueries_totais_reais()
+        return self.annotate(total_real=total, quantidade_itens_real=quantidade)
+
+    def recalcular_totais(self):
+        """Regrava valor_total e quantidade_itens com o agregado real, em um único UPDATE."""
+        total, quantidade = self._subqueries_totais_reais()
+        return self.update(valor_total=total, quantidade_itens=quantidade)
+
+
 class ListaDeCompra(models.Model):
     STATUS_CHOICES = [
         ('aberta', 'Em Aberto'),
@@ -115,24 +190,55 @@ class ListaDeCompra(models.Model):
         verbose_name="Limite de Compra Calculado (R$)",
         help_text="Limite da compra no momento da criação da lista (3x benefício mensal)"
     )
+    # Totais desnormalizados: mantidos pelas operações de carrinho com UPDATEs
+    # atômicos (F()), para não reagregar os itens a cada leitura.
+    # O comando `verificar_totais_listas` detecta e corrige divergências.
+    valor_total = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Total da Lista (R$)"
+    )
+    quantidade_itens = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Quantidade de Itens"
+    )
+    # Já somada em ConsolidadoProduto (ver relatorios.py)
+    consolidada = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Consolidada no Relatório?"
+    )
     # Adicionando campo de data para rastreamento
     data_atualizacao = models.DateTimeField(auto_now=True, verbose_name="Última Atualização")
 
+    objects = ListaDeCompraQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Lista de Compra"
         verbose_name_plural = "Listas de Compra"
         ordering = ['-data_criacao', 'beneficiario']
+        constraints = [
+            # No máximo uma lista aberta por beneficiário (também protege contra corridas na criação)
+            models.UniqueConstraint(
+                fields=['beneficiario'],
+                condition=models.Q(status='aberta'),
+                name='lista_uma_aberta_por_beneficiario',
+                violation_error_message="Este beneficiário já tem uma lista em aberto.",
+            ),
+        ]
+        indexes = [
+            # Listas de um beneficiário por status (abertas no dia a dia, finalizadas nos relatórios)
+            models.Index(fields=['beneficiario', 'status'], name='lista_benef_status_idx'),
+        ]
 
     def __str__(self):
         return f"Lista de {self.beneficiario.nome} - {self.data_criacao.strftime('%d/%m/%Y')}"
 
     @property
     def total_lista(self):
-        """Calcula o total dos itens na lista."""
-        total = self.itens_da_lista.aggregate(
-            total_calculado=models.Sum(models.F('quantidade') * models.F('preco_unitario_no_momento'))
-        )['total_calculado']
-        return total or 0.00
+        """Total dos itens na lista (valor desnormalizado, sem consulta extra)."""
+        return self.valor_total
 
 class ItemDaLista(models.Model):
     lista = models.ForeignKey(
@@ -167,4 +273,36 @@ class ItemDaLista(models.Model):
     def subtotal(self): # Esta é a propriedade a ser modificada (provavelmente linha 169)
         if self.quantidade is not None and self.preco_unitario_no_momento is not None:
             return self.quantidade * self.preco_unitario_no_momento
-        return Decimal('0.00') # Retorna 0.00 se algum dos valores for None
\ No newline at end of file
+        return Decimal('0.00') # Retorna 0.00 se algum dos valores for None
+
+
+class ConsolidadoProduto(models.Model):
+    """Totais por produto e por mês das listas finalizadas (pedido aos produtores)."""
+    periodo = models.DateField(
+        verbose_name="Período",
+        help_text="Primeiro dia do mês de criação das listas"
+    )
+    produto = models.ForeignKey(
+        Produto,
+        on_delete=models.PROTECT,
+        related_name="consolidados",
+        verbose_name="Produto"
+    )
+    quantidade_total = models.PositiveIntegerField(default=0, verbose_name="Quantidade Total")
+    valor_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Valor Total (R$)"
+    )
+    data_atualizacao = models.DateTimeField(auto_now=True, verbose_name="Última Atualização")
+
+    class Meta:
+        verbose_name = "Consolidado por Produto"
+        verbose_name_plural = "Consolidado por Produto"
+        ordering = ['-periodo', 'produto__nome']
+        unique_together = ('periodo', 'produto')
+
+    def __str__(self):
+        return f"{self.produto.nome} - {self.periodo.strftime('%m/%Y')}"
+
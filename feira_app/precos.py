@@ -0,0 +1,68 @@
+# feira_app/precos.py
+"""
+Propagação de mudanças de preço de Produto para as listas em aberto.
+
+Cada item guarda o preço do momento em que entrou na lista
+(preco_unitario_no_momento). Quando o preço de um produto muda, o admin escolhe
+a política (ver ProdutoAdmin): manter esse preço nas listas abertas ou
+repreciá-las com o preço atual. Listas finalizadas e canceladas nunca mudam.
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import ItemDaLista, ListaDeCompra, Produto
+from .resumo_carrinho import invalidar_todos_os_resumos
+
+POLITICA_MANTER = 'manter'
+POLITICA_REPRECIAR = 'repreciar'
+POLITICAS = [
+    (POLITICA_MANTER, "Manter o preço atual dos itens nas listas em aberto"),
+    (POLITICA_REPRECIAR, "Repreciar as listas em aberto com o novo preço"),
+]
+
+
+@dataclass(frozen=True)
+class ResultadoRepreciacao:
+    itens: int
+    listas: int
+    listas_acima_do_limite: list
+
+
+def repreciar_listas_abertas(produtos_ids):
+    """
+    Aplica o preço atual de `produtos_ids` aos itens das listas em aberto.
+
+    Três comandos na mesma transação, independentes do número de listas:
+    1. trava as listas abertas afetadas (o carrinho trava a lista antes de mexer nos totais);
+    2. um UPDATE nos itens dessas listas, com o preço lido de Produto por subquery;
+    3. um UPDATE que recalcula valor_total e quantidade_itens das mesmas listas.
+    Devolve também as listas que passaram a exceder limite_compra_calculado.
+    """
+    produtos_ids = list(produtos_ids)
+    itens = ItemDaLista.objects.filter(produto_id__in=produtos_ids, lista__status='aberta')
+    preco_atual = Produto.objects.filter(pk=OuterRef('produto_id')).values('preco_unitario')[:1]
+
+    with transaction.atomic():
+        listas_ids = list(
+            ListaDeCompra.objects.select_for_update()
+            .filter(status='aberta', pk__in=itens.values('lista_id'))
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if not listas_ids:
+            return ResultadoRepreciacao(itens=0, listas=0, listas_acima_do_limite=[])
+        # Filtros por subquery (e não pelos ids): milhares de listas não viram milhares de parâmetros
+        atualizados = (
+            itens.exclude(preco_unitario_no_momento=Subquery(preco_atual))
+            .update(preco_unitario_no_momento=Subquery(preco_atual))
+        )
+        afetadas = ListaDeCompra.objects.filter(status='aberta', pk__in=itens.values('lista_id'))
+        if atualizados:
+            afetadas.recalcular_totais()
+            invalidar_todos_os_resumos()
+        acima = list(
+            afetadas.filter(valor_total__gt=F('limite_compra_calculado')).order_by('pk').values_list('pk', flat=True)
+        )
+    return ResultadoRepreciacao(itens=atualizados, listas=len(listas_ids), listas_acima_do_limite=acima)
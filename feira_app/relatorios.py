@@ -0,0 +1,113 @@
+# feira_app/relatorios.py
+"""
+Relatório de consolidação para os pedidos aos produtores.
+
+ConsolidadoProduto guarda, por mês e por produto, a quantidade e o valor das
+listas finalizadas. A tabela é atualizada de forma incremental: cada lista
+finalizada é somada uma única vez (ListaDeCompra.consolidada) e, se for
+alterada depois, é descontada antes da alteração e somada de novo em seguida.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DateField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import ConsolidadoProduto, ItemDaLista, ListaDeCompra
+
+TAMANHO_LOTE = 500
+
+
+def _agregados_por_periodo_e_produto(lista_ids):
+    return (
+        ItemDaLista.objects.filter(lista_id__in=lista_ids)
+        .annotate(periodo=TruncMonth('lista__data_criacao', output_field=DateField()))
+        .order_by()
+        .values('periodo', 'produto_id')
+        .annotate(
+            quantidade_soma=Sum('quantidade'),
+            valor_soma=Sum(F('quantidade') * F('preco_unitario_no_momento')),
+        )
+    )
+
+
+def _aplicar(lista_ids, sinal):
+    """Soma (sinal=1) ou desconta (sinal=-1) os itens das listas no consolidado."""
+    agregados = {
+        (linha['periodo'], linha['produto_id']): (linha['quantidade_soma'], Decimal(linha['valor_soma'] or 0))
+        for linha in _agregados_por_periodo_e_produto(lista_ids)
+    }
+    if not agregados:
+        return
+
+    por_periodo = defaultdict(list)
+    for periodo, produto_id in agregados:
+        por_periodo[periodo].append(produto_id)
+    filtro = Q()
+    for periodo, produtos_ids in por_periodo.items():
+        filtro |= Q(periodo=periodo, produto_id__in=produtos_ids)
+
+    existentes = {
+        (linha.periodo, linha.produto_id): linha
+        for linha in ConsolidadoProduto.objects.select_for_update().filter(filtro)
+    }
+    novos, alterados = [], []
+    agora = timezone.now()
+    for chave, (quantidade, valor) in agregados.items():
+        linha = existentes.get(chave)
+        if linha is None:
+            linha = ConsolidadoProduto(periodo=chave[0], produto_id=chave[1])
+            novos.append(linha)
+        else:
+            alterados.append(linha)
+        linha.quantidade_total = max(linha.quantidade_total + sinal * quantidade, 0)
+        linha.valor_total = linha.valor_total + sinal * valor
+        linha.data_atualizacao = agora
+    ConsolidadoProduto.objects.bulk_create(novos)
+    ConsolidadoProduto.objects.bulk_update(alterados, ['quantidade_total', 'valor_total', 'data_atualizacao'])
+
+
+def consolidar_listas_finalizadas(lista_ids=None):
+    """
+    Soma ao consolidado as listas finalizadas ainda não consolidadas (todas, ou só `lista_ids`).
+
+    Processa em lotes, cada um em sua transação. Retorna quantas listas foram consolidadas.
+    """
+    pendentes = ListaDeCompra.objects.filter(status='finalizada', consolidada=False)
+    if lista_ids is not None:
+        pendentes = pendentes.filter(pk__in=lista_ids)
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            # FOR UPDATE: duas execuções simultâneas nunca somam a mesma lista duas vezes
+            ids = list(pendentes.select_for_update().order_by('pk').values_list('pk', flat=True)[:TAMANHO_LOTE])
+            if not ids:
+                return total
+            _aplicar(ids, 1)
+            ListaDeCompra.objects.filter(pk__in=ids).update(consolidada=True)
+        total += len(ids)
+
+
+def desconsolidar_listas(lista_ids):
+    """Desconta do consolidado as listas indicadas (antes de alterá-las); elas voltam a ficar pendentes."""
+    with transaction.atomic():
+        ids = list(
+            ListaDeCompra.objects.select_for_update()
+            .filter(pk__in=lista_ids, consolidada=True)
+            .values_list('pk', flat=True)
+        )
+        if ids:
+            _aplicar(ids, -1)
+            ListaDeCompra.objects.filter(pk__in=ids).update(consolidada=False)
+    return len(ids)
+
+
+def reconstruir_consolidado():
+    """Apaga o consolidado e o recalcula do zero a partir das listas finalizadas."""
+    with transaction.atomic():
+        ConsolidadoProduto.objects.all().delete()
+        ListaDeCompra.objects.filter(consolidada=True).update(consolidada=False)
+    return consolidar_listas_finalizadas()
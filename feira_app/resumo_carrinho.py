@@ -0,0 +1,131 @@
+# feira_app/resumo_carrinho.py
+"""
+Resumo do carrinho (lista aberta) de cada beneficiário, em cache.
+
+O topo de produto_list.html e de minha_lista.html mostra o limite, o total e a
+quantidade de itens da lista aberta. Esses números ficam no cache do Django, por
+beneficiário, em vez de serem lidos (ou a lista criada) a cada página:
+
+- as operações de carrinho.py regravam o resumo com os valores lidos sob a trava
+  da lista (write-through);
+- os sinais de ListaDeCompra e ItemDaLista (admin, shell) apagam o resumo do
+  beneficiário afetado (ver signals.py);
+- operações em massa por UPDATE (virada de ciclo, repreciação, reajuste de
+  benefícios, verificar_totais_listas) trocam a versão de todos os resumos, como
+  a invalidação do catálogo.
+
+Tudo é aplicado depois do commit. O resumo é só exibição: o limite continua
+garantido pelo banco (carrinho.py), e as ações sempre leem a lista travada.
+
+O resumo só é lido do cache quando ele é compartilhado entre os processos
+(settings.FEIRA_CACHE_COMPARTILHADO, Redis). Com a memória local de cada processo
+a regravação e a invalidação chegariam só ao worker que as fez, e os outros
+mostrariam um total antigo: as páginas leem a lista (ver carrinho.obter_resumo).
+"""
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ListaDeCompra
+
+CHAVE_VERSAO = 'feira:carrinho:versao'
+# Limita o tempo de um resumo desatualizado por uma corrida entre leitura e escrita
+TIMEOUT_RESUMO = getattr(settings, 'FEIRA_RESUMO_CARRINHO_TIMEOUT', 60 * 30)
+
+
+@dataclass(frozen=True)
+class ResumoCarrinho:
+    lista_id: int
+    limite: Decimal
+    total: Decimal
+    quantidade_itens: int
+
+    @property
+    def limite_restante(self):
+        return self.limite - self.total
+
+    @classmethod
+    def da_lista(cls, lista):
+        return cls(
+            lista_id=lista.pk,
+            limite=lista.limite_compra_calculado,
+            total=lista.valor_total,
+            quantidade_itens=lista.quantidade_itens,
+        )
+
+
+def resumo_em_cache():
+    """O resumo é lido do cache (compartilhado entre os processos)?"""
+    return getattr(settings, 'FEIRA_CACHE_COMPARTILHADO', False)
+
+
+def _versao():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, uuid.uuid4().hex, None)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def _chave(versao, beneficiario_id):
+    return f'feira:carrinho:{versao}:{beneficiario_id}'
+
+
+def ler_resumo(beneficiario_id):
+    """Resumo em cache do beneficiário, ou None."""
+    return cache.get(_chave(_versao(), beneficiario_id))
+
+
+def gravar_resumo(beneficiario_id, resumo):
+    """Write-through: grava o resumo (lido sob a trava da lista) depois do commit."""
+    transaction.on_commit(lambda: cache.set(_chave(_versao(), beneficiario_id), resumo, TIMEOUT_RESUMO))
+
+
+def preencher_resumo(beneficiario_id, resumo):
+    """
+    Grava o resumo lido em uma falta, sem sobrescrever: se uma operação de carrinho
+    regravou o resumo nesse meio-tempo, o dela é o mais novo.
+    """
+    transaction.on_commit(lambda: cache.add(_chave(_versao(), beneficiario_id), resumo, TIMEOUT_RESUMO))
+
+
+def invalidar_resumos(beneficiarios_ids):
+    """Apaga os resumos destes beneficiários depois do commit."""
+    beneficiarios_ids = set(beneficiarios_ids)
+
+    def apagar():
+        versao = _versao()
+        cache.delete_many([_chave(versao, pk) for pk in beneficiarios_ids])
+    transaction.on_commit(apagar)
+
+
+def invalidar_resumos_das_listas(listas_ids):
+    """Como invalidar_resumos, a partir das listas (o beneficiário é lido depois do commit)."""
+    listas_ids = set(listas_ids)
+
+    def apagar():
+        beneficiarios_ids = ListaDeCompra.objects.filter(pk__in=listas_ids).values_list('beneficiario_id', flat=True)
+        versao = _versao()
+        cache.delete_many([_chave(versao, pk) for pk in set(beneficiarios_ids)])
+    transaction.on_commit(apagar)
+
+
+def invalidar_todos_os_resumos():
+    """Nova versão depois do commit: os resumos de todos os beneficiários deixam de valer."""
+    transaction.on_commit(lambda: cache.set(CHAVE_VERSAO, uuid.uuid4().hex, None))
+
+
+def regravar_resumos(listas_ids):
+    """
+    Write-through a partir do banco (admin): regrava o resumo das listas abertas entre
+    `listas_ids`. Chamar depois de atualizar os totais, na mesma transação.
+    """
+    listas = ListaDeCompra.objects.filter(pk__in=listas_ids, status='aberta').only(
+        'beneficiario_id', 'valor_total', 'quantidade_itens', 'limite_compra_calculado'
+    )
+    for lista in listas:
+        gravar_resumo(lista.beneficiario_id, ResumoCarrinho.da_lista(lista))
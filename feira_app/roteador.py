@@ -0,0 +1,109 @@
+# feira_app/roteador.py
+"""
+Roteamento entre o banco primário e uma réplica de leitura opcional.
+
+A réplica é o alias FEIRA_DB_REPLICA_ALIAS ('replica') em DATABASES; sem ele,
+tudo vai para o primário. Com ela:
+
+- leituras do catálogo e dos relatórios (MODELOS_NA_REPLICA) vão para a réplica,
+  assim como tudo o que for lido dentro de `leituras_na_replica()` (changelists
+  do admin, ver admin.py);
+- escritas vão sempre para o primário;
+- leituras voltam ao primário dentro de transaction.atomic, em requisições que
+  escrevem (POST etc. ou qualquer escrita no meio de um GET) e, por
+  FEIRA_DB_JANELA_PRIMARIO segundos depois de uma escrita, nas requisições do
+  mesmo navegador (cookie de ReplicaMiddleware): quem acabou de alterar algo
+  não lê uma cópia atrasada.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_REPLICA = getattr(settings, 'FEIRA_DB_REPLICA_ALIAS', 'replica')
+JANELA_PRIMARIO = getattr(settings, 'FEIRA_DB_JANELA_PRIMARIO', 10)
+COOKIE_PRIMARIO = 'feira_primario'
+MODELOS_NA_REPLICA = {'feira_app.Produto', 'feira_app.ConsolidadoProduto'}
+
+PRIMARIO = 'primario'
+REPLICA = 'replica'
+
+
+class EstadoRequisicao:
+    """Estado de roteamento de uma requisição (objeto mutável: escritas em outras threads o atualizam)."""
+    __slots__ = ('fixado', 'escreveu')
+
+    def __init__(self, fixado=False):
+        self.fixado = fixado
+        self.escreveu = False
+
+
+_requisicao = contextvars.ContextVar('feira_roteamento_requisicao', default=None)
+_preferencia = contextvars.ContextVar('feira_roteamento_preferencia', default=None)
+
+
+@contextmanager
+def _preferir(destino):
+    token = _preferencia.set(destino)
+    try:
+        yield
+    finally:
+        _preferencia.reset(token)
+
+
+def leituras_na_replica():
+    """Leituras de qualquer modelo na réplica (se não houver motivo para ficar no primário)."""
+    return _preferir(REPLICA)
+
+
+def leituras_no_primario():
+    """Todas as leituras no primário."""
+    return _preferir(PRIMARIO)
+
+
+def iniciar_requisicao(fixado):
+    return _requisicao.set(EstadoRequisicao(fixado))
+
+
+def encerrar_requisicao(token):
+    estado = _requisicao.get()
+    _requisicao.reset(token)
+    return estado
+
+
+class RoteadorReplica:
+    def __init__(self):
+        self.replica = ALIAS_REPLICA if ALIAS_REPLICA in settings.DATABASES else None
+
+    def _no_primario(self):
+        if _preferencia.get() == PRIMARIO:
+            return True
+        estado = _requisicao.get()
+        if estado is not None and estado.fixado:
+            return True
+        # Dentro de uma transação, ler da réplica veria um estado diferente do que está sendo gravado
+        return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+    def db_for_read(self, model, **hints):
+        if self.replica is None or self._no_primario():
+            return DEFAULT_DB_ALIAS
+        if model._meta.label in MODELOS_NA_REPLICA or _preferencia.get() == REPLICA:
+            return self.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        estado = _requisicao.get()
+        if estado is not None:
+            estado.fixado = estado.escreveu = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mesmos dados nos dois aliases: um Produto lido da réplica pode ir em um item gravado no primário
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, self.replica}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica recebe o schema pela replicação do Cloud SQL
+        return db != self.replica if self.replica else None
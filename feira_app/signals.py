@@ -0,0 +1,36 @@
+# feira_app/signals.py
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalogo import invalidar_catalogo
+from .instrumentacao import medir_consulta
+from .models import ItemDaLista, ListaDeCompra, Produto
+from .resumo_carrinho import invalidar_resumos, invalidar_resumos_das_listas
+
+
+@receiver([post_save, post_delete], sender=Produto)
+def invalidar_catalogo_produto(sender, **kwargs):
+    # Só depois do commit, para nenhum worker recarregar o catálogo antigo no meio da transação
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver([post_save, post_delete], sender=ListaDeCompra)
+def invalidar_resumo_lista(sender, instance, **kwargs):
+    invalidar_resumos([instance.beneficiario_id])
+
+
+@receiver([post_save, post_delete], sender=ItemDaLista)
+def invalidar_resumo_item(sender, instance, **kwargs):
+    if ItemDaLista.lista.is_cached(instance):
+        invalidar_resumos([instance.lista.beneficiario_id])
+    else:
+        invalidar_resumos_das_listas([instance.lista_id])
+
+
+@receiver(connection_created)
+def instalar_medidor_consultas(sender, connection, **kwargs):
+    # Em toda conexão nova (inclusive as das threads do ORM assíncrono); só mede dentro de uma requisição
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
@@ -0,0 +1,101 @@
+// feira_app/static/feira_app/src/carrinho.js
+// Ações do carrinho sem recarregar a página: os formulários com data-carrinho são enviados via fetch
+// pedindo JSON (ver _responder_acao em views.py) e a página é atualizada no lugar. Sem JS (ou sem
+// fetch) o formulário segue o fluxo normal de POST + redirect. Se o pedido saiu e a resposta não
+// veio ou não é JSON, o POST não é repetido: a ação pode ter sido feita. A página mostra um erro e
+// recarrega o conteúdo com um GET.
+(function () {
+    var formatar = function (valor) {
+        return Number(valor).toLocaleString('pt-BR', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    };
+
+    function atualizarTexto(id, valor) {
+        var elemento = document.getElementById(id);
+        if (elemento && valor !== undefined) {
+            elemento.textContent = formatar(valor);
+        }
+    }
+
+    function mostrarMensagem(nivel, texto) {
+        var alerta = document.createElement('div');
+        alerta.className = 'alert alert-' + nivel + ' alert-dismissible fade show';
+        alerta.setAttribute('role', 'alert');
+        alerta.textContent = texto;
+        var fechar = document.createElement('button');
+        fechar.type = 'button';
+        fechar.className = 'btn-close';
+        fechar.setAttribute('data-bs-dismiss', 'alert');
+        fechar.setAttribute('aria-label', 'Close');
+        alerta.appendChild(fechar);
+        var container = document.getElementById('mensagens-carrinho');
+        container.replaceChildren(alerta);
+    }
+
+    function aplicar(dados) {
+        mostrarMensagem(dados.nivel, dados.mensagem);
+        atualizarTexto('total-lista', dados.total_lista);
+        atualizarTexto('limite-restante', dados.limite_restante);
+        if (dados.item_removido !== undefined) {
+            var removida = document.getElementById('item-' + dados.item_removido);
+            if (removida) {
+                removida.remove();
+            }
+            if (dados.quantidade_itens === 0 && document.getElementById('limite-restante')) {
+                // Lista vazia: minha_lista.html mostra outro conteúdo
+                window.location.reload();
+            }
+        }
+        if (dados.linha_html && dados.item) {
+            var linha = document.getElementById('item-' + dados.item.id);
+            if (linha) {
+                linha.outerHTML = dados.linha_html;
+            }
+        }
+    }
+
+    function recarregarConteudo() {
+        fetch(window.location.href, {credentials: 'same-origin'}).then(function (resposta) {
+            if (!resposta.ok) {
+                throw new Error('HTTP ' + resposta.status);
+            }
+            return resposta.text();
+        }).then(function (html) {
+            var novo = new DOMParser().parseFromString(html, 'text/html').getElementById('conteudo');
+            var atual = document.getElementById('conteudo');
+            if (novo && atual) {
+                atual.replaceWith(novo);
+            }
+        }).catch(function () {
+            // Sem conexão: a mensagem já pede para conferir a lista
+        });
+    }
+
+    document.addEventListener('submit', function (evento) {
+        var form = evento.target;
+        if (!form.hasAttribute('data-carrinho') || !window.fetch) {
+            return;
+        }
+        evento.preventDefault();
+        var botoes = form.querySelectorAll('button[type="submit"]');
+        botoes.forEach(function (botao) { botao.disabled = true; });
+        fetch(form.action, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: {'Accept': 'application/json'},
+            credentials: 'same-origin',
+        }).then(function (resposta) {
+            var tipo = resposta.headers.get('Content-Type') || '';
+            if (tipo.indexOf('application/json') === -1) {
+                throw new Error('resposta sem JSON');
+            }
+            return resposta.json();
+        }).then(aplicar, function () {
+            // Falha de rede ou resposta que não é do carrinho: o POST pode ter sido processado,
+            // então não é reenviado; a lista é lida de novo
+            mostrarMensagem('danger', 'Não foi possível confirmar a ação. Confira a sua lista antes de tentar de novo.');
+            recarregarConteudo();
+        }).finally(function () {
+            botoes.forEach(function (botao) { botao.disabled = false; });
+        });
+    });
+})();
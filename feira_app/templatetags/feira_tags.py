@@ -0,0 +1,68 @@
+# feira_app/templatetags/feira_tags.py
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..forms import AddToListForm
+
+register = template.Library()
+
+# Aumente ao alterar _produto_card.html, para descartar os fragmentos antigos.
+VERSAO_CARD = 2
+TIMEOUT_CARD = 60 * 60 * 24 * 7
+# Texto reservado que ocupa o lugar do token CSRF nos fragmentos em cache
+CSRF_MARCADOR = '__feira_csrf_token__'
+
+
+def chave_card(produto):
+    return f"feira:card:{VERSAO_CARD}:{produto['id']}:{produto['data_atualizacao'].timestamp()}"
+
+
+@register.simple_tag(takes_context=True)
+def cards_produtos(context, produtos):
+    """
+    Cards de `produtos` (linhas do catálogo), com o HTML de cada card em cache.
+
+    O fragmento depende só do produto: a chave é (id, data_atualizacao), então
+    qualquer edição no admin gera um fragmento novo. A parte que depende do
+    usuário (token CSRF) é preenchida aqui, a cada requisição.
+    """
+    chaves = {chave_card(produto): produto for produto in produtos}
+    fragmentos = cache.get_many(chaves)
+
+    faltantes = {}
+    add_form = None
+    for chave, produto in chaves.items():
+        if chave not in fragmentos:
+            add_form = add_form or AddToListForm()
+            faltantes[chave] = render_to_string('feira_app/_produto_card.html', {
+                'produto': produto,
+                'add_form': add_form,
+                'csrf_marcador': CSRF_MARCADOR,
+            })
+    if faltantes:
+        cache.set_many(faltantes, TIMEOUT_CARD)
+        fragmentos.update(faltantes)
+
+    html = ''.join(fragmentos[chave] for chave in chaves)
+    return mark_safe(html.replace(CSRF_MARCADOR, str(context.get('csrf_token', ''))))
+
+
+@lru_cache(maxsize=None)
+def _bundle_montado(caminho):
+    return finders.find(caminho) is not None
+
+
+@register.simple_tag
+def bundle_estatico(nome):
+    """
+    URL (com hash em produção) de static/feira_app/dist/<nome>, montado por `manage.py montar_estaticos`,
+    ou '' se o bundle não foi montado; nesse caso base.html usa o CDN.
+    """
+    caminho = f'feira_app/dist/{nome}'
+    return static(caminho) if _bundle_montado(caminho) else ''
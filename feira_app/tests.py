@@ -1,3 +1,1253 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.middleware.csrf import _unmask_cipher_token
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone
+
+from . import admissao, carrinho, catalogo, instrumentacao, resumo_carrinho, roteador, urls
+from .beneficios import ajustar_beneficios
+from .bench import executar_concorrente
+from .catalogo import codificar_cursor, estatisticas_catalogo, obter_produtos_disponiveis, versao_atual
+from .ciclo import abrir_listas, encerrar_listas_abertas
+from .forms import AddManyToListForm
+from .inicializacao import ORCAMENTO_MS, medir_fases
+from .management.commands import montar_estaticos
+from .middleware import BeneficiarioMiddleware, ReplicaMiddleware
+from .models import Beneficiario, ConsolidadoProduto, ItemDaLista, ListaDeCompra, Produto
+from .precos import repreciar_listas_abertas
+from .relatorios import consolidar_listas_finalizadas
+from .resumo_carrinho import ResumoCarrinho, ler_resumo
+from .templatetags.feira_tags import CSRF_MARCADOR, chave_card
+
+
+def setUpModule():
+    # Sem a linha de log por requisição (instrumentacao.py) na saída dos testes
+    unittest.addModuleCleanup(instrumentacao.logger.setLevel, instrumentacao.logger.level)
+    instrumentacao.logger.setLevel(logging.WARNING)
+
+
+class CarrinhoTests(TestCase):
+    def setUp(self):
+        self.beneficiario = Beneficiario.objects.create(
+            nome="Maria", email="maria@example.com", beneficio_mensal=Decimal('10.00')
+        )
+        self.produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.lista = carrinho.obter_ou_criar_lista_aberta(self.beneficiario)
+
+    def test_lista_aberta_nao_e_duplicada(self):
+        self.assertEqual(carrinho.obter_ou_criar_lista_aberta(self.beneficiario), self.lista)
+        self.assertEqual(self.lista.limite_compra_calculado, Decimal('30.00'))
+
+    def test_adicionar_respeita_limite_e_informa_restante(self):
+        resultado = carrinho.adicionar_item(self.lista.pk, self.produto, 7)
+        self.assertTrue(resultado.sucesso)
+        self.assertEqual(resultado.total, Decimal('28.00'))
+
+        resultado = carrinho.adicionar_item(self.lista.pk, self.produto, 1)
+        self.assertFalse(resultado.sucesso)
+        self.assertEqual(resultado.limite_restante, Decimal('2.00'))
+
+        self.lista.refresh_from_db()
+        self.assertEqual(self.lista.valor_total, Decimal('28.00'))
+        self.assertEqual(ItemDaLista.objects.get().quantidade, 7)
+
+    def test_atualizar_e_remover_mantem_totais(self):
+        item = carrinho.adicionar_item(self.lista.pk, self.produto, 2).item
+        self.assertFalse(carrinho.atualizar_quantidade(self.lista.pk, item.pk, 8).sucesso)
+        self.assertTrue(carrinho.atualizar_quantidade(self.lista.pk, item.pk, 5).sucesso)
+        carrinho.remover_item(self.lista.pk, item.pk)
+
+        self.lista.refresh_from_db()
+        self.assertEqual((self.lista.valor_total, self.lista.quantidade_itens), (Decimal('0.00'), 0))
+
+    def test_lote_e_tudo_ou_nada(self):
+        arroz = Produto.objects.create(nome="Arroz", preco_unitario=Decimal('5.00'))
+        resultado = carrinho.aplicar_lote(self.lista.pk, {self.produto.pk: 2, arroz.pk: 3})
+        self.assertTrue(resultado.sucesso)
+        self.assertEqual((resultado.total, resultado.quantidade_itens), (Decimal('23.00'), 2))
+
+        resultado = carrinho.aplicar_lote(self.lista.pk, {self.produto.pk: 1, arroz.pk: 1})
+        self.assertFalse(resultado.sucesso)
+        self.assertEqual(ItemDaLista.objects.get(produto=arroz).quantidade, 3)
+
+        resultado = carrinho.aplicar_lote(self.lista.pk, {self.produto.pk: 0, arroz.pk: 1}, substituir=True)
+        self.assertTrue(resultado.sucesso)
+        self.assertEqual(list(ItemDaLista.objects.values_list('produto_id', 'quantidade')), [(arroz.pk, 1)])
+        self.lista.refresh_from_db()
+        self.assertEqual((self.lista.valor_total, self.lista.quantidade_itens), (Decimal('5.00'), 1))
+
+
+class CarrinhoRespostasParciaisTests(TestCase):
+    """Ações do carrinho com Accept: application/json (script da página) e sem (redirect)."""
+
+    def setUp(self):
+        cache.clear()  # baldes do controle de admissão (admissao.py) de outros testes
+        usuario = User.objects.create_user('maria', 'maria@example.com')
+        beneficiario = Beneficiario.objects.create(
+            nome="Maria", email=usuario.email, user=usuario, beneficio_mensal=Decimal('10.00')
+        )
+        self.produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.lista = carrinho.obter_ou_criar_lista_aberta(beneficiario)
+        self.client.force_login(usuario)
+
+    def test_adicionar_devolve_totais(self):
+        url = reverse('feira_app:add_to_list', args=[self.produto.pk])
+        resposta = self.client.post(url, {'quantidade': 2}, headers={'Accept': 'application/json'})
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['total_lista'], '8.00')
+        self.assertEqual(dados['limite_restante'], '22.00')
+        self.assertEqual(dados['item']['quantidade'], 2)
+
+        resposta = self.client.post(url, {'quantidade': 6}, headers={'Accept': 'application/json'})
+        self.assertEqual(resposta.status_code, 409)
+        self.assertFalse(resposta.json()['sucesso'])
+
+    def test_atualizar_devolve_linha_e_remover_o_id(self):
+        item = carrinho.adicionar_item(self.lista.pk, self.produto, 1).item
+        resposta = self.client.post(
+            reverse('feira_app:update_list_item', args=[item.pk]), {'quantidade': 3},
+            headers={'Accept': 'application/json'},
+        )
+        dados = resposta.json()
+        self.assertEqual(dados['total_lista'], '12.00')
+        self.assertIn(f'id="item-{item.pk}"', dados['linha_html'])
+
+        resposta = self.client.post(
+            reverse('feira_app:remove_from_list', args=[item.pk]), headers={'Accept': 'application/json'}
+        )
+        self.assertEqual(resposta.json()['item_removido'], item.pk)
+        self.assertEqual(resposta.json()['quantidade_itens'], 0)
+
+    def test_sem_json_mantem_redirect(self):
+        resposta = self.client.post(reverse('feira_app:add_to_list', args=[self.produto.pk]), {'quantidade': 1})
+        self.assertRedirects(resposta, reverse('feira_app:produto_list'), fetch_redirect_response=False)
+
+    def test_lote_com_quantidade_fracionada_responde_400(self):
+        resposta = self.client.post(
+            reverse('feira_app:add_many_to_list'), json.dumps({'itens': {self.produto.pk: 1.5}}),
+            content_type='application/json',
+        )
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json()['erros'], [
+            f"Quantidade inválida para o produto {self.produto.pk}: use um número inteiro.",
+        ])
+        self.assertFalse(ItemDaLista.objects.exists())
+
+    def test_lista_encerrada_responde_409_em_vez_de_500(self):
+        item = carrinho.adicionar_item(self.lista.pk, self.produto, 1).item
+        ListaDeCompra.objects.filter(pk=self.lista.pk).update(status='finalizada')
+        atualizar = reverse('feira_app:update_list_item', args=[item.pk])
+        remover = reverse('feira_app:remove_from_list', args=[item.pk])
+
+        for url, dados in ((atualizar, {'quantidade': 3}), (remover, {})):
+            resposta = self.client.post(url, dados, headers={'Accept': 'application/json'})
+            self.assertEqual(resposta.status_code, 409)
+            self.assertEqual(resposta.json(), {
+                'sucesso': False, 'mensagem': carrinho.LISTA_FECHADA, 'nivel': 'danger',
+            })
+
+            resposta = self.client.post(url, dados, follow=True)
+            self.assertRedirects(resposta, reverse('feira_app:minha_lista'), fetch_redirect_response=False)
+            self.assertEqual([str(m) for m in resposta.context['messages']], [carrinho.LISTA_FECHADA])
+        self.assertEqual(ItemDaLista.objects.get().quantidade, 1)
+
+
+@override_settings(FEIRA_CACHE_COMPARTILHADO=True)
+class ResumoCarrinhoTests(TestCase):
+    """Resumo do carrinho em cache: gravado pelas operações, apagado pelos sinais, usado pelas páginas."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        usuario = User.objects.create_user('maria', 'maria@example.com')
+        self.beneficiario = Beneficiario.objects.create(
+            nome="Maria", email=usuario.email, user=usuario, beneficio_mensal=Decimal('10.00')
+        )
+        self.produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.client.force_login(usuario)
+
+    def test_pagina_sem_consultas_ao_carrinho(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('feira_app:produto_list'))
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('feira_app:produto_list'))
+        self.assertContains(resposta, 'R$ 30,00')
+        self.assertFalse([c['sql'] for c in consultas if 'feira_app_listadecompra' in c['sql']])
+
+    def test_acoes_gravam_o_resumo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('feira_app:add_to_list', args=[self.produto.pk]), {'quantidade': 2})
+        resumo = ler_resumo(self.beneficiario.pk)
+        self.assertEqual((resumo.total, resumo.quantidade_itens, resumo.limite_restante),
+                         (Decimal('8.00'), 1, Decimal('22.00')))
+
+        resposta = self.client.get(reverse('feira_app:minha_lista'))
+        self.assertEqual(resposta.context['resumo'], resumo)
+        self.assertEqual([item.quantidade for item in resposta.context['itens']], [2])
+
+    def test_sinais_e_operacoes_em_massa_invalidam(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lista = carrinho.obter_ou_criar_lista_aberta(self.beneficiario)
+            carrinho.adicionar_item(lista.pk, self.produto, 1)
+        self.assertIsNotNone(ler_resumo(self.beneficiario.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ItemDaLista.objects.get().delete()  # como no admin/shell
+        self.assertIsNone(ler_resumo(self.beneficiario.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            carrinho.obter_resumo(self.beneficiario)
+            ajustar_beneficios(Beneficiario.objects.all(), percentual=10)
+        self.assertIsNone(ler_resumo(self.beneficiario.pk))
+
+    @override_settings(FEIRA_CACHE_COMPARTILHADO=False)
+    @override_settings(FEIRA_CACHE_COMPARTILHADO=False)
+    def test_sem_cache_compartilhado_le_a_lista(self):
+        lista = carrinho.obter_ou_criar_lista_aberta(self.beneficiario)
+        # Resumo deixado no cache local deste processo; a alteração abaixo, feita "em outro
+        # processo", não chega a ele (os callbacks de on_commit não rodam)
+        cache.set(resumo_carrinho._chave(resumo_carrinho._versao(), self.beneficiario.pk),
+                  ResumoCarrinho.da_lista(lista))
+        carrinho.adicionar_item(lista.pk, self.produto, 2)
+
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('feira_app:produto_list'))
+        self.assertTrue([c['sql'] for c in consultas if 'feira_app_listadecompra' in c['sql']])
+        self.assertEqual(resposta.context['resumo'].total, Decimal('8.00'))
+
+
+class AdmissaoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(admissao.configurar, admissao.TAXA, admissao.RAJADA, admissao.CONCORRENCIA)
+        usuario = User.objects.create_user('maria', 'maria@example.com')
+        Beneficiario.objects.create(
+            nome="Maria", email=usuario.email, user=usuario, beneficio_mensal=Decimal('100.00')
+        )
+        self.url = reverse('feira_app:add_to_list', args=[Produto.objects.create(nome="Sal", preco_unitario=1).pk])
+        self.client.force_login(usuario)
+
+    def adicionar(self):
+        return self.client.post(self.url, {'quantidade': 1}, headers={'Accept': 'application/json'})
+
+    def test_balde_por_usuario(self):
+        admissao.configurar(taxa=1, rajada=2, concorrencia=0)
+        self.assertEqual([self.adicionar().status_code for _ in range(2)], [200, 200])
+        resposta = self.adicionar()
+        self.assertEqual(resposta.status_code, 429)
+        self.assertEqual(resposta['Retry-After'], '1')
+        self.assertFalse(resposta.json()['sucesso'])
+        self.assertEqual(ItemDaLista.objects.get().quantidade, 2)
+
+    def test_sem_vaga_recusa_sem_gastar_ficha(self):
+        admissao.configurar(taxa=1, rajada=1, concorrencia=1)
+        vagas = admissao._vagas
+        vagas.acquire()  # outra ação em andamento
+        try:
+            self.assertEqual(self.adicionar().status_code, 429)
+        finally:
+            vagas.release()
+        self.assertEqual(self.adicionar().status_code, 200)
+        self.assertEqual(admissao.estatisticas_admissao()['em_andamento'], 0)
+
+
+class ViewsAsyncTests(TestCase):
+    """Views do beneficiário sob ASGI (views_async.py), pelo AsyncClient."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # urls.py escolhe as views na importação: recarrega com FEIRA_VIEWS_ASYNC e, no fim, sem
+        cls.addClassCleanup(cls._recarregar_urls)
+        cls.enterClassContext(override_settings(FEIRA_VIEWS_ASYNC=True))
+        cls._recarregar_urls()
+
+    @staticmethod
+    def _recarregar_urls():
+        importlib.reload(urls)
+        # O include() do projeto guarda o resolver (e as rotas) do app: recarrega ele também
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(admissao.configurar, admissao.TAXA, admissao.RAJADA, admissao.CONCORRENCIA)
+        usuario = User.objects.create_user('maria', 'maria@example.com')
+        beneficiario = Beneficiario.objects.create(
+            nome="Maria", email=usuario.email, user=usuario, beneficio_mensal=Decimal('10.00')
+        )
+        self.feijao = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.arroz = Produto.objects.create(nome="Arroz", preco_unitario=Decimal('5.00'))
+        self.lista = carrinho.obter_ou_criar_lista_aberta(beneficiario)
+        self.async_client.force_login(usuario)
+        self.json = {'Accept': 'application/json'}
+
+    async def test_paginas(self):
+        resposta = await self.async_client.get(reverse('feira_app:produto_list'))
+        self.assertTrue(iscoroutinefunction(resposta.resolver_match.func))
+        self.assertContains(resposta, 'R$ 30,00')
+        self.assertEqual([p['nome'] for p in resposta.context['produtos']], ["Arroz", "Feijão"])
+
+        await sync_to_async(carrinho.adicionar_item)(self.lista.pk, self.feijao, 2)
+        resposta = await self.async_client.get(reverse('feira_app:minha_lista'))
+        self.assertTrue(iscoroutinefunction(resposta.resolver_match.func))
+        self.assertEqual([item.quantidade for item in resposta.context['itens']], [2])
+
+    async def test_acoes_do_carrinho(self):
+        resposta = await self.async_client.post(
+            reverse('feira_app:add_to_list', args=[self.feijao.pk]), {'quantidade': 2}, headers=self.json
+        )
+        self.assertTrue(iscoroutinefunction(resposta.resolver_match.func))
+        self.assertEqual(resposta.json()['total_lista'], '8.00')
+        item_id = resposta.json()['item']['id']
+
+        resposta = await self.async_client.post(
+            reverse('feira_app:add_many_to_list'),
+            json.dumps({'itens': {self.feijao.pk: 1, self.arroz.pk: 2}}), content_type='application/json',
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((resposta.json()['total_lista'], resposta.json()['quantidade_itens']), ('22.00', 2))
+
+        resposta = await self.async_client.post(
+            reverse('feira_app:update_list_item', args=[item_id]), {'quantidade': 6}, headers=self.json
+        )
+        self.assertEqual(resposta.status_code, 409)  # 24 + 10 passaria do limite de 30
+        self.assertIn(f'id="item-{item_id}"', resposta.json()['linha_html'])
+        resposta = await self.async_client.post(
+            reverse('feira_app:update_list_item', args=[item_id]), {'quantidade': 1}, headers=self.json
+        )
+        self.assertEqual(resposta.json()['total_lista'], '14.00')
+
+        resposta = await self.async_client.post(
+            reverse('feira_app:remove_from_list', args=[item_id]), headers=self.json
+        )
+        self.assertEqual((resposta.json()['item_removido'], resposta.json()['total_lista']), (item_id, '10.00'))
+
+    async def test_admissao_recusa_com_429(self):
+        admissao.configurar(taxa=1, rajada=1, concorrencia=0)
+        url = reverse('feira_app:add_to_list', args=[self.feijao.pk])
+        respostas = [await self.async_client.post(url, {'quantidade': 1}, headers=self.json) for _ in range(2)]
+        self.assertEqual([r.status_code for r in respostas], [200, 429])
+        self.assertEqual(respostas[1]['Retry-After'], '1')
+        self.assertEqual((await ItemDaLista.objects.aget()).quantidade, 1)
+
+
+class CarrinhoConcorrenciaTests(TransactionTestCase):
+    """Cliques simultâneos de vários workers não podem ultrapassar o limite."""
+
+    def test_adicoes_concorrentes_nao_ultrapassam_limite(self):
+        beneficiario = Beneficiario.objects.create(
+            nome="João", email="joao@example.com", beneficio_mensal=Decimal('10.00')
+        )
+        produtos = [
+            Produto.objects.create(nome=f"Produto {i}", preco_unitario=Decimal('1.50'))
+            for i in range(4)
+        ]
+        lista = carrinho.obter_ou_criar_lista_aberta(beneficiario)
+
+        def adicionar(indice_thread, repeticao):
+            carrinho.adicionar_item(lista.pk, produtos[(indice_thread + repeticao) % len(produtos)], 1)
+
+        _, _, erros = executar_concorrente(adicionar, threads=8, repeticoes=6)
+        self.assertEqual(erros, [])
+
+        lista = ListaDeCompra.objects.com_totais_reais().get(pk=lista.pk)
+        self.assertEqual(lista.valor_total, Decimal('30.00'))
+        self.assertEqual(lista.valor_total, lista.total_real)
+        self.assertEqual(lista.quantidade_itens, lista.quantidade_itens_real)
+
+
+class RepreciacaoTests(TestCase):
+    def setUp(self):
+        self.produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.abertas = []
+        for i, beneficio in enumerate([Decimal('10.00'), Decimal('2.00')]):
+            beneficiario = Beneficiario.objects.create(
+                nome=f"B{i}", email=f"b{i}@example.com", beneficio_mensal=beneficio
+            )
+            lista = carrinho.obter_ou_criar_lista_aberta(beneficiario)
+            carrinho.adicionar_item(lista.pk, self.produto, 1)
+            self.abertas.append(lista)
+        self.finalizada = ListaDeCompra.objects.create(
+            beneficiario=beneficiario, status='finalizada', limite_compra_calculado=Decimal('30.00')
+        )
+        ItemDaLista.objects.create(
+            lista=self.finalizada, produto=self.produto, quantidade=1, preco_unitario_no_momento=Decimal('4.00')
+        )
+        ListaDeCompra.objects.filter(pk=self.finalizada.pk).recalcular_totais()
+
+    def test_repreciar_so_listas_abertas_e_aponta_acima_do_limite(self):
+        Produto.objects.filter(pk=self.produto.pk).update(preco_unitario=Decimal('7.00'))
+        resultado = repreciar_listas_abertas([self.produto.pk])
+
+        self.assertEqual((resultado.itens, resultado.listas), (2, 2))
+        # Limite da segunda lista: 3 x 2,00 = 6,00
+        self.assertEqual(resultado.listas_acima_do_limite, [self.abertas[1].pk])
+        for lista in ListaDeCompra.objects.com_totais_reais().filter(status='aberta'):
+            self.assertEqual(lista.valor_total, Decimal('7.00'))
+            self.assertEqual(lista.valor_total, lista.total_real)
+        self.finalizada.refresh_from_db()
+        self.assertEqual(self.finalizada.valor_total, Decimal('4.00'))
+
+    def test_politica_no_admin(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        url = reverse('admin:feira_app_produto_change', args=[self.produto.pk])
+        dados = {'nome': "Feijão", 'codigo': '', 'preco_unitario': '5.00', 'unidade_medida': '', 'disponivel': 'on'}
+
+        self.client.post(url, {**dados, 'politica_preco': 'manter'})
+        self.assertEqual(ItemDaLista.objects.filter(preco_unitario_no_momento=Decimal('4.00')).count(), 3)
+
+        self.client.post(url, {**dados, 'preco_unitario': '7.00', 'politica_preco': 'repreciar'})
+        self.assertEqual(ItemDaLista.objects.filter(preco_unitario_no_momento=Decimal('7.00')).count(), 2)
+        self.assertEqual(
+            list(self.client.get(reverse('admin:feira_app_listadecompra_changelist'), {'acima_do_limite': 'sim'})
+                 .context['cl'].result_list),
+            [self.abertas[1]],
+        )
+
+
+class AjusteBeneficiosTests(TestCase):
+    def setUp(self):
+        produto = Produto.objects.create(nome="Arroz", preco_unitario=Decimal('5.00'))
+        self.listas = []
+        for i, beneficio in enumerate([Decimal('100.00'), Decimal('100.00'), Decimal('200.00')]):
+            beneficiario = Beneficiario.objects.create(
+                nome=f"B{i}", email=f"b{i}@example.com", beneficio_mensal=beneficio
+            )
+            lista = carrinho.obter_ou_criar_lista_aberta(beneficiario)
+            carrinho.adicionar_item(lista.pk, produto, 58 if i == 0 else 1)  # R$ 290,00 na primeira
+            self.listas.append(lista)
+
+    def test_percentual_recalcula_limites_e_aponta_listas_acima(self):
+        # O filtro depende do benefício, que muda no próprio reajuste
+        resultado = ajustar_beneficios(Beneficiario.objects.filter(beneficio_mensal__lte=100), percentual=-10)
+
+        self.assertEqual((resultado.beneficiarios, resultado.listas), (2, 2))
+        self.assertEqual(resultado.listas_acima_do_limite, [self.listas[0].pk])
+        self.assertEqual(
+            list(ListaDeCompra.objects.order_by('pk').values_list('limite_compra_calculado', flat=True)),
+            [Decimal('270.00'), Decimal('270.00'), Decimal('600.00')],
+        )
+        self.assertEqual(Beneficiario.objects.filter(beneficio_mensal=Decimal('90.00')).count(), 2)
+
+    def test_acao_do_admin_com_tabela(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        url = reverse('admin:feira_app_beneficiario_changelist')
+        selecao = {'action': 'ajustar_beneficio', 'index': 0, '_selected_action': [
+            lista.beneficiario_id for lista in self.listas
+        ]}
+        resposta = self.client.post(url, selecao)
+        self.assertTemplateUsed(resposta, 'admin/feira_app/beneficiario/ajustar_beneficio.html')
+
+        self.client.post(url, {**selecao, 'aplicar': '1', 'tabela': '200,00 = 250,00'})
+        self.assertEqual(
+            list(ListaDeCompra.objects.order_by('pk').values_list('limite_compra_calculado', flat=True)),
+            [Decimal('300.00'), Decimal('300.00'), Decimal('750.00')],
+        )
+
+
+class AdminChangelistConsultasTests(TestCase):
+    """O número de consultas de cada changelist do admin não pode crescer com o número de linhas."""
+
+    changelists = [
+        'admin:feira_app_beneficiario_changelist',
+        'admin:feira_app_produto_changelist',
+        'admin:feira_app_listadecompra_changelist',
+        'admin:feira_app_itemdalista_changelist',
+    ]
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        self.criados = 0
+
+    def _criar_linhas(self, ate):
+        novos = range(self.criados, ate)
+        beneficiarios = Beneficiario.objects.bulk_create(
+            Beneficiario(nome=f"Beneficiário {i}", email=f"b{i}@example.com", beneficio_mensal=Decimal('50.00'))
+            for i in novos
+        )
+        produtos = Produto.objects.bulk_create(
+            Produto(nome=f"Produto {i}", preco_unitario=Decimal('2.00')) for i in novos
+        )
+        listas = ListaDeCompra.objects.bulk_create(
+            ListaDeCompra(beneficiario=b, limite_compra_calculado=Decimal('150.00')) for b in beneficiarios
+        )
+        ItemDaLista.objects.bulk_create(
+            ItemDaLista(lista=lista, produto=produto, quantidade=1, preco_unitario_no_momento=Decimal('2.00'))
+            for lista, produto in zip(listas, produtos)
+        )
+        ListaDeCompra.objects.recalcular_totais()
+        self.criados = ate
+
+    def _contar_consultas(self):
+        contagens = {}
+        for nome_url in self.changelists:
+            with CaptureQueriesContext(connection) as consultas:
+                resposta = self.client.get(reverse(nome_url))
+            self.assertEqual(resposta.status_code, 200)
+            contagens[nome_url] = len(consultas)
+        return contagens
+
+    def test_consultas_constantes_com_10_e_1000_linhas(self):
+        self._criar_linhas(10)
+        com_10 = self._contar_consultas()
+        self._criar_linhas(1000)
+        com_1000 = self._contar_consultas()
+        self.assertEqual(com_10, com_1000)
+
+
+class RelatorioConsolidadoTests(TestCase):
+    """Consolidado incremental (relatorios.py): ganchos do admin, --reconstruir e o CSV."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com'))
+        self.feijao = Produto.objects.create(
+            nome="Feijão", codigo='FEI', unidade_medida='Kg', preco_unitario=Decimal('4.00')
+        )
+        self.arroz = Produto.objects.create(
+            nome="Arroz", codigo='ARR', unidade_medida='Kg', preco_unitario=Decimal('5.00')
+        )
+        self.listas = [self.criar_lista_finalizada(mes, 2 + mes) for mes in (1, 2)]
+        consolidar_listas_finalizadas()
+
+    def criar_lista_finalizada(self, mes, quantidade_feijao):
+        numero = Beneficiario.objects.count()
+        beneficiario = Beneficiario.objects.create(
+            nome=f"Beneficiário {numero}", email=f"b{numero}@example.com", beneficio_mensal=Decimal('100.00')
+        )
+        lista = ListaDeCompra.objects.create(
+            beneficiario=beneficiario, status='finalizada', limite_compra_calculado=Decimal('300.00'),
+            data_criacao=datetime.datetime(2025, mes, 10, 12, tzinfo=datetime.timezone.utc),
+        )
+        ItemDaLista.objects.create(
+            lista=lista, produto=self.feijao, quantidade=quantidade_feijao, preco_unitario_no_momento=Decimal('4.00')
+        )
+        ItemDaLista.objects.create(lista=lista, produto=self.arroz, quantidade=1, preco_unitario_no_momento=Decimal('5.00'))
+        return lista
+
+    def consolidado(self):
+        return {
+            (linha.periodo, linha.produto_id): (linha.quantidade_total, linha.valor_total)
+            for linha in ConsolidadoProduto.objects.all()
+            if linha.quantidade_total
+        }
+
+    def agregado_do_zero(self):
+        """O que o consolidado deveria ter, somado item a item das listas finalizadas."""
+        esperado = {}
+        for item in ItemDaLista.objects.filter(lista__status='finalizada').select_related('lista'):
+            data = timezone.localtime(item.lista.data_criacao).date()
+            chave = (data.replace(day=1), item.produto_id)
+            quantidade, valor = esperado.get(chave, (0, Decimal('0.00')))
+            esperado[chave] = (quantidade + item.quantidade, valor + item.subtotal)
+        return esperado
+
+    def test_admin_soma_e_desconta_ao_editar_e_excluir_itens(self):
+        self.assertEqual(self.consolidado(), self.agregado_do_zero())
+        janeiro = datetime.date(2025, 1, 1)
+        item = ItemDaLista.objects.get(lista=self.listas[0], produto=self.feijao)
+
+        resposta = self.client.post(reverse('admin:feira_app_itemdalista_change', args=[item.pk]), {
+            'lista': self.listas[0].pk, 'produto': self.feijao.pk,
+            'quantidade': 7, 'preco_unitario_no_momento': '4.00',
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(self.consolidado()[janeiro, self.feijao.pk], (7, Decimal('28.00')))
+        self.assertEqual(self.consolidado(), self.agregado_do_zero())
+
+        arroz = ItemDaLista.objects.get(lista=self.listas[0], produto=self.arroz)
+        resposta = self.client.post(reverse('admin:feira_app_itemdalista_delete', args=[arroz.pk]), {'post': 'yes'})
+        self.assertEqual(resposta.status_code, 302)
+        self.assertNotIn((janeiro, self.arroz.pk), self.consolidado())
+        self.assertEqual(self.consolidado(), self.agregado_do_zero())
+        self.assertFalse(ListaDeCompra.objects.filter(consolidada=False).exists())
+
+    def test_reconstruir_igual_ao_agregado_do_zero(self):
+        ConsolidadoProduto.objects.update(quantidade_total=99, valor_total=Decimal('1.00'))  # relatório corrompido
+        self.criar_lista_finalizada(2, 1)  # ainda não consolidada
+        saida = StringIO()
+        call_command('consolidar_relatorio', '--reconstruir', stdout=saida)
+        self.assertIn("3 lista(s) consolidada(s)", saida.getvalue())
+        self.assertEqual(self.consolidado(), self.agregado_do_zero())
+        self.assertEqual(self.consolidado()[datetime.date(2025, 2, 1), self.feijao.pk], (5, Decimal('20.00')))
+
+    def test_csv(self):
+        url = reverse('feira_app:relatorio_consolidado_csv')
+        resposta = self.client.get(url, {'inicio': '2025-02', 'fim': '2025-02'})
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        linhas = list(csv.reader(b''.join(resposta.streaming_content).decode().splitlines()))
+        self.assertEqual(linhas, [
+            ['periodo', 'codigo', 'produto', 'unidade', 'quantidade_total', 'valor_total'],
+            ['2025-02-01', 'ARR', 'Arroz', 'Kg', '1', '5.00'],
+            ['2025-02-01', 'FEI', 'Feijão', 'Kg', '4', '16.00'],
+        ])
+
+        resposta = self.client.get(url, {'agrupar': 'produto'})
+        linhas = list(csv.reader(b''.join(resposta.streaming_content).decode().splitlines()))
+        self.assertEqual(linhas[1:], [['ARR', 'Arroz', 'Kg', '2', '10.00'], ['FEI', 'Feijão', 'Kg', '7', '28.00']])
+
+        self.assertEqual(self.client.get(url, {'inicio': '2025'}).status_code, 400)
+
+    def test_csv_somente_equipe(self):
+        usuario = User.objects.create_user('maria', 'maria@example.com')
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse('feira_app:relatorio_consolidado_csv'))
+        self.assertEqual(resposta.status_code, 302)
+        self.assertIn(reverse('admin:login'), resposta['Location'])
+
+
+class VirarCicloTests(TestCase):
+    """Virada de ciclo (ciclo.py, virar_ciclo): pode ser executada de novo e retomada depois de uma falha."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.beneficiarios = [
+            Beneficiario.objects.create(
+                nome=f"Beneficiário {i}", email=f"b{i}@example.com", beneficio_mensal=Decimal('10.00')
+            )
+            for i in range(5)
+        ]
+        # Ciclo anterior: quatro listas abertas (duas com itens); o último beneficiário não tem lista
+        for i, beneficiario in enumerate(self.beneficiarios[:4]):
+            lista = carrinho.obter_ou_criar_lista_aberta(beneficiario)
+            if i < 2:
+                carrinho.adicionar_item(lista.pk, produto, 1)
+        ListaDeCompra.objects.update(data_criacao=timezone.now() - datetime.timedelta(days=40))
+        self.inicio = timezone.now() - datetime.timedelta(days=1)
+
+    def virar(self):
+        saida = StringIO()
+        call_command('virar_ciclo', '--lote', '2', stdout=saida)
+        return saida.getvalue()
+
+    def assertUmaListaAbertaPorBeneficiario(self):
+        abertas = ListaDeCompra.objects.filter(status='aberta', data_criacao__gte=self.inicio)
+        self.assertEqual(
+            sorted(abertas.values_list('beneficiario_id', flat=True)), [b.pk for b in self.beneficiarios]
+        )
+
+    def test_executar_de_novo_nao_refaz_nada(self):
+        saida = self.virar()
+        self.assertIn("2 lista(s) finalizada(s), 2 cancelada(s) (vazias).", saida)
+        self.assertIn("2 lista(s) somada(s) ao relatório consolidado.", saida)
+        self.assertIn("5 lista(s) aberta(s) criada(s).", saida)
+
+        saida = self.virar()
+        self.assertIn("0 lista(s) finalizada(s), 0 cancelada(s) (vazias).", saida)
+        self.assertIn("0 lista(s) somada(s) ao relatório consolidado.", saida)
+        self.assertIn("0 lista(s) aberta(s) criada(s).", saida)
+        self.assertUmaListaAbertaPorBeneficiario()
+        self.assertEqual(ListaDeCompra.objects.count(), 9)
+
+    def test_lista_aberta_durante_a_virada_nao_e_contada(self):
+        encerrar_listas_abertas(self.inicio)
+        bulk_create = ListaDeCompra.objects.bulk_create
+
+        def com_requisicao_concorrente(*args, **kwargs):
+            # O beneficiário abre a lista pelo site entre a leitura do lote e o INSERT
+            carrinho.obter_ou_criar_lista_aberta(self.beneficiarios[0])
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(ListaDeCompra.objects, 'bulk_create', side_effect=com_requisicao_concorrente):
+            self.assertEqual(abrir_listas(self.inicio, tamanho_lote=10), 4)
+        self.assertUmaListaAbertaPorBeneficiario()
+
+    def test_retoma_depois_de_lote_interrompido(self):
+        with mock.patch('feira_app.ciclo.invalidar_todos_os_resumos', side_effect=[None, RuntimeError("queda")]):
+            with self.assertRaises(RuntimeError):
+                encerrar_listas_abertas(self.inicio, tamanho_lote=2)
+        # O primeiro lote ficou gravado; o segundo voltou atrás inteiro
+        self.assertEqual(ListaDeCompra.objects.filter(status='aberta').count(), 2)
+        self.assertEqual(encerrar_listas_abertas(self.inicio, tamanho_lote=2), (0, 2))
+
+        bulk_create = ListaDeCompra.objects.bulk_create
+        chamadas = []
+
+        def cai_no_segundo_lote(*args, **kwargs):
+            chamadas.append(1)
+            if len(chamadas) == 2:
+                raise RuntimeError("queda")
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(ListaDeCompra.objects, 'bulk_create', side_effect=cai_no_segundo_lote):
+            with self.assertRaises(RuntimeError):
+                abrir_listas(self.inicio, tamanho_lote=2)
+        self.assertEqual(ListaDeCompra.objects.filter(status='aberta').count(), 2)
+        self.assertEqual(abrir_listas(self.inicio, tamanho_lote=2), 3)
+        self.assertUmaListaAbertaPorBeneficiario()
+
+
+class ImportarPlanilhaTests(TestCase):
+    """importar_planilha: upsert por código, erros por linha e os formatos das planilhas em português."""
+
+    def setUp(self):
+        self.pasta = self.enterContext(tempfile.TemporaryDirectory())
+        self.feijao = Produto.objects.create(nome="Feijão", codigo='FEI', preco_unitario=Decimal('4.00'))
+
+    def importar(self, conteudo, *args):
+        caminho = os.path.join(self.pasta, 'planilha.csv')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        saida, erros = StringIO(), StringIO()
+        call_command('importar_planilha', 'produtos', caminho, *args, stdout=saida, stderr=erros)
+        return saida.getvalue(), erros.getvalue()
+
+    def test_insere_e_atualiza_pelo_codigo_sem_abortar_o_lote(self):
+        saida, erros = self.importar(
+            "Código;Nome;Preço Unitário;Unidade Medida\n"
+            "FEI;Feijão carioca;7,35;Kg\n"
+            "ARR;Arroz;1.234,56;\n"
+            "OVO;Ovos;abc;Dúzia\n"
+            "SAL;;1,00;Kg\n",
+            '--lote', '3',
+        )
+        self.assertIn("2 registro(s) inserido(s) ou atualizado(s); 2 linha(s) com erro.", saida)
+        self.assertIn("Linha 4: número inválido: 'abc'", erros)
+        self.assertIn("Linha 5: nome: campo obrigatório vazio", erros)
+
+        produtos = {p.codigo: p for p in Produto.objects.all()}
+        self.assertEqual(sorted(produtos), ['ARR', 'FEI'])
+        self.assertEqual(produtos['FEI'].pk, self.feijao.pk)  # atualizado, não duplicado
+        self.assertEqual(
+            (produtos['FEI'].nome, produtos['FEI'].nome_normalizado, produtos['FEI'].preco_unitario),
+            ("Feijão carioca", "feijao carioca", Decimal('7.35')),
+        )
+        self.assertEqual((produtos['ARR'].preco_unitario, produtos['ARR'].unidade_medida), (Decimal('1234.56'), None))
+
+    def test_detecta_o_delimitador(self):
+        for delimitador, preco in ((',', '5.50'), ('\t', '5,50'), (';', '5,50')):
+            with self.subTest(delimitador=delimitador):
+                cabecalho = delimitador.join(['codigo', 'nome', 'preco_unitario', 'disponivel'])
+                linha = delimitador.join(['FEI', 'Feijão', f'"{preco}"' if delimitador == ',' else preco, 'não'])
+                saida, erros = self.importar(f"{cabecalho}\n{linha}\n")
+                self.assertEqual(erros, '')
+                self.feijao.refresh_from_db()
+                self.assertEqual((self.feijao.preco_unitario, self.feijao.disponivel), (Decimal('5.50'), False))
+
+
+class CatalogoTests(TestCase):
+    """Busca e paginação por chave do catálogo (catalogo.py)."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def nomes(self, termo):
+        return [linha['nome'] for linha in obter_produtos_disponiveis(termo)[0]]
+
+    def test_busca_sem_acentos_e_maiusculas(self):
+        for nome in ("Feijão", "Feijão Preto", "Farinha", "Açúcar"):
+            Produto.objects.create(nome=nome, preco_unitario=Decimal('1.00'))
+        Produto.objects.create(nome="Feijão Fradinho", preco_unitario=Decimal('1.00'), disponivel=False)
+        self.assertEqual(self.nomes("feijao"), ["Feijão", "Feijão Preto"])
+        self.assertEqual(self.nomes("  FEIJÃO p"), ["Feijão Preto"])
+        self.assertEqual(self.nomes("acucar"), ["Açúcar"])
+
+    def test_paginas_com_nomes_repetidos(self):
+        # Seis "Alface" seguidos: o id desempata e nenhuma linha se repete ou fica de fora entre as páginas
+        for nome in ["Alface"] * 6 + ["Batata", "Abacate"]:
+            Produto.objects.create(nome=nome, preco_unitario=Decimal('1.00'))
+        esperado = list(Produto.objects.order_by('nome', 'id').values_list('id', flat=True))
+
+        vistos, cursor, paginas = [], None, 0
+        while True:
+            linhas, cursor = obter_produtos_disponiveis(cursor=cursor, por_pagina=3)
+            vistos.extend(linha['id'] for linha in linhas)
+            paginas += 1
+            if cursor is None:
+                break
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(paginas, 3)
+
+    def test_sem_cache_compartilhado_a_versao_expira(self):
+        produto = Produto.objects.create(nome="Arroz", preco_unitario=Decimal('5.00'))
+        obter_produtos_disponiveis()
+        # Preço alterado em outro worker: a invalidação dele não chega ao cache deste processo
+        Produto.objects.filter(pk=produto.pk).update(preco_unitario=Decimal('6.00'))
+        self.assertEqual(obter_produtos_disponiveis()[0][0]['preco_unitario'], Decimal('5.00'))
+
+        self.assertEqual(catalogo.TIMEOUT_VERSAO, catalogo.TIMEOUT_CATALOGO)
+        with mock.patch('time.time', return_value=time.time() + catalogo.TIMEOUT_CATALOGO + 1):
+            self.assertEqual(obter_produtos_disponiveis()[0][0]['preco_unitario'], Decimal('6.00'))
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        for i in range(4):
+            Produto.objects.create(nome=f"Produto {i}", preco_unitario=Decimal('1.00'))
+        primeira = obter_produtos_disponiveis(por_pagina=2)
+
+        def cursor(bruto):
+            return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+        adulterados = [
+            'não-é-base64!', cursor(b'\xff\xfe'), cursor(b'{"nome": 1}'), cursor(b'["Produto 1"]'),
+            cursor(b'["Produto 1", [2]]'), cursor(b'[' * 100000),
+        ]
+        for adulterado in adulterados:
+            with self.subTest(cursor=adulterado[:30]):
+                self.assertEqual(obter_produtos_disponiveis(cursor=adulterado, por_pagina=2), primeira)
+
+        self.assertNotEqual(obter_produtos_disponiveis(cursor=primeira[1], por_pagina=2), primeira)
+        self.assertEqual(primeira[1], codificar_cursor(primeira[0][-1]))
+
+    def test_salvar_e_excluir_produto_invalidam_depois_do_commit(self):
+        feijao = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        arroz = Produto.objects.create(nome="Arroz", preco_unitario=Decimal('5.00'))
+        obter_produtos_disponiveis()
+        versao = versao_atual()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            feijao.preco_unitario = Decimal('4.50')
+            feijao.save()
+        # Antes do commit os workers continuam com a versão (e as páginas) de antes
+        self.assertEqual(versao_atual(), versao)
+        self.assertEqual(obter_produtos_disponiveis()[0][1]['preco_unitario'], Decimal('4.00'))
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(versao_atual(), versao)
+
+        faltas = estatisticas_catalogo()['faltas']
+        self.assertEqual(obter_produtos_disponiveis()[0][1]['preco_unitario'], Decimal('4.50'))
+        self.assertEqual(estatisticas_catalogo()['faltas'], faltas + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            arroz.delete()
+        self.assertEqual([linha['nome'] for linha in obter_produtos_disponiveis()[0]], ["Feijão"])
+        self.assertEqual(estatisticas_catalogo()['faltas'], faltas + 2)
+
+
+class ContextoBeneficiarioTests(TestCase):
+    """request.feira (middleware.py): preguiçoso e resolvido com uma consulta."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('maria', 'Maria@Example.com')
+        self.beneficiario = Beneficiario.objects.create(
+            nome="Maria", email='maria@example.com', user=self.usuario, beneficio_mensal=Decimal('10.00')
+        )
+        self.lista = carrinho.obter_ou_criar_lista_aberta(self.beneficiario)
+
+    def requisicao(self, usuario):
+        request = RequestFactory().get('/')
+        request.user = usuario
+        BeneficiarioMiddleware(lambda request: HttpResponse())(request)
+        return request
+
+    def test_sem_consulta_enquanto_nao_e_usado(self):
+        with self.assertNumQueries(0):
+            self.requisicao(self.usuario)
+
+    def test_beneficiario_e_lista_em_uma_consulta(self):
+        request = self.requisicao(self.usuario)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.feira.beneficiario, self.beneficiario)
+            self.assertEqual(request.feira.lista_ativa, self.lista)
+            self.assertEqual(request.feira.beneficiario.nome, "Maria")
+
+    def test_vincula_pelo_email_sem_diferenciar_maiusculas(self):
+        usuario = User.objects.create_user('ana', 'ANA@example.com')
+        ana = Beneficiario.objects.create(nome="Ana", email='ana@example.com', beneficio_mensal=Decimal('10.00'))
+        self.assertEqual(self.requisicao(usuario).feira.beneficiario, ana)
+        ana.refresh_from_db()
+        self.assertEqual(ana.user, usuario)
+
+
+class VinculoUsuariosMigracaoTests(TransactionTestCase):
+    """Migração 0003: preenche Beneficiario.user a partir do e-mail."""
+
+    antes = [('feira_app', '0002_listadecompra_totais')]
+    depois = [('feira_app', '0003_beneficiario_user')]
+
+    def migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.migrate(alvo)
+        return executor.loader.project_state(alvo).apps
+
+    def test_vincula_por_email_sem_diferenciar_maiusculas(self):
+        ultima = MigrationExecutor(connection).loader.graph.leaf_nodes('feira_app')
+        self.addCleanup(self.migrar, ultima)
+        apps = self.migrar(self.antes)
+        BeneficiarioAntigo = apps.get_model('feira_app', 'Beneficiario')
+        maria = User.objects.create(username='maria', email='Maria@Example.COM')
+        for nome, email in (("Maria", 'maria@example.com'), ("José", 'jose@example.com')):
+            BeneficiarioAntigo.objects.create(nome=nome, email=email, beneficio_mensal=Decimal('10.00'))
+
+        apps = self.migrar(self.depois)
+        vinculos = dict(apps.get_model('feira_app', 'Beneficiario').objects.values_list('nome', 'user_id'))
+        self.assertEqual(vinculos, {"Maria": maria.pk, "José": None})
+
+
+class CardsProdutosTests(TestCase):
+    """Fragmentos dos cards em cache (feira_tags.cards_produtos)."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        for nome in ("maria", "jose"):
+            usuario = User.objects.create_user(nome, f'{nome}@example.com')
+            Beneficiario.objects.create(
+                nome=nome, email=usuario.email, user=usuario, beneficio_mensal=Decimal('10.00')
+            )
+
+    def pagina(self, username):
+        cliente = self.client_class()
+        cliente.force_login(User.objects.get(username=username))
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = cliente.get(reverse('feira_app:produto_list'))
+        return resposta.content.decode(), cliente.cookies['csrftoken'].value
+
+    def tokens_dos_cards(self, html):
+        return re.findall(r'action="/lista/adicionar/\d+/" data-carrinho>\s*<input[^>]*value="([^"]*)"', html)
+
+    def test_token_csrf_de_cada_requisicao(self):
+        for username in ("maria", "jose"):
+            html, segredo = self.pagina(username)
+            self.assertNotIn(CSRF_MARCADOR, html)
+            tokens = self.tokens_dos_cards(html)
+            self.assertEqual(len(tokens), 1)
+            # O token do card é o do usuário desta requisição, não o de quem montou o fragmento
+            self.assertEqual(_unmask_cipher_token(tokens[0]), segredo)
+
+        produto = Produto.objects.values('id', 'data_atualizacao').get()
+        fragmento = cache.get(chave_card(produto))
+        self.assertIn(CSRF_MARCADOR, fragmento)
+
+    def test_mudanca_de_preco_gera_card_novo(self):
+        html, _ = self.pagina("maria")
+        self.assertIn("R$ 4,00", html)
+        chave_antiga = chave_card(Produto.objects.values('id', 'data_atualizacao').get())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.preco_unitario = Decimal('4.50')
+            self.produto.save()
+        html, _ = self.pagina("jose")
+        self.assertIn("R$ 4,50", html)
+        self.assertNotIn("R$ 4,00", html)
+        self.assertNotEqual(chave_card(Produto.objects.values('id', 'data_atualizacao').get()), chave_antiga)
+
+
+class InstrumentacaoTests(TestCase):
+    """InstrumentacaoMiddleware: Server-Timing, log por requisição e amostragem dos histogramas."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        usuario = User.objects.create_user('maria', 'maria@example.com')
+        Beneficiario.objects.create(nome="Maria", email=usuario.email, user=usuario, beneficio_mensal=Decimal('10.00'))
+        Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.client.force_login(usuario)
+
+    def amostras(self, view):
+        return instrumentacao.estatisticas_requisicoes().get(view, {}).get('tempo_ms', {}).get('amostras', 0)
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('feira_app:produto_list'))
+        partes = re.fullmatch(
+            r'app;dur=([\d.]+), db;dur=([\d.]+);desc="(\d+) consultas", tpl;dur=([\d.]+)', resposta['Server-Timing']
+        )
+        self.assertIsNotNone(partes, resposta['Server-Timing'])
+        app_ms, db_ms, total_consultas, template_ms = partes.groups()
+        self.assertEqual(int(total_consultas), len(consultas))
+        self.assertGreater(float(template_ms), 0)
+        self.assertGreaterEqual(float(app_ms), float(template_ms))
+
+    def test_log_silenciado_nos_testes(self):
+        self.assertFalse(instrumentacao.logger.isEnabledFor(logging.INFO))
+        # Com o nível ligado, cada requisição vira uma linha JSON
+        with self.assertLogs('feira_app.requisicoes', 'INFO') as logs:
+            self.client.get(reverse('feira_app:aquecimento'))
+        linha = json.loads(logs.records[0].getMessage())
+        self.assertEqual((linha['view'], linha['status'], linha['metodo']), ('feira_app:aquecimento', 200, 'GET'))
+
+    def test_amostragem(self):
+        url = reverse('feira_app:aquecimento')
+        antes = self.amostras('feira_app:aquecimento')
+        with mock.patch.object(instrumentacao, 'TAXA_AMOSTRAGEM', 0):
+            self.client.get(url)
+        self.assertEqual(self.amostras('feira_app:aquecimento'), antes)
+
+        with mock.patch.object(instrumentacao, 'TAXA_AMOSTRAGEM', 1):
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(self.amostras('feira_app:aquecimento'), antes + 2)
+
+        with mock.patch.object(instrumentacao, 'TAXA_AMOSTRAGEM', 0.5), \
+                mock.patch.object(instrumentacao.random, 'random', side_effect=[0.2, 0.7]):
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(self.amostras('feira_app:aquecimento'), antes + 3)
+
+
+class VerificarTotaisListasTests(TestCase):
+    """verificar_totais_listas: aponta e corrige totais desnormalizados que divergem dos itens."""
+
+    def setUp(self):
+        produto = Produto.objects.create(nome="Feijão", preco_unitario=Decimal('4.00'))
+        self.listas = []
+        for i in range(3):
+            beneficiario = Beneficiario.objects.create(
+                nome=f"Beneficiário {i}", email=f"b{i}@example.com", beneficio_mensal=Decimal('10.00')
+            )
+            lista = carrinho.obter_ou_criar_lista_aberta(beneficiario)
+            if i < 2:
+                carrinho.adicionar_item(lista.pk, produto, 2)
+            self.listas.append(lista)
+
+    def verificar(self, *args):
+        saida = StringIO()
+        call_command('verificar_totais_listas', *args, stdout=saida)
+        return saida.getvalue()
+
+    def totais(self):
+        return list(ListaDeCompra.objects.order_by('pk').values_list('valor_total', 'quantidade_itens'))
+
+    def test_aponta_e_corrige_divergencias(self):
+        self.assertIn("Nenhuma divergência encontrada.", self.verificar())
+        corretos = self.totais()
+
+        # Totais corrompidos por fora do serviço de carrinho (UPDATE direto, como um script antigo)
+        ListaDeCompra.objects.filter(pk=self.listas[0].pk).update(valor_total=Decimal('99.00'))
+        ListaDeCompra.objects.filter(pk=self.listas[2].pk).update(quantidade_itens=3)
+
+        saida = self.verificar()
+        self.assertIn(f"Lista {self.listas[0].pk}: total armazenado R$ 99.00 / real R$ 8.00", saida)
+        self.assertIn(f"Lista {self.listas[2].pk}: total armazenado R$ 0.00 / real R$ 0.00; "
+                      "itens armazenados 3 / reais 0", saida)
+        self.assertNotIn(f"Lista {self.listas[1].pk}:", saida)
+        self.assertIn("2 lista(s) divergente(s).", saida)
+        self.assertNotEqual(self.totais(), corretos)  # sem --corrigir nada muda
+
+        self.assertIn("2 lista(s) corrigida(s).", self.verificar('--corrigir'))
+        self.assertEqual(self.totais(), corretos)
+        self.assertIn("Nenhuma divergência encontrada.", self.verificar())
+
+
+class MontarEstaticosTests(SimpleTestCase):
+    """montar_estaticos só aceita os arquivos do CDN com o hash fixado em INTEGRIDADE."""
+
+    def setUp(self):
+        pasta = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(mock.patch.object(montar_estaticos, 'VENDOR', pasta / 'vendor'))
+        self.enterContext(mock.patch.object(montar_estaticos, 'DIST', pasta / 'dist'))
+        self.vendor = pasta / 'vendor'
+
+    def baixar(self, conteudo):
+        resposta = mock.MagicMock()
+        resposta.__enter__.return_value.read.return_value = conteudo
+        return mock.patch.object(montar_estaticos.urllib.request, 'urlopen', return_value=resposta)
+
+    def test_hash_diferente_aborta_sem_gravar(self):
+        with self.baixar(b'/* alterado no caminho */'), self.assertRaisesMessage(CommandError, "não confere"):
+            call_command('montar_estaticos', stdout=StringIO())
+        self.assertFalse((self.vendor / 'bootstrap.min.css').exists())
+
+    def test_confere_pelo_formato_sri(self):
+        conteudo = b'body{}'
+        integridade = 'sha384-' + base64.b64encode(hashlib.sha384(conteudo).digest()).decode()
+        self.assertTrue(montar_estaticos._confere(conteudo, integridade))
+        self.assertFalse(montar_estaticos._confere(conteudo + b' ', integridade))
+        self.assertNotIn('alpha', montar_estaticos.BOOTSTRAP_VERSAO)
+
+
+class AddManyToListFormTests(SimpleTestCase):
+    def test_quantidades_inteiras_com_erro_no_campo(self):
+        for form in (
+            AddManyToListForm.from_json({'itens': {'7': 1.5, '8': 2}}),
+            AddManyToListForm({'quantidade_7': '1.5', 'quantidade_8': '2'}),
+            AddManyToListForm.from_json({'itens': {'7': True, '8': 2}}),
+        ):
+            self.assertFalse(form.is_valid())
+            self.assertEqual(list(form.errors), ['quantidade_7'])
+            self.assertIn("use um número inteiro", form.errors['quantidade_7'][0])
+
+        form = AddManyToListForm.from_json({'itens': {'7': -1}})
+        self.assertEqual(form.errors['quantidade_7'], ["As quantidades não podem ser negativas."])
+        form = AddManyToListForm.from_json({'itens': {'abc': 1}})
+        self.assertEqual(list(form.errors), ['quantidade_abc'])
+
+        form = AddManyToListForm.from_json({'itens': {'7': 2.0, '8': '', '9': 0}, 'modo': 'definir'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['mudancas'], {7: 2, 8: 0, 9: 0})
+
+    def test_limite_de_produtos_por_lote(self):
+        maximo = AddManyToListForm.MAX_PRODUTOS
+        form = AddManyToListForm.from_json({'itens': {str(i): 1 for i in range(1, maximo + 1)}})
+        self.assertTrue(form.is_valid())
+        form = AddManyToListForm.from_json({'itens': {str(i): 1 for i in range(1, maximo + 2)}})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(), [f"Envie no máximo {maximo} produtos de uma vez."])
+
+
+class BenchmarksTests(SimpleTestCase):
+    """
+    Os comandos benchmark_* rodam de ponta a ponta com os limites padrão de admissão.
+    Num processo à parte: cada comando cria e apaga o próprio banco temporário.
+    """
+
+    def executar(self, *argumentos):
+        processo = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), *argumentos],
+            capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(processo.returncode, 0, processo.stderr)
+        return processo.stdout
+
+    def test_benchmark_views(self):
+        saida = self.executar(
+            'benchmark_views', '--threads', '2', '--requisicoes', '10', '--beneficiarios', '2', '--produtos', '20'
+        )
+        self.assertIn("add_to_list: p50=", saida)
+
+    def test_benchmark_sessoes(self):
+        saida = self.executar('benchmark_sessoes', '--repeticoes', '8')
+        self.assertIn("signed_cookies:", saida)
+
+    def test_benchmark_renderizacao(self):
+        saida = self.executar('benchmark_renderizacao', '--produtos', '10', '--repeticoes', '2')
+        self.assertIn("com os fragmentos em cache", saida)
+
+
+class ConsultasQuentesIndicesTests(TestCase):
+    """As consultas mais frequentes usam índice (EXPLAIN), no SQLite e no PostgreSQL."""
+
+    def setUp(self):
+        self.beneficiario = Beneficiario.objects.create(
+            nome="Ana", email="ana@example.com", beneficio_mensal=Decimal('10.00')
+        )
+        self.lista = carrinho.obter_ou_criar_lista_aberta(self.beneficiario)
+
+    def _plano(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Com tabelas minúsculas o PostgreSQL preferiria o seq scan de qualquer jeito
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsaIndice(self, queryset, tabela, indices=()):
+        plano = self._plano(queryset)
+        self.assertNotRegex(plano, rf'(?m)SCAN {tabela}\s*$|Seq Scan on {tabela}\b', plano)
+        if indices:
+            self.assertTrue(any(indice in plano for indice in indices), plano)
+        return plano
+
+    def test_beneficiario_por_email(self):
+        self.assertUsaIndice(Beneficiario.objects.filter(email='ana@example.com'), 'feira_app_beneficiario')
+
+    def test_lista_aberta_do_beneficiario(self):
+        self.assertUsaIndice(
+            ListaDeCompra.objects.filter(beneficiario=self.beneficiario, status='aberta'),
+            'feira_app_listadecompra',
+            indices=('lista_benef_status_idx', 'lista_uma_aberta_por_beneficiario'),
+        )
+
+    def test_catalogo_de_disponiveis_por_nome(self):
+        plano = self.assertUsaIndice(
+            Produto.objects.filter(disponivel=True).order_by('nome', 'id')[:61],
+            'feira_app_produto',
+            indices=('produto_disp_nome_id_idx',),
+        )
+        # O índice já entrega as linhas na ordem: nenhuma ordenação extra
+        self.assertNotRegex(plano, r'TEMP B-TREE FOR ORDER BY|\bSort\b', plano)
+
+    def test_itens_da_lista(self):
+        self.assertUsaIndice(
+            ItemDaLista.objects.filter(lista=self.lista).select_related('produto'), 'feira_app_itemdalista'
+        )
+
+    def test_uma_lista_aberta_por_beneficiario(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ListaDeCompra.objects.create(beneficiario=self.beneficiario, limite_compra_calculado=Decimal('30.00'))
+        self.assertEqual(carrinho.obter_ou_criar_lista_aberta(self.beneficiario), self.lista)
+
+
+class InicializacaoTests(TestCase):
+    def test_fases_sem_banco_cabem_no_orcamento(self):
+        # Interpretador novo, como um worker no cold start: import do Django, setup, URLConf e templates
+        tempos, _, _ = medir_fases(com_banco=False)
+        self.assertLessEqual(sum(tempos.values()), ORCAMENTO_MS, tempos)
+
+    def test_aquecimento(self):
+        resposta = self.client.get(reverse('feira_app:aquecimento'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(set(resposta.json()['fases']), {'urlconf', 'templates', 'conexao', 'catalogo'})
+
+
+class RoteadorReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.roteador = roteador.RoteadorReplica()
+        self.roteador.replica = 'replica'
+
+    def test_catalogo_na_replica_e_listas_no_primario(self):
+        self.assertEqual(self.roteador.db_for_read(Produto), 'replica')
+        self.assertEqual(self.roteador.db_for_read(ListaDeCompra), 'default')
+        with roteador.leituras_na_replica():
+            self.assertEqual(self.roteador.db_for_read(ListaDeCompra), 'replica')
+        with roteador.leituras_no_primario():
+            self.assertEqual(self.roteador.db_for_read(Produto), 'default')
+
+    def test_escrita_fixa_a_requisicao_no_primario(self):
+        token = roteador.iniciar_requisicao(fixado=False)
+        try:
+            self.assertEqual(self.roteador.db_for_read(Produto), 'replica')
+            self.assertEqual(self.roteador.db_for_write(Produto), 'default')
+            self.assertEqual(self.roteador.db_for_read(Produto), 'default')
+        finally:
+            estado = roteador.encerrar_requisicao(token)
+        self.assertTrue(estado.escreveu)
+
+    def test_middleware_marca_o_navegador_depois_de_uma_escrita(self):
+        def escreve(request):
+            self.roteador.db_for_write(ListaDeCompra)
+            return HttpResponse()
+
+        fabrica = RequestFactory()
+        resposta = ReplicaMiddleware(escreve)(fabrica.get('/'))
+        self.assertEqual(resposta.cookies[roteador.COOKIE_PRIMARIO]['max-age'], roteador.JANELA_PRIMARIO)
+
+        def le(request):
+            return HttpResponse(self.roteador.db_for_read(Produto))
+
+        self.assertEqual(ReplicaMiddleware(le)(fabrica.get('/')).content, b'replica')
+        fabrica.cookies[roteador.COOKIE_PRIMARIO] = '1'
+        self.assertEqual(ReplicaMiddleware(le)(fabrica.get('/')).content, b'default')
+
+
+class RoteadorReplicaTransacaoTests(TestCase):
+    def test_leituras_dentro_de_transacao_ficam_no_primario(self):
+        rot = roteador.RoteadorReplica()
+        rot.replica = 'replica'
+        # TestCase já roda cada teste dentro de transaction.atomic
+        self.assertEqual(rot.db_for_read(Produto), 'default')
@@ -1,7 +1,11 @@
 # feira_app/urls.py
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views # Django's built-in views
-from . import views
+from . import views, views_async
+
+# Sob ASGI as views do beneficiário usam as versões assíncronas (ver views_async.py)
+beneficiario = views_async if settings.FEIRA_VIEWS_ASYNC else views
 
 app_name = 'feira_app'
 
@@ -11,12 +15,20 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='feira_app:login'), name='logout'), # Redireciona para login após sair
 
     # URLs da Área do Beneficiário
-    path('produtos/', views.produto_list_view, name='produto_list'),
-    path('minha-lista/', views.minha_lista_view, name='minha_lista'),
-    path('lista/adicionar/<int:produto_id>/', views.add_to_list_view, name='add_to_list'),
-    path('lista/item/atualizar/<int:item_id>/', views.update_list_item_view, name='update_list_item'),
-    path('lista/item/remover/<int:item_id>/', views.remove_from_list_view, name='remove_from_list'),
+    path('produtos/', beneficiario.produto_list_view, name='produto_list'),
+    path('minha-lista/', beneficiario.minha_lista_view, name='minha_lista'),
+    path('lista/adicionar/<int:produto_id>/', beneficiario.add_to_list_view, name='add_to_list'),
+    path('lista/adicionar-em-lote/', beneficiario.add_many_to_list_view, name='add_many_to_list'),
+    path('lista/item/atualizar/<int:item_id>/', beneficiario.update_list_item_view, name='update_list_item'),
+    path('lista/item/remover/<int:item_id>/', beneficiario.remove_from_list_view, name='remove_from_list'),
+
+    # Aquecimento da instância (probe de inicialização; ver gunicorn.conf.py)
+    path('aquecimento/', views.aquecimento_view, name='aquecimento'),
+
+    # Métricas internas (somente equipe)
+    path('metricas/', views.metricas_view, name='metricas'),
+    path('relatorios/consolidado.csv', views.relatorio_consolidado_csv_view, name='relatorio_consolidado_csv'),
 
     # Você pode adicionar uma view de entrada/home aqui se necessário
-    path('', views.produto_list_view, name='home'), # Exemplo: home redireciona para lista de produtos
+    path('', beneficiario.produto_list_view, name='home'), # Exemplo: home redireciona para lista de produtos
 ]
\ No newline at end of file
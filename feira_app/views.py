@@ -1,69 +1,201 @@
 # feira_app/views.py
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseBadRequest
 from django.urls import reverse # MANTENHA O REVERSE
-from .models import Produto, Beneficiario, ListaDeCompra, ItemDaLista
-from .forms import AddToListForm, UpdateListItemForm
+from django.db.models import Sum
+from .models import Produto, ItemDaLista, ConsolidadoProduto
+from .forms import AddToListForm, AddManyToListForm, UpdateListItemForm
+from .admissao import controlar_admissao, estatisticas_admissao
+from .catalogo import obter_produtos_disponiveis, estatisticas_catalogo
+from .instrumentacao import estatisticas_requisicoes
+from .inicializacao import aquecer
+from . import carrinho
+from .carrinho import obter_ou_criar_lista_aberta
 from decimal import Decimal
-
-# Helper para obter o Beneficiario
-def get_beneficiario_atual(user):
-    if not user.is_authenticated:
-        return None
-    try:
-        # A forma ideal aqui seria ter um link OneToOneField do User para Beneficiario
-        # ex: return user.perfil_beneficiario
-        # Ou se Beneficiario fosse seu User model customizado: return user
-        # A solução abaixo (baseada no email) é um fallback e depende da consistência dos dados.
-        return Beneficiario.objects.get(email=user.email)
-    except Beneficiario.DoesNotExist:
-        messages.warning(user, "Perfil de beneficiário não encontrado para o email associado ao seu usuário.") # Adicionando user ao messages
-        return None
-    except AttributeError: # Caso user não tenha o atributo email (improvável para User padrão)
-        messages.error(user, "Erro ao tentar obter informações do usuário para buscar o perfil de beneficiário.") # Adicionando user ao messages
-        return None
-
+import csv
+import datetime
+import json
 
 @login_required
 def get_or_create_active_lista(request): # request é passado aqui
-    beneficiario = get_beneficiario_atual(request.user) # request.user já é o usuário
+    # Beneficiário e lista aberta já resolvidos (uma vez por requisição) pelo BeneficiarioMiddleware
+    contexto = request.feira
+    beneficiario = contexto.beneficiario
     if not beneficiario:
-        # A mensagem de erro já foi (ou deveria ser) enviada por get_beneficiario_atual
-        # Se quiser adicionar uma mensagem específica aqui:
-        # messages.error(request, "Não foi possível obter ou criar a lista pois o perfil de beneficiário não foi encontrado.")
+        messages.warning(request, "Perfil de beneficiário não encontrado para o seu usuário.")
         return None
 
-    # Garante que beneficio_mensal seja um Decimal para o cálculo, tratando None como 0
-    beneficio_valor = beneficiario.beneficio_mensal if beneficiario.beneficio_mensal is not None else Decimal('0.00')
+    if contexto.lista_ativa is not None:
+        return contexto.lista_ativa
 
-    lista, created = ListaDeCompra.objects.get_or_create(
-        beneficiario=beneficiario,
-        status='aberta',
-        defaults={'limite_compra_calculado': beneficio_valor * Decimal('3.00')}
-    )
-    # A lógica para atualizar o limite se o benefício mudar foi comentada,
-    # mantendo o limite fixo no momento da criação, como discutido.
+    # Criação sem duplicatas (trava o beneficiário); o limite fica fixo no momento da criação.
+    lista = obter_ou_criar_lista_aberta(beneficiario)
+    contexto.lista_ativa = lista
     return lista
 
+def _resumo_ou_aviso(request):
+    resumo = request.feira.resumo
+    if resumo is None:
+        messages.warning(request, "Perfil de beneficiário não encontrado para o seu usuário.")
+    return resumo
+
 @login_required
 def produto_list_view(request):
-    produtos = Produto.objects.filter(disponivel=True)
-    add_form = AddToListForm()
-    lista_ativa = get_or_create_active_lista(request)
-    beneficiario_atual = get_beneficiario_atual(request.user)
+    termo_busca = request.GET.get('q', '').strip()[:100]
+    cursor = request.GET.get('apos', '')
+    # Página cacheada (invalidada pelos sinais de Produto), paginada por (nome, id)
+    produtos, proximo_cursor = obter_produtos_disponiveis(termo_busca, cursor)
+    # Limite e total do carrinho em cache (resumo_carrinho.py): sem consultar a lista
+    resumo = _resumo_ou_aviso(request)
 
     context = {
         'produtos': produtos,
-        'add_form': add_form,
-        'lista_ativa': lista_ativa,
-        'beneficiario': beneficiario_atual
+        'resumo': resumo,
+        'beneficiario': request.feira.beneficiario,
+        'termo_busca': termo_busca,
+        'proximo_cursor': proximo_cursor,
+        'pagina_inicial': not cursor,
     }
     return render(request, 'feira_app/produto_list.html', context)
 
+# Mensagens e respostas comuns às views síncronas e às assíncronas (views_async.py)
+
+def _mensagem_adicao(produto, quantidade, resultado):
+    """(nível, texto) da mensagem de uma adição ao carrinho."""
+    if not resultado.sucesso:
+        return messages.ERROR, (
+            f"Não foi possível adicionar {produto.nome}. Limite de R$ {resultado.limite:.2f} seria excedido "
+            f"(restam R$ {resultado.limite_restante:.2f})."
+        )
+    if resultado.item.quantidade > quantidade:
+        return messages.SUCCESS, f"{quantidade} unidade(s) de {produto.nome} adicionada(s) à lista."
+    return messages.SUCCESS, f"{produto.nome} adicionado à lista."
+
+
+def _mensagem_atualizacao(item, resultado):
+    """(nível, texto) da mensagem de uma alteração de quantidade."""
+    if not resultado.sucesso:
+        return messages.ERROR, (
+            f"Não foi possível atualizar {item.produto.nome}. Limite de R$ {resultado.limite:.2f} seria excedido "
+            f"(restam R$ {resultado.limite_restante:.2f})."
+        )
+    return messages.SUCCESS, f"Quantidade de {item.produto.nome} atualizada."
+
+
+def _quer_json(request):
+    """O script do carrinho (_carrinho_js.html) pede JSON; sem JS, os formulários seguem com redirect."""
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+def _responder_acao(request, nivel, texto, redirecionamento, resultado=None, item=None,
+                    linha=False, removido=False, status=None):
+    """
+    Resposta de uma ação do carrinho.
+
+    Sem JS: mensagem + `redirecionamento` (o fluxo de sempre). Com o script: JSON com a
+    mensagem, os novos totais da lista e, se `linha`, o HTML da linha do item em
+    minha_lista.html, para a página se atualizar sem recarregar.
+    """
+    if not _quer_json(request):
+        messages.add_message(request, nivel, texto)
+        return redirecionamento
+
+    sucesso = nivel == messages.SUCCESS
+    dados = {'sucesso': sucesso, 'mensagem': texto, 'nivel': 'success' if sucesso else 'danger'}
+    if resultado is not None:
+        dados.update({
+            'total_lista': str(resultado.total),
+            'limite_restante': str(resultado.limite_restante),
+            'quantidade_itens': resultado.quantidade_itens,
+        })
+    if item is not None:
+        if removido:
+            dados['item_removido'] = item.pk
+        else:
+            dados['item'] = {'id': item.pk, 'quantidade': item.quantidade, 'subtotal': str(item.subtotal)}
+            if linha:
+                dados['linha_html'] = render_to_string(
+                    'feira_app/_item_lista_linha.html', {'item': item}, request=request
+                )
+    return JsonResponse(dados, status=status or (200 if sucesso else 409))
+
+
+def _redirecionar_para_origem(request):
+    # Volta para a página de onde o usuário veio (lista de produtos ou minha lista) ou fallback
+    return redirect(request.META.get('HTTP_REFERER', reverse('feira_app:produto_list')))
+
+
+def _ler_form_lote(request):
+    """(quer_json, form, resposta de erro ou None) de uma requisição de add_many_to_list."""
+    quer_json = request.content_type == 'application/json'
+    if not quer_json:
+        return quer_json, AddManyToListForm(request.POST), None
+    try:
+        return quer_json, AddManyToListForm.from_json(json.loads(request.body or b'{}')), None
+    except ValueError:
+        return quer_json, None, JsonResponse({'sucesso': False, 'erros': ["JSON inválido."]}, status=400)
+
+
+def _resposta_sem_lista_lote(request, quer_json):
+    if quer_json:
+        return JsonResponse({'sucesso': False, 'erros': ["Perfil de beneficiário não encontrado."]}, status=403)
+    return redirect('feira_app:produto_list')
+
+
+def _resposta_form_lote_invalido(request, quer_json, form):
+    erros = [erro for lista_erros in form.errors.values() for erro in lista_erros]
+    if quer_json:
+        return JsonResponse({'sucesso': False, 'erros': erros}, status=400)
+    for erro in erros:
+        messages.error(request, erro)
+    return _redirecionar_para_origem(request)
+
+
+def _resposta_lote(request, quer_json, resultado):
+    if resultado.erro:
+        # A lista foi encerrada depois que a página carregou: não há totais a mostrar
+        if quer_json:
+            return JsonResponse({'sucesso': False, 'mensagem': resultado.erro}, status=409)
+        messages.error(request, resultado.erro)
+        return _redirecionar_para_origem(request)
+    if resultado.produtos_indisponiveis:
+        mensagem = "Alguns produtos não estão mais disponíveis. Nenhuma alteração foi feita."
+    elif not resultado.sucesso:
+        mensagem = (
+            f"Não foi possível atualizar a lista. Limite de R$ {resultado.limite:.2f} seria excedido "
+            f"(restam R$ {resultado.limite_restante:.2f}). Nenhuma alteração foi feita."
+        )
+    else:
+        mensagem = f"Lista atualizada ({len(resultado.itens)} produto(s) alterado(s))."
+
+    if quer_json:
+        return JsonResponse({
+            'sucesso': resultado.sucesso,
+            'mensagem': mensagem,
+            'total_lista': str(resultado.total),
+            'limite': str(resultado.limite),
+            'limite_restante': str(resultado.limite_restante),
+            'quantidade_itens': resultado.quantidade_itens,
+            'produtos_indisponiveis': resultado.produtos_indisponiveis,
+            'itens': [
+                {'produto_id': item.produto_id, 'quantidade': item.quantidade, 'subtotal': str(item.subtotal)}
+                for item in resultado.itens
+            ],
+        }, status=200 if resultado.sucesso else 409)
+
+    if resultado.sucesso:
+        messages.success(request, mensagem)
+    else:
+        messages.error(request, mensagem)
+    return _redirecionar_para_origem(request)
+
+
 @login_required
-@transaction.atomic
+@controlar_admissao
 def add_to_list_view(request, produto_id):
     if request.method == 'POST':
         produto = get_object_or_404(Produto, id=produto_id, disponivel=True)
@@ -73,146 +205,199 @@ def add_to_list_view(request, produto_id):
         if not lista_compra:
             return redirect('feira_app:produto_list') # ou uma página de erro
 
-        if form.is_valid():
-            quantidade = form.cleaned_data['quantidade'] # int
+        if not form.is_valid():
+            return _responder_acao(
+                request, messages.ERROR, "Erro ao adicionar produto. Quantidade inválida ou dados incorretos.",
+                _redirecionar_para_origem(request), status=400,
+            )
+
+        quantidade = form.cleaned_data['quantidade'] # int
+        # Verificação do limite e gravação em uma única transação (ver carrinho.py)
+        resultado = carrinho.adicionar_item(lista_compra.pk, produto, quantidade)
+        if resultado.erro:
+            return _responder_acao(request, messages.ERROR, resultado.erro, _redirecionar_para_origem(request))
+        nivel, texto = _mensagem_adicao(produto, quantidade, resultado)
+        return _responder_acao(
+            request, nivel, texto, _redirecionar_para_origem(request), resultado=resultado, item=resultado.item
+        )
+    # Se não for POST, redireciona para a lista de produtos (ou outra página apropriada)
+    return redirect('feira_app:produto_list')
 
-            # --- INÍCIO DAS CORREÇÕES PARA TypeError ---
-            # Garante que preco_no_momento é Decimal
-            preco_no_momento = Decimal(str(produto.preco_unitario))
 
-            # Garanta que a multiplicação resulte em Decimal
-            custo_novo_item = preco_no_momento * Decimal(quantidade)
+@login_required
+@controlar_admissao
+def add_many_to_list_view(request):
+    """
+    Adiciona ou ajusta vários produtos de uma vez (ver AddManyToListForm).
 
-            # Garanta que total_atual_lista é Decimal
-            total_atual_lista = Decimal(str(lista_compra.total_lista))
+    Requisições JSON recebem os novos totais em JSON; o formulário de
+    produto_list.html recebe mensagens e o redirecionamento de sempre.
+    """
+    if request.method != 'POST':
+        return redirect('feira_app:produto_list')
 
-            # Garanta que limite_compra_calculado é Decimal (já é um DecimalField, mas converter str para segurança)
-            limite_calculado = Decimal(str(lista_compra.limite_compra_calculado))
-            # --- FIM DAS CORREÇÕES PARA TypeError ---
+    quer_json, form, erro = _ler_form_lote(request)
+    if erro:
+        return erro
 
-            if (total_atual_lista + custo_novo_item) > limite_calculado:
-                messages.error(request, f"Não foi possível adicionar {produto.nome}. Limite de R$ {limite_calculado:.2f} seria excedido.")
-            else:
-                item_existente, created = ItemDaLista.objects.get_or_create(
-                    lista=lista_compra,
-                    produto=produto,
-                    defaults={'quantidade': quantidade, 'preco_unitario_no_momento': preco_no_momento}
-                )
-                if not created:
-                    nova_quantidade = item_existente.quantidade + quantidade
-
-                    # --- INÍCIO DAS CORREÇÕES PARA TypeError (bloco item existente) ---
-                    preco_item_existente = Decimal(str(item_existente.preco_unitario_no_momento))
-
-                    novo_subtotal_item_existente = Decimal(nova_quantidade) * preco_item_existente
-                    subtotal_antigo_item_existente = Decimal(item_existente.quantidade) * preco_item_existente
-                    
-                    aumento_custo = novo_subtotal_item_existente - subtotal_antigo_item_existente
-                    # --- FIM DAS CORREÇÕES PARA TypeError (bloco item existente) ---
-
-                    if (total_atual_lista + aumento_custo) > limite_calculado:
-                        messages.error(request, f"Não foi possível adicionar mais unidades de {produto.nome}. Limite de R$ {limite_calculado:.2f} seria excedido.")
-                    else:
-                        item_existente.quantidade = nova_quantidade
-                        item_existente.save()
-                        messages.success(request, f"{quantidade} unidade(s) de {produto.nome} adicionada(s) à lista.")
-                else:
-                    messages.success(request, f"{produto.nome} adicionado à lista.")
-        else:
-            messages.error(request, "Erro ao adicionar produto. Quantidade inválida ou dados incorretos.")
-        
-        # Redireciona para a página de onde o usuário veio (lista de produtos ou minha lista) ou fallback
-        return redirect(request.META.get('HTTP_REFERER', reverse('feira_app:produto_list')))
-    # Se não for POST, redireciona para a lista de produtos (ou outra página apropriada)
-    return redirect('feira_app:produto_list')
+    lista_compra = get_or_create_active_lista(request)
+    if not lista_compra:
+        return _resposta_sem_lista_lote(request, quer_json)
+
+    if not form.is_valid():
+        return _resposta_form_lote_invalido(request, quer_json, form)
+
+    resultado = carrinho.aplicar_lote(
+        lista_compra.pk, form.cleaned_data['mudancas'], substituir=form.cleaned_data['substituir']
+    )
+    return _resposta_lote(request, quer_json, resultado)
 
 
 @login_required
 def minha_lista_view(request):
-    lista_compra = get_or_create_active_lista(request)
-    if not lista_compra:
+    resumo = _resumo_ou_aviso(request)
+    if not resumo:
         return redirect(reverse('feira_app:login')) 
 
-    itens_lista = ItemDaLista.objects.filter(lista=lista_compra).select_related('produto')
-    beneficiario = get_beneficiario_atual(request.user)
-
-    itens_com_forms = []
-    for item in itens_lista:
-        form_para_item = UpdateListItemForm(initial={'quantidade': item.quantidade})
-        itens_com_forms.append({
-            'item_obj': item,
-            'update_form': form_para_item
-        })
-
-    # --- ADICIONE O CÁLCULO DO LIMITE RESTANTE AQUI ---
-    limite_restante = Decimal('0.00') # Valor padrão
-    if lista_compra and lista_compra.limite_compra_calculado is not None:
-        # Garante que ambos são Decimal antes de subtrair
-        limite_calculado_decimal = Decimal(str(lista_compra.limite_compra_calculado))
-        total_lista_decimal = Decimal(str(lista_compra.total_lista)) # total_lista já deve ser Decimal pela property
-        limite_restante = limite_calculado_decimal - total_lista_decimal
+    # O campo de quantidade de cada linha é escrito direto no template (_item_lista_linha.html),
+    # sem instanciar um UpdateListItemForm por item. Limite e totais vêm do resumo em cache.
+    itens_lista = ItemDaLista.objects.filter(lista_id=resumo.lista_id).select_related('produto')
 
     context = {
-        'lista_compra': lista_compra,
-        'itens_com_forms': itens_com_forms,
-        'beneficiario': beneficiario,
-        'limite_restante': limite_restante, # <--- PASSE PARA O CONTEXTO
+        'resumo': resumo,
+        'itens': itens_lista,
+        'beneficiario': request.feira.beneficiario,
     }
     return render(request, 'feira_app/minha_lista.html', context)
 
 
 @login_required
-@transaction.atomic
+@controlar_admissao
 def update_list_item_view(request, item_id):
-    item = get_object_or_404(ItemDaLista, id=item_id)
+    item = get_object_or_404(ItemDaLista.objects.select_related('lista', 'produto'), id=item_id)
     lista_compra = item.lista
-    beneficiario_atual = get_beneficiario_atual(request.user)
-
-    if not beneficiario_atual or lista_compra.beneficiario != beneficiario_atual:
-        messages.error(request, "Acesso não autorizado.")
-        return redirect('feira_app:minha_lista')
-
-    if request.method == 'POST':
-        form = UpdateListItemForm(request.POST)
-        if form.is_valid():
-            nova_quantidade = form.cleaned_data['quantidade']
-            
-            # --- INÍCIO DAS CORREÇÕES PARA TypeError ---
-            # Garanta que os valores sejam Decimal
-            total_lista_decimal = Decimal(str(lista_compra.total_lista))
-            subtotal_item_decimal = Decimal(str(item.subtotal)) # subtotal já deve ser Decimal pela property
-            preco_unitario_item_decimal = Decimal(str(item.preco_unitario_no_momento))
-            limite_calculado_decimal = Decimal(str(lista_compra.limite_compra_calculado))
-            # --- FIM DAS CORREÇÕES PARA TypeError ---
-            
-            total_sem_este_item = total_lista_decimal - subtotal_item_decimal
-            novo_subtotal_item = Decimal(nova_quantidade) * preco_unitario_item_decimal
-            
-            if (total_sem_este_item + novo_subtotal_item) > limite_calculado_decimal:
-                messages.error(request, f"Não foi possível atualizar {item.produto.nome}. Limite de R$ {limite_calculado_decimal:.2f} seria excedido.")
-            else:
-                item.quantidade = nova_quantidade
-                item.save()
-                messages.success(request, f"Quantidade de {item.produto.nome} atualizada.")
-        else:
-            messages.error(request, "Erro ao atualizar item. Quantidade inválida ou dados incorretos.")
-    return redirect('feira_app:minha_lista')
+    beneficiario_atual = request.feira.beneficiario
+    voltar = redirect('feira_app:minha_lista')
+
+    if not beneficiario_atual or lista_compra.beneficiario_id != beneficiario_atual.pk:
+        return _responder_acao(request, messages.ERROR, "Acesso não autorizado.", voltar, status=403)
+
+    if request.method != 'POST':
+        return voltar
+    form = UpdateListItemForm(request.POST)
+    if not form.is_valid():
+        return _responder_acao(
+            request, messages.ERROR, "Erro ao atualizar item. Quantidade inválida ou dados incorretos.",
+            voltar, status=400,
+        )
+    resultado = carrinho.atualizar_quantidade(lista_compra.pk, item.pk, form.cleaned_data['quantidade'])
+    if resultado.erro:
+        return _responder_acao(request, messages.ERROR, resultado.erro, voltar)
+    nivel, texto = _mensagem_atualizacao(item, resultado)
+    # A linha volta mesmo quando o limite impede a mudança: o campo retoma a quantidade gravada
+    return _responder_acao(request, nivel, texto, voltar, resultado=resultado, item=resultado.item, linha=True)
 
 
 @login_required
-@transaction.atomic
+@controlar_admissao
 def remove_from_list_view(request, item_id):
-    item = get_object_or_404(ItemDaLista, id=item_id)
+    item = get_object_or_404(ItemDaLista.objects.select_related('lista', 'produto'), id=item_id)
     lista_compra = item.lista
-    beneficiario_atual = get_beneficiario_atual(request.user)
+    beneficiario_atual = request.feira.beneficiario
+    voltar = redirect('feira_app:minha_lista')
+
+    if not beneficiario_atual or lista_compra.beneficiario_id != beneficiario_atual.pk:
+        return _responder_acao(request, messages.ERROR, "Acesso não autorizado.", voltar, status=403)
+
+    if request.method != 'POST':
+        # GET só redireciona (evita remoção por link ou refresh)
+        return voltar
+    resultado = carrinho.remover_item(lista_compra.pk, item.pk)
+    if resultado.erro:
+        return _responder_acao(request, messages.ERROR, resultado.erro, voltar)
+    return _responder_acao(
+        request, messages.SUCCESS, f"{item.produto.nome} removido da lista.", voltar,
+        resultado=resultado, item=item, removido=True,
+    )
 
-    if not beneficiario_atual or lista_compra.beneficiario != beneficiario_atual:
-        messages.error(request, "Acesso não autorizado.")
-        return redirect('feira_app:minha_lista')
 
-    if request.method == 'POST':
-        produto_nome = item.produto.nome
-        item.delete()
-        messages.success(request, f"{produto_nome} removido da lista.")
-    # Se for GET, ou após o POST, redireciona (evita re-submissão do form com refresh)
-    return redirect('feira_app:minha_lista')
\ No newline at end of file
+@staff_member_required
+def metricas_view(request):
+    """Métricas internas deste processo (apenas equipe/admin)."""
+    return JsonResponse({
+        'catalogo': estatisticas_catalogo(),
+        'admissao': estatisticas_admissao(),
+        'requisicoes': estatisticas_requisicoes(),
+    })
+
+
+def aquecimento_view(request):
+    """
+    Aquecimento da instância (probe de inicialização do Cloud Run): URLConf, templates,
+    conexão desta thread com o banco e catálogo em cache. Público e idempotente.
+    """
+    return JsonResponse({'pronto': True, 'fases': aquecer()})
+
+
+class _Eco:
+    """'Arquivo' do csv.writer que só devolve a linha escrita (para o streaming)."""
+    def write(self, valor):
+        return valor
+
+
+def _mes_do_parametro(valor):
+    """'AAAA-MM' -> primeiro dia do mês; None se vazio; ValueError se inválido."""
+    if not valor:
+        return None
+    ano, mes = valor.split('-')
+    return datetime.date(int(ano), int(mes), 1)
+
+
+@staff_member_required
+def relatorio_consolidado_csv_view(request):
+    """
+    Consolidado por mês e produto, para os pedidos aos produtores, em CSV.
+
+    Filtros: ?inicio=AAAA-MM&fim=AAAA-MM (meses inclusive). Com ?agrupar=produto,
+    soma o intervalo inteiro por produto. Lê da tabela ConsolidadoProduto e envia
+    as linhas conforme são lidas (sem montar o arquivo em memória).
+    """
+    try:
+        inicio = _mes_do_parametro(request.GET.get('inicio'))
+        fim = _mes_do_parametro(request.GET.get('fim'))
+    except ValueError:
+        return HttpResponseBadRequest("Use o formato AAAA-MM em inicio e fim.")
+
+    linhas = ConsolidadoProduto.objects.all()
+    if inicio:
+        linhas = linhas.filter(periodo__gte=inicio)
+    if fim:
+        linhas = linhas.filter(periodo__lte=fim)
+
+    if request.GET.get('agrupar') == 'produto':
+        cabecalho = ['codigo', 'produto', 'unidade', 'quantidade_total', 'valor_total']
+        linhas = (
+            linhas.values('produto__codigo', 'produto__nome', 'produto__unidade_medida')
+            .annotate(quantidade=Sum('quantidade_total'), valor=Sum('valor_total'))
+            .order_by('produto__nome')
+            .values_list('produto__codigo', 'produto__nome', 'produto__unidade_medida', 'quantidade', 'valor')
+        )
+    else:
+        cabecalho = ['periodo', 'codigo', 'produto', 'unidade', 'quantidade_total', 'valor_total']
+        linhas = linhas.order_by('periodo', 'produto__nome').values_list(
+            'periodo', 'produto__codigo', 'produto__nome', 'produto__unidade_medida',
+            'quantidade_total', 'valor_total',
+        )
+
+    escritor = csv.writer(_Eco())
+
+    def gerar():
+        yield escritor.writerow(cabecalho)
+        for *colunas, valor_total in linhas.iterator(chunk_size=2000):
+            # Somas de Decimal no SQLite voltam sem as 2 casas
+            colunas.append(Decimal(valor_total).quantize(Decimal('0.01')))
+            yield escritor.writerow(['' if valor is None else valor for valor in colunas])
+
+    resposta = StreamingHttpResponse(gerar(), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = 'attachment; filename="consolidado.csv"'
+    return resposta
@@ -0,0 +1,216 @@
+# feira_app/views_async.py
+"""
+Versões assíncronas das views do beneficiário, usadas quando o projeto roda
+sob ASGI (FEIRA_SERVIDOR=asgi; ver urls.py e gunicorn.conf.py).
+
+Consultas simples usam o ORM assíncrono. O serviço de carrinho (transações com
+SELECT ... FOR UPDATE), o catálogo e a renderização dos templates continuam
+síncronos e rodam via sync_to_async, fora do event loop. Mensagens e respostas
+são as mesmas das views síncronas (views.py).
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.shortcuts import redirect, render
+
+from . import carrinho
+from .admissao import controlar_admissao
+from .carrinho import obter_ou_criar_lista_aberta
+from .catalogo import obter_produtos_disponiveis
+from .forms import AddToListForm, UpdateListItemForm
+from .models import ItemDaLista, Produto
+from .views import (
+    _ler_form_lote,
+    _mensagem_adicao,
+    _mensagem_atualizacao,
+    _redirecionar_para_origem,
+    _responder_acao,
+    _resposta_form_lote_invalido,
+    _resposta_lote,
+    _resposta_sem_lista_lote,
+)
+
+arender = sync_to_async(render)
+# Pode renderizar a linha do item (template): fora do event loop, como arender
+aresponder_acao = sync_to_async(_responder_acao)
+aresposta_lote = sync_to_async(_resposta_lote)
+
+
+async def _resolver_contexto(request):
+    user = await request.auser()
+    # Evita que o template (renderizado em outra thread) carregue o usuário de novo
+    request.user = user
+    await request.feira.aresolver(user)
+    return request.feira
+
+
+async def aget_or_create_active_lista(request):
+    contexto = await _resolver_contexto(request)
+    beneficiario = contexto.beneficiario
+    if not beneficiario:
+        messages.warning(request, "Perfil de beneficiário não encontrado para o seu usuário.")
+        return None
+
+    if contexto.lista_ativa is not None:
+        return contexto.lista_ativa
+
+    lista = await sync_to_async(obter_ou_criar_lista_aberta)(beneficiario)
+    contexto.lista_ativa = lista
+    return lista
+
+
+async def _aresumo_ou_aviso(request):
+    user = await request.auser()
+    request.user = user
+    await request.feira.aresolver_perfil(user)
+    if request.feira.beneficiario is None:
+        messages.warning(request, "Perfil de beneficiário não encontrado para o seu usuário.")
+        return None
+    # Numa falta do cache, lê (ou cria) a lista: fora do event loop
+    return await sync_to_async(lambda: request.feira.resumo)()
+
+
+async def _aget_item_do_beneficiario(request, item_id):
+    """Item com lista e produto; Http404 se não existir, None se for de outro beneficiário."""
+    try:
+        item = await ItemDaLista.objects.select_related('lista', 'produto').aget(id=item_id)
+    except ItemDaLista.DoesNotExist:
+        raise Http404("Item não encontrado.")
+    beneficiario_atual = (await _resolver_contexto(request)).beneficiario
+    if not beneficiario_atual or item.lista.beneficiario_id != beneficiario_atual.pk:
+        return None
+    return item
+
+
+@login_required
+async def produto_list_view(request):
+    termo_busca = request.GET.get('q', '').strip()[:100]
+    cursor = request.GET.get('apos', '')
+    produtos, proximo_cursor = await sync_to_async(obter_produtos_disponiveis)(termo_busca, cursor)
+    resumo = await _aresumo_ou_aviso(request)
+
+    context = {
+        'produtos': produtos,
+        'resumo': resumo,
+        'beneficiario': request.feira.beneficiario,
+        'termo_busca': termo_busca,
+        'proximo_cursor': proximo_cursor,
+        'pagina_inicial': not cursor,
+    }
+    return await arender(request, 'feira_app/produto_list.html', context)
+
+
+@login_required
+@controlar_admissao
+async def add_to_list_view(request, produto_id):
+    if request.method != 'POST':
+        return redirect('feira_app:produto_list')
+
+    try:
+        produto = await Produto.objects.aget(id=produto_id, disponivel=True)
+    except Produto.DoesNotExist:
+        raise Http404("Produto não encontrado.")
+    form = AddToListForm(request.POST)
+    lista_compra = await aget_or_create_active_lista(request)
+    if not lista_compra:
+        return redirect('feira_app:produto_list')
+
+    if not form.is_valid():
+        return await aresponder_acao(
+            request, messages.ERROR, "Erro ao adicionar produto. Quantidade inválida ou dados incorretos.",
+            _redirecionar_para_origem(request), status=400,
+        )
+
+    quantidade = form.cleaned_data['quantidade']
+    resultado = await sync_to_async(carrinho.adicionar_item)(lista_compra.pk, produto, quantidade)
+    if resultado.erro:
+        return await aresponder_acao(request, messages.ERROR, resultado.erro, _redirecionar_para_origem(request))
+    nivel, texto = _mensagem_adicao(produto, quantidade, resultado)
+    return await aresponder_acao(
+        request, nivel, texto, _redirecionar_para_origem(request), resultado=resultado, item=resultado.item
+    )
+
+
+@login_required
+@controlar_admissao
+async def add_many_to_list_view(request):
+    if request.method != 'POST':
+        return redirect('feira_app:produto_list')
+
+    quer_json, form, erro = _ler_form_lote(request)
+    if erro:
+        return erro
+
+    lista_compra = await aget_or_create_active_lista(request)
+    if not lista_compra:
+        return _resposta_sem_lista_lote(request, quer_json)
+
+    if not form.is_valid():
+        return _resposta_form_lote_invalido(request, quer_json, form)
+
+    resultado = await sync_to_async(carrinho.aplicar_lote)(
+        lista_compra.pk, form.cleaned_data['mudancas'], substituir=form.cleaned_data['substituir']
+    )
+    return await aresposta_lote(request, quer_json, resultado)
+
+
+@login_required
+async def minha_lista_view(request):
+    resumo = await _aresumo_ou_aviso(request)
+    if not resumo:
+        return redirect('feira_app:login')
+
+    itens_lista = [
+        item async for item in ItemDaLista.objects.filter(lista_id=resumo.lista_id).select_related('produto')
+    ]
+    context = {
+        'resumo': resumo,
+        'itens': itens_lista,
+        'beneficiario': request.feira.beneficiario,
+    }
+    return await arender(request, 'feira_app/minha_lista.html', context)
+
+
+@login_required
+@controlar_admissao
+async def update_list_item_view(request, item_id):
+    item = await _aget_item_do_beneficiario(request, item_id)
+    voltar = redirect('feira_app:minha_lista')
+    if item is None:
+        return await aresponder_acao(request, messages.ERROR, "Acesso não autorizado.", voltar, status=403)
+    if request.method != 'POST':
+        return voltar
+
+    form = UpdateListItemForm(request.POST)
+    if not form.is_valid():
+        return await aresponder_acao(
+            request, messages.ERROR, "Erro ao atualizar item. Quantidade inválida ou dados incorretos.",
+            voltar, status=400,
+        )
+    resultado = await sync_to_async(carrinho.atualizar_quantidade)(
+        item.lista_id, item.pk, form.cleaned_data['quantidade']
+    )
+    if resultado.erro:
+        return await aresponder_acao(request, messages.ERROR, resultado.erro, voltar)
+    nivel, texto = _mensagem_atualizacao(item, resultado)
+    return await aresponder_acao(request, nivel, texto, voltar, resultado=resultado, item=resultado.item, linha=True)
+
+
+@login_required
+@controlar_admissao
+async def remove_from_list_view(request, item_id):
+    item = await _aget_item_do_beneficiario(request, item_id)
+    voltar = redirect('feira_app:minha_lista')
+    if item is None:
+        return await aresponder_acao(request, messages.ERROR, "Acesso não autorizado.", voltar, status=403)
+    if request.method != 'POST':
+        return voltar
+
+    resultado = await sync_to_async(carrinho.remover_item)(item.lista_id, item.pk)
+    if resultado.erro:
+        return await aresponder_acao(request, messages.ERROR, resultado.erro, voltar)
+    return await aresponder_acao(
+        request, messages.SUCCESS, f"{item.produto.nome} removido da lista.", voltar,
+        resultado=resultado, item=item, removido=True,
+    )
@@ -53,13 +53,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'feira_app.instrumentacao.InstrumentacaoMiddleware', # primeiro: mede todo o resto (Server-Timing, log, histogramas)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'feira_app.middleware.ReplicaMiddleware', # leituras no primário durante e logo depois de escritas
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'feira_app.middleware.DebugCSRFMiddleware',  # <--- ADICIONE ESTA LINHA AQUI
-    'django.middleware.csrf.CsrfViewMiddleware', # O nosso middleware precisa vir antes deste
+    'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'feira_app.middleware.BeneficiarioMiddleware', # request.feira: beneficiário e lista aberta (lazy)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,7 +70,10 @@ ROOT_URLCONF = 'feira_iceflu_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates + medição do tempo de renderização (feira_app/instrumentacao.py).
+        # NAME mantém o alias 'django' (sem ele seria 'instrumentacao') para engines['django'].
+        'NAME': 'django',
+        'BACKEND': 'feira_app.instrumentacao.DjangoTemplatesInstrumentado',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -100,9 +105,85 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # BEGIN IMMEDIATE: transações de escrita (carrinho) se serializam como o
+            # SELECT ... FOR UPDATE faria no PostgreSQL; timeout espera o lock em vez de falhar.
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # Banco de teste em arquivo (e não em memória) para os testes com várias threads.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
+# Réplica de leitura opcional (ver feira_app/roteador.py). FEIRA_DB_REPLICA: no Cloud Run, o
+# INSTANCE_CONNECTION_NAME da réplica; localmente, o caminho de um segundo arquivo SQLite
+# (por exemplo, uma cópia de db.sqlite3, para ver o efeito de uma réplica atrasada).
+# Nos testes a réplica é um espelho do banco de teste (MIRROR).
+FEIRA_DB_REPLICA = os.environ.get('FEIRA_DB_REPLICA')
+if FEIRA_DB_REPLICA:
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        DATABASES['replica'] = {**DATABASES['default'], 'NAME': FEIRA_DB_REPLICA, 'TEST': {'MIRROR': 'default'}}
+    else:
+        DATABASES['replica'] = {
+            **DATABASES['default'], 'HOST': f"/cloudsql/{FEIRA_DB_REPLICA}", 'TEST': {'MIRROR': 'default'},
+        }
+DATABASE_ROUTERS = ['feira_app.roteador.RoteadorReplica']
+# Segundos em que as leituras de um navegador ficam no primário depois de uma escrita dele
+FEIRA_DB_JANELA_PRIMARIO = int(os.environ.get('FEIRA_DB_JANELA_PRIMARIO', '10'))
+
+
+# --- Cache ---
+# Com REDIS_URL definido (produção, vários workers/instâncias) o cache é compartilhado,
+# e a invalidação do catálogo (feira_app/catalogo.py) chega a todos os workers.
+# Sem ele, usa a memória local de cada processo (desenvolvimento).
+# FEIRA_CACHE_COMPARTILHADO diz se uma escrita no cache chega a todos os processos.
+FEIRA_CACHE_COMPARTILHADO = bool(os.environ.get('REDIS_URL'))
+if FEIRA_CACHE_COMPARTILHADO:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'feira-iceflu',
+        }
+    }
+
+# Tempo máximo (s) de uma versão do catálogo no cache; a invalidação normal é por sinal.
+# Sem cache compartilhado a invalidação não chega aos outros workers: a versão dura poucos
+# segundos, e um preço alterado no admin aparece em todos em até esse tempo.
+FEIRA_CATALOGO_TIMEOUT = 60 * 60 * 24 if FEIRA_CACHE_COMPARTILHADO else 30
+# Tempo máximo (s) do resumo do carrinho de um beneficiário no cache (feira_app/resumo_carrinho.py).
+# Só usado com cache compartilhado; sem ele o resumo é lido da lista a cada página.
+FEIRA_RESUMO_CARRINHO_TIMEOUT = 60 * 30
+
+# Servidor: 'wsgi' (gunicorn gthread) ou 'asgi' (gunicorn + UvicornWorker, views assíncronas).
+# Ver gunicorn.conf.py e feira_app/views_async.py.
+FEIRA_SERVIDOR = os.environ.get('FEIRA_SERVIDOR', 'wsgi')
+FEIRA_VIEWS_ASYNC = FEIRA_SERVIDOR == 'asgi'
+
+# Fração das requisições que alimenta os histogramas de /metricas/ (o log e o Server-Timing valem para todas)
+FEIRA_INSTRUMENTACAO_AMOSTRAGEM = float(os.environ.get('FEIRA_INSTRUMENTACAO_AMOSTRAGEM', '0.1'))
+# Linha de log JSON por requisição no stdout (logger feira_app.requisicoes)
+FEIRA_LOG_REQUISICOES = os.environ.get('FEIRA_LOG_REQUISICOES', '1') == '1'
+
+# Controle de admissão das ações do carrinho (feira_app/admissao.py). Por usuário: até
+# FEIRA_ADMISSAO_RAJADA ações seguidas e, depois, FEIRA_ADMISSAO_TAXA por segundo. Por processo:
+# no máximo FEIRA_ADMISSAO_CONCORRENCIA ações ao mesmo tempo (padrão: uma thread a menos que o
+# gunicorn, para sobrar uma para as páginas). O excedente recebe 429 na hora. 0 desliga cada limite.
+FEIRA_ADMISSAO_TAXA = float(os.environ.get('FEIRA_ADMISSAO_TAXA', '2'))
+FEIRA_ADMISSAO_RAJADA = int(os.environ.get('FEIRA_ADMISSAO_RAJADA', '6'))
+FEIRA_ADMISSAO_CONCORRENCIA = int(os.environ.get(
+    'FEIRA_ADMISSAO_CONCORRENCIA', max(1, int(os.environ.get('GUNICORN_THREADS', '4')) - 1)
+))
+
 
 # --- Validação de Senhas ---
 AUTH_PASSWORD_VALIDATORS = [
@@ -128,7 +209,12 @@ USE_TZ = True
 # --- Arquivos Estáticos ---
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Desenvolvimento e testes servem os arquivos dos apps direto (sem collectstatic). O pipeline de
+# produção (hash no nome, gzip/brotli, cache imutável) fica em settings_prod.py.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 
 
 # --- Chave Primária Padrão ---
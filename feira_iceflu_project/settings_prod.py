@@ -20,6 +20,15 @@ CSRF_COOKIE_SECURE = True
 CSRF_COOKIE_SAMESITE = 'None'
 CSRF_USE_SESSIONS = True
 
+# Sessões fora do Cloud SQL no caminho quente (FEIRA_SESSOES: cached_db, signed_cookies ou db).
+# - cached_db: lê do cache e grava no cache e no banco; só é seguro com cache compartilhado
+#   (REDIS_URL), senão uma instância pode ler a cópia antiga guardada na própria memória.
+# - signed_cookies: a sessão (com o segredo CSRF) vai assinada no cookie, sem consulta alguma;
+#   não dá para invalidar uma sessão pelo servidor, só trocando a SECRET_KEY.
+# Padrão: cached_db com Redis, signed_cookies sem. Limpeza: `manage.py limpar_sessoes`.
+FEIRA_SESSOES = os.environ.get('FEIRA_SESSOES') or ('cached_db' if os.environ.get('REDIS_URL') else 'signed_cookies')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{FEIRA_SESSOES}'
+
 # Banco de Dados (explícito para produção)
 DATABASES = {
     'default': {
@@ -28,20 +37,46 @@ DATABASES = {
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'NAME': os.environ.get('DB_NAME'),
+        # Conexões persistentes: cada thread do gunicorn reaproveita a sua conexão entre
+        # requisições em vez de conectar e autenticar de novo a cada uma. O health check
+        # testa a conexão no início da requisição e reconecta se o Cloud SQL a derrubou.
+        # Sob ASGI as conexões não são reaproveitadas com segurança entre requisições
+        # (recomendação do Django): o padrão passa a ser 0.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0' if FEIRA_VIEWS_ASYNC else '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# Conexões abertas por instância = GUNICORN_WORKERS x GUNICORN_THREADS (ver gunicorn.conf.py);
+# multiplicado pelo número máximo de instâncias, precisa caber no max_connections do Cloud SQL.
+# Com a réplica, cada thread pode abrir uma conexão em cada uma das duas instâncias.
+if FEIRA_DB_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'], 'HOST': f"/cloudsql/{FEIRA_DB_REPLICA}", 'TEST': {'MIRROR': 'default'},
+    }
 
-# MIDDLEWARE (com WhiteNoise e middleware de debug removidos para teste)
+# MIDDLEWARE
 MIDDLEWARE = [
+    'feira_app.instrumentacao.InstrumentacaoMiddleware', # primeiro: mede todo o resto (Server-Timing, log, histogramas)
     'django.middleware.security.SecurityMiddleware',
-    # 'whitenoise.middleware.WhiteNoiseMiddleware', # Removido temporariamente
+    'whitenoise.middleware.WhiteNoiseMiddleware', # estáticos antes de sessão/auth: sem consultas
+    'feira_app.middleware.ReplicaMiddleware', # leituras no primário durante e logo depois de escritas
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'feira_app.middleware.BeneficiarioMiddleware', # request.feira: beneficiário e lista aberta (lazy)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-# Arquivos Estáticos (WhiteNoise storage desabilitado temporariamente)
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
\ No newline at end of file
+# Arquivos Estáticos
+# O collectstatic do Dockerfile (depois de `montar_estaticos`) grava cada arquivo com o hash do
+# conteúdo no nome e as versões .gz e .br (brotli, pacote Brotli) ao lado. O WhiteNoise serve a
+# versão comprimida que o navegador aceitar e, como o nome muda junto com o conteúdo, manda os
+# arquivos com hash com "Cache-Control: max-age=315360000, public, immutable".
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+# Só as cópias com hash vão para a imagem; os templates sempre geram o nome com hash ({% static %})
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
\ No newline at end of file
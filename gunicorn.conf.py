@@ -0,0 +1,51 @@
+# gunicorn.conf.py
+# Configuração do gunicorn em produção (usada por entrypoint.sh).
+# Workers e threads vêm do ambiente; settings_prod.py lê as mesmas variáveis para
+# dimensionar as conexões com o banco (uma conexão persistente por thread).
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = 120
+
+# FEIRA_SERVIDOR (o mesmo lido em settings.py) escolhe o modo:
+# - wsgi: gthread; as threads de cada worker são reaproveitadas entre requisições,
+#   então cada uma mantém a sua conexão aberta (CONN_MAX_AGE);
+# - asgi: um event loop por worker (UvicornWorker) servindo as views de views_async.py;
+#   o código síncrono (carrinho, templates) roda no pool de threads do asgiref (ASGI_THREADS).
+if os.environ.get('FEIRA_SERVIDOR', 'wsgi') == 'asgi':
+    wsgi_app = 'feira_iceflu_project.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'feira_iceflu_project.wsgi:application'
+    worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Cold start: com preload_app o master importa o Django (settings, apps, admin), a URLConf e
+# os templates uma vez, antes do fork; os workers nascem com tudo isso pronto (e compartilham
+# as páginas de memória). Nada no master abre conexão com o banco, que não pode ser herdada.
+# GUNICORN_PRELOAD=0 volta a carregar a aplicação em cada worker.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    # Master, depois do preload e antes de criar os workers
+    if preload_app:
+        from feira_app.inicializacao import preparar_processo
+        preparar_processo()
+
+
+def post_worker_init(worker):
+    # Cada worker, antes de aceitar conexões: psycopg/conexão com o Cloud SQL e catálogo em cache.
+    # A conexão desta thread é fechada; as threads de requisição abrem as suas (CONN_MAX_AGE),
+    # e o probe de inicialização em /aquecimento/ aquece a de uma delas.
+    from django.db import connections
+
+    from feira_app.inicializacao import aquecer
+
+    try:
+        worker.log.info("Aquecimento: %s", aquecer())
+    except Exception:
+        worker.log.exception("Falha no aquecimento; o worker segue e conecta na primeira requisição")
+    finally:
+        connections.close_all()